@@ -0,0 +1,66 @@
+"""
+Seeded synthetic CSV generator.
+
+Row ``i`` is a pure function of (seed, row id), so files are reproducible
+and can be written chunk by chunk regardless of their size. Columns cycle
+through integer keys, floats and strings after a leading ``row_id``.
+"""
+import numpy as np
+import pandas as pd
+
+COLUMN_KINDS = ('key', 'num', 'str')
+ALPHABET = np.array(list('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'))
+
+
+def _mix(values, salt):
+    """splitmix64 finaliser: a cheap deterministic hash of uint64 values"""
+    with np.errstate(over='ignore'):
+        z = values.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15) * np.uint64(salt + 1)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def column_names(columns):
+    names = ['row_id']
+    for index in range(columns - 1):
+        kind = COLUMN_KINDS[index % len(COLUMN_KINDS)]
+        names.append(f'{kind}_{index // len(COLUMN_KINDS)}')
+    return names
+
+
+def generate_csv(path, rows, columns=6, duplicate_ratio=0.1, cardinality=1000,
+                 string_width=12, seed=0, chunk_rows=200000):
+    """Write a synthetic CSV and return the number of bytes written"""
+    rng = np.random.default_rng(seed)
+    distinct_rows = max(1, int(rows * (1 - duplicate_ratio)))
+    # Every row id appears once, the remainder are copies of earlier ids
+    row_ids = np.concatenate([
+        np.arange(distinct_rows, dtype=np.int64),
+        rng.integers(0, distinct_rows, rows - distinct_rows),
+    ])
+    rng.shuffle(row_ids)
+
+    vocabulary_size = max(1, min(cardinality, distinct_rows))
+    vocabulary = np.array([
+        ''.join(word) for word in
+        ALPHABET[rng.integers(0, len(ALPHABET), (vocabulary_size, string_width))]
+    ]) if string_width else np.array([''])
+
+    names = column_names(columns)
+    with open(path, 'w', newline='') as output:
+        for start in range(0, rows, chunk_rows):
+            ids = row_ids[start:start + chunk_rows]
+            data = {'row_id': ids}
+            for salt, name in enumerate(names[1:]):
+                hashed = _mix(ids, salt + seed * 1000)
+                if name.startswith('key'):
+                    data[name] = (hashed % np.uint64(cardinality)).astype(np.int64)
+                elif name.startswith('num'):
+                    data[name] = (hashed % np.uint64(2000000)).astype(np.float64) / 1000 - 1000
+                else:
+                    data[name] = vocabulary[hashed % np.uint64(vocabulary_size)]
+            pd.DataFrame(data, columns=names).to_csv(
+                output, index=False, header=(start == 0)
+            )
+        return output.tell()
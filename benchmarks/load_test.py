@@ -0,0 +1,337 @@
+"""
+Load test the HTTP API end to end with local stand-ins.
+
+    python -m benchmarks.load_test --users 8 --iterations 5
+    python -m benchmarks.load_test --mode worker --worker-concurrency 4
+    python -m benchmarks.load_test --pollers 200 --poll-requests 20
+
+Every virtual user registers, logs in, uploads a generated CSV file and
+then repeatedly submits operations and polls the task status until the
+task finishes. Requests go through the full Django stack (middleware,
+JWT authentication, serializers, views) via the test client, against
+SQLite instead of MySQL. In ``eager`` mode tasks run inside the
+perform-operation request; in ``worker`` mode an in-process Celery worker
+consumes a file-system broker, so queueing and polling are exercised.
+
+Throughput and p50/p95/p99 latency are reported per endpoint, plus the
+end-to-end time from submitting an operation to its final status.
+
+With ``--pollers`` a finished task is then polled by that many concurrent
+clients through Django's ASGI handler, once on the sync task-status view
+and once on the async one, to compare how one ASGI process copes.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+OPERATION_PAYLOADS = {
+    'dedup': {},
+    'unique': {'column': 'key_0'},
+    'filter': {'filters': [
+        {'column': 'num_0', 'operator': '>', 'value': '0'},
+        {'column': 'str_0', 'operator': 'contains', 'value': 'a'},
+    ]},
+    'profile': {},
+    'sample': {'k': 100, 'seed': 0},
+    'top_k': {'column': 'num_0', 'k': 10},
+}
+
+FINAL_STATUSES = ('SUCCESS', 'FAILURE')
+PASSWORD = 'load-test-password'
+
+
+def _csv_list(value):
+    return [item for item in value.split(',') if item]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mode', choices=('eager', 'worker'), default='eager',
+                        help='Run tasks in the request or in a worker thread')
+    parser.add_argument('--users', type=int, default=4,
+                        help='Concurrent virtual users')
+    parser.add_argument('--iterations', type=int, default=5,
+                        help='Operations submitted per user')
+    parser.add_argument('--operations', type=_csv_list,
+                        default=list(OPERATION_PAYLOADS),
+                        help='Operations to cycle through')
+    parser.add_argument('--rows', type=int, default=20000,
+                        help='Rows in the uploaded CSV file')
+    parser.add_argument('--columns', type=int, default=6)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--poll-interval', type=float, default=0.05)
+    parser.add_argument('--timeout', type=float, default=300.0,
+                        help='Give up on a task after this many seconds')
+    parser.add_argument('--worker-concurrency', type=int, default=4)
+    parser.add_argument('--pollers', type=int, default=0,
+                        help='Concurrent ASGI pollers for the sync/async '
+                             'task-status comparison (0 = skip)')
+    parser.add_argument('--poll-requests', type=int, default=20,
+                        help='Requests per poller in the comparison')
+    parser.add_argument('--output', help='Write results to this JSON file')
+    args = parser.parse_args(argv)
+    unknown = set(args.operations) - set(OPERATION_PAYLOADS)
+    if unknown:
+        parser.error(f"Unknown operations: {', '.join(sorted(unknown))}")
+    return args
+
+
+def setup_django(mode):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    os.environ['BENCH_CELERY_MODE'] = mode
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+class Recorder:
+    """Thread-safe collection of (endpoint, seconds, ok) samples"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        # (access token, task id) of successful operations
+        self.finished = []
+
+    def add(self, endpoint, seconds, ok):
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append((seconds, ok))
+
+    def timed(self, endpoint, call, expected):
+        start = time.perf_counter()
+        response = call()
+        self.add(endpoint, time.perf_counter() - start,
+                 response.status_code in expected)
+        return response
+
+
+def _percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def virtual_user(number, args, recorder, payload):
+    """Run one user's session; returns the number of failed operations"""
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.db import connection
+    from django.test import Client
+    from django.urls import reverse
+
+    client = Client()
+    email = f'load-{uuid.uuid4().hex[:12]}@example.com'
+    failures = 0
+    try:
+        recorder.timed('register', lambda: client.post(
+            reverse('csv_app:register'),
+            {'email': email, 'password': PASSWORD,
+             'confirm_password': PASSWORD},
+            content_type='application/json'
+        ), (201,))
+        response = recorder.timed('login', lambda: client.post(
+            reverse('csv_app:login'),
+            {'email': email, 'password': PASSWORD},
+            content_type='application/json'
+        ), (200,))
+        token = response.json()['access_token']
+        auth = {'HTTP_AUTHORIZATION': f"Bearer {token}"}
+
+        response = recorder.timed('upload-csv', lambda: client.post(
+            reverse('csv_app:upload_csv'),
+            {'file': SimpleUploadedFile(f'load-{number}.csv', payload,
+                                        content_type='text/csv')},
+            **auth
+        ), (201,))
+        file_id = response.json()['file_id']
+
+        operations = itertools.islice(
+            itertools.cycle(args.operations), number, number + args.iterations
+        )
+        for operation in operations:
+            submitted = time.perf_counter()
+            response = recorder.timed('perform-operation', lambda: client.post(
+                reverse('csv_app:perform_operation'),
+                {'file_id': file_id, 'operation': operation,
+                 **OPERATION_PAYLOADS[operation]},
+                content_type='application/json', **auth
+            ), (201,))
+            if response.status_code != 201:
+                failures += 1
+                continue
+
+            task_id = response.json()['task_id']
+            deadline = submitted + args.timeout
+            while True:
+                response = recorder.timed('task-status', lambda: client.get(
+                    reverse('csv_app:task_status'),
+                    {'task_id': task_id, 'n': 10}, **auth
+                ), (200,))
+                task_status = response.json().get('status')
+                if task_status in FINAL_STATUSES or time.perf_counter() > deadline:
+                    break
+                time.sleep(args.poll_interval)
+
+            ok = task_status == 'SUCCESS'
+            recorder.add(f'operation:{operation}',
+                         time.perf_counter() - submitted, ok)
+            if ok:
+                with recorder._lock:
+                    recorder.finished.append((token, task_id))
+            failures += not ok
+    finally:
+        connection.close()
+    return failures
+
+
+def _stats(samples, duration):
+    latencies = sorted(seconds for seconds, _ in samples)
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, ok in samples if not ok),
+        'per_second': len(samples) / duration if duration else None,
+        'mean_ms': 1000 * sum(latencies) / len(latencies),
+        'p50_ms': 1000 * _percentile(latencies, 0.50),
+        'p95_ms': 1000 * _percentile(latencies, 0.95),
+        'p99_ms': 1000 * _percentile(latencies, 0.99),
+        'max_ms': 1000 * latencies[-1],
+    }
+
+
+def summarize(recorder, duration):
+    return {
+        endpoint: _stats(samples, duration)
+        for endpoint, samples in sorted(recorder.samples.items())
+    }
+
+
+async def _poller(path, params, headers, requests, samples):
+    from django.test import AsyncClient
+
+    client = AsyncClient()
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = await client.get(path, params, headers=headers)
+        samples.append((time.perf_counter() - start, response.status_code == 200))
+
+
+def compare_status_views(args, token, task_id):
+    """Poll one finished task concurrently via the sync and async views"""
+    from django.urls import reverse
+
+    params = {'task_id': task_id, 'n': 10}
+    headers = {'Authorization': f'Bearer {token}'}
+    comparison = {}
+    for label, url_name in (('sync', 'csv_app:task_status'),
+                            ('async', 'csv_app:async_task_status')):
+        path = reverse(url_name)
+        samples = []
+
+        async def storm():
+            await asyncio.gather(*(
+                _poller(path, params, headers, args.poll_requests, samples)
+                for _ in range(args.pollers)
+            ))
+
+        start = time.perf_counter()
+        asyncio.run(storm())
+        comparison[f'poll:{label}'] = _stats(samples, time.perf_counter() - start)
+    return comparison
+
+
+def print_table(summary):
+    print(f"\n{'endpoint':<22}{'count':>7}{'errors':>7}{'req/s':>9}"
+          f"{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for endpoint, stats in summary.items():
+        print(f"{endpoint:<22}{stats['requests']:>7}{stats['errors']:>7}"
+              f"{stats['per_second']:>9.1f}{stats['mean_ms']:>9.1f}"
+              f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}"
+              f"{stats['p99_ms']:>9.1f}{stats['max_ms']:>9.1f}")
+
+
+def run_load_test(args):
+    from contextlib import nullcontext
+
+    from django.conf import settings
+
+    from benchmarks.datagen import generate_csv
+
+    path = os.path.join(settings.BENCH_DIR, f'load-{uuid.uuid4()}.csv')
+    generate_csv(path, args.rows, columns=args.columns, seed=args.seed)
+    with open(path, 'rb') as handle:
+        payload = handle.read()
+    os.remove(path)
+    print(f"# mode={args.mode} users={args.users} "
+          f"iterations={args.iterations} file={len(payload) / 2 ** 20:.1f} MB")
+
+    worker = nullcontext()
+    if args.mode == 'worker':
+        from celery.contrib.testing.worker import start_worker
+        from ravid_project.celery import app
+
+        worker = start_worker(
+            app, pool='threads', concurrency=args.worker_concurrency,
+            perform_ping_check=False, loglevel='WARNING',
+            queues=[settings.CSV_INTERACTIVE_QUEUE, settings.CSV_BULK_QUEUE,
+                    app.conf.task_default_queue],
+            shutdown_timeout=args.timeout
+        )
+
+    recorder = Recorder()
+    with worker:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.users) as executor:
+            futures = [
+                executor.submit(virtual_user, number, args, recorder, payload)
+                for number in range(args.users)
+            ]
+            failures = sum(future.result() for future in futures)
+        duration = time.perf_counter() - start
+
+    summary = summarize(recorder, duration)
+    print_table(summary)
+    print(f"\nTotal wall time {duration:.2f}s")
+
+    comparison = None
+    if args.pollers and recorder.finished:
+        print(f"\n# task-status via ASGI: {args.pollers} pollers x "
+              f"{args.poll_requests} requests")
+        comparison = compare_status_views(args, *recorder.finished[0])
+        print_table(comparison)
+
+    return {
+        'mode': args.mode,
+        'users': args.users,
+        'iterations': args.iterations,
+        'operations': args.operations,
+        'file_bytes': len(payload),
+        'duration_seconds': duration,
+        'failed_operations': failures,
+        'endpoints': summary,
+        'status_view_comparison': comparison,
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_django(args.mode)
+    report = run_load_test(args)
+
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(report, handle, indent=2)
+        print(f"Results written to {args.output}")
+    return 1 if report['failed_operations'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
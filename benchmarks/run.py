@@ -0,0 +1,289 @@
+"""
+Benchmark the CSV task functions directly (no broker, no web server).
+
+    python -m benchmarks.run --rows 100000,1000000 --output bench.json
+    python -m benchmarks.run --rows 100000 --compare bench.json
+
+Scenario parameters accept comma separated lists; every combination is
+run. With ``--compare`` the median wall time of each (scenario,
+operation) is checked against the baseline file and the command exits
+with status 1 when any of them regressed by more than ``--threshold``.
+
+Every scenario also parses the file with each reader backend
+(``--readers``), reports its throughput and checks that the frame is
+identical to the C parser's; a mismatch makes the command exit with 1.
+"""
+import argparse
+import importlib.metadata
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import uuid
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from benchmarks.datagen import generate_csv  # noqa: E402
+from csv_app import readers, tasks  # noqa: E402
+from csv_app.models import CSVFile, TaskResult, User  # noqa: E402
+from csv_app.planner import PeakRSSMonitor  # noqa: E402
+
+OPERATIONS = {
+    'dedup': (tasks.process_csv_dedup, lambda: ((), {})),
+    'unique': (tasks.process_csv_unique, lambda: (('key_0',), {})),
+    'filter': (tasks.process_csv_filter, lambda: (([
+        {'column': 'num_0', 'operator': '>', 'value': '0'},
+        {'column': 'str_0', 'operator': 'contains', 'value': 'a'},
+    ],), {})),
+    'profile': (tasks.process_csv_profile, lambda: ((), {})),
+    'sample': (tasks.process_csv_sample, lambda: ((), {'k': 1000, 'seed': 0})),
+    'top_k': (tasks.process_csv_top_k, lambda: (('num_0', 100), {})),
+}
+
+
+def _default_readers():
+    available = [readers.C, readers.PYTHON]
+    if readers.pyarrow_available():
+        available.insert(1, readers.PYARROW)
+    return available
+
+
+SCENARIO_FIELDS = ('rows', 'columns', 'duplicate_ratio', 'cardinality',
+                   'string_width')
+
+
+def _csv_list(cast):
+    return lambda value: [cast(item) for item in value.split(',') if item]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=_csv_list(int), default=[100000])
+    parser.add_argument('--columns', type=_csv_list(int), default=[6])
+    parser.add_argument('--duplicate-ratio', type=_csv_list(float), default=[0.1])
+    parser.add_argument('--cardinality', type=_csv_list(int), default=[1000])
+    parser.add_argument('--string-width', type=_csv_list(int), default=[12])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--operations', type=_csv_list(str),
+                        default=list(OPERATIONS))
+    parser.add_argument('--readers', type=_csv_list(str),
+                        default=_default_readers(),
+                        help='Reader backends to time (C is the reference)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--compare', help='Baseline JSON file to compare with')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Allowed slowdown before flagging (0.10 = 10%%)')
+    args = parser.parse_args(argv)
+    unknown = set(args.operations) - set(OPERATIONS)
+    if unknown:
+        parser.error(f"Unknown operations: {', '.join(sorted(unknown))}")
+    unknown = set(args.readers) - set(readers.BACKENDS)
+    if unknown:
+        parser.error(f"Unknown readers: {', '.join(sorted(unknown))}")
+    if readers.PYARROW in args.readers and not readers.pyarrow_available():
+        parser.error("pyarrow is not installed")
+    return args
+
+
+def scenario_id(scenario):
+    return ','.join(f'{field}={scenario[field]}' for field in SCENARIO_FIELDS)
+
+
+def setup_database():
+    call_command('migrate', verbosity=0)
+    user, _ = User.objects.get_or_create(email='bench@ravid.local')
+    return user
+
+
+def create_file(user, scenario, seed):
+    relative = f'csv_files/bench/{uuid.uuid4()}.csv'
+    path = os.path.join(settings.MEDIA_ROOT, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    size = generate_csv(path, seed=seed, **scenario)
+    return CSVFile.objects.create(
+        user=user, original_name=os.path.basename(path),
+        file_path=relative, file_size=size
+    )
+
+
+def run_operation(user, csv_file, operation):
+    task, arguments = OPERATIONS[operation]
+    args, kwargs = arguments()
+    task_id = str(uuid.uuid4())
+    TaskResult.objects.create(
+        task_id=task_id, user=user, csv_file=csv_file, operation=operation,
+        status='PENDING', enqueued_at=timezone.now()
+    )
+
+    with PeakRSSMonitor() as monitor:
+        start = time.perf_counter()
+        task.apply(args=(task_id, csv_file.id) + args, kwargs=kwargs)
+        elapsed = time.perf_counter() - start
+
+    result = TaskResult.objects.get(task_id=task_id)
+    if result.status != 'SUCCESS':
+        raise RuntimeError(f"{operation} failed: {result.error_message}")
+    if result.result_file_path:
+        os.remove(result.result_file_path.path)
+    return {
+        'wall_seconds': elapsed,
+        'peak_rss_bytes': monitor.peak,
+        'strategy': (result.execution_plan or {}).get('strategy'),
+        'output_rows': result.processed_rows,
+    }
+
+
+def run_parse(csv_file, scenario, backends, repeat):
+    """Time a whole-file parse per backend and compare with the C parser"""
+    path = csv_file.file_path.path
+    megabytes = csv_file.file_size / (1024 * 1024)
+    reference, _ = readers.read_csv(path, readers.C)
+    entries = []
+    for backend in backends:
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            frame, used = readers.read_csv(path, backend)
+            runs.append(time.perf_counter() - start)
+        wall = statistics.median(runs)
+        try:
+            pd.testing.assert_frame_equal(frame, reference, check_exact=True)
+            identical = True
+        except AssertionError:
+            identical = False
+        entry = {
+            'scenario_id': scenario_id(scenario),
+            'reader': backend,
+            'reader_used': used,
+            'wall_seconds': wall,
+            'rows_per_second': scenario['rows'] / wall if wall else None,
+            'mb_per_second': megabytes / wall if wall else None,
+            'identical': identical,
+        }
+        entries.append(entry)
+        fallback = f" (read by {used})" if used != backend else ''
+        print(f"  parse:{backend:<8} {wall:6.3f}s "
+              f"{entry['rows_per_second']:>12,.0f} rows/s "
+              f"{entry['mb_per_second']:8.1f} MB/s "
+              f"{'identical' if identical else 'MISMATCH'}{fallback}")
+    return entries
+
+
+def run_benchmarks(args):
+    user = setup_database()
+    results = []
+    parse_results = []
+    grid = itertools.product(args.rows, args.columns, args.duplicate_ratio,
+                             args.cardinality, args.string_width)
+    for values in grid:
+        scenario = dict(zip(SCENARIO_FIELDS, values))
+        csv_file = create_file(user, scenario, args.seed)
+        megabytes = csv_file.file_size / (1024 * 1024)
+        print(f"# {scenario_id(scenario)} ({megabytes:.1f} MB)")
+        parse_results.extend(
+            run_parse(csv_file, scenario, args.readers, args.repeat)
+        )
+
+        for operation in args.operations:
+            runs = [run_operation(user, csv_file, operation)
+                    for _ in range(args.repeat)]
+            wall = statistics.median(run['wall_seconds'] for run in runs)
+            entry = {
+                'scenario': scenario,
+                'scenario_id': scenario_id(scenario),
+                'operation': operation,
+                'file_bytes': csv_file.file_size,
+                'wall_seconds': wall,
+                'rows_per_second': scenario['rows'] / wall if wall else None,
+                'mb_per_second': megabytes / wall if wall else None,
+                'peak_rss_bytes': max(run['peak_rss_bytes'] for run in runs),
+                'strategy': runs[-1]['strategy'],
+                'output_rows': runs[-1]['output_rows'],
+                'runs': [run['wall_seconds'] for run in runs],
+            }
+            results.append(entry)
+            print(f"  {operation:<8} {wall:8.3f}s "
+                  f"{entry['rows_per_second']:>12,.0f} rows/s "
+                  f"{entry['mb_per_second']:8.1f} MB/s "
+                  f"peak RSS {entry['peak_rss_bytes'] / 2 ** 20:7.1f} MB "
+                  f"[{entry['strategy']}]")
+
+        os.remove(csv_file.file_path.path)
+
+    return {
+        'created_at': timezone.now().isoformat(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'environment': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'pyarrow': (importlib.metadata.version('pyarrow')
+                        if readers.pyarrow_available() else None),
+            'machine': platform.machine(),
+            'memory_budget_mb': settings.CSV_WORKER_MEMORY_BUDGET_MB,
+        },
+        'results': results,
+        'parse': parse_results,
+    }
+
+
+def compare(report, baseline, threshold):
+    """Return the list of (scenario, operation, baseline, current) regressions"""
+    previous = {
+        (entry['scenario_id'], entry['operation']): entry['wall_seconds']
+        for entry in baseline['results']
+    }
+    regressions = []
+    print(f"\n# Comparison against baseline (threshold {threshold:.0%})")
+    for entry in report['results']:
+        key = (entry['scenario_id'], entry['operation'])
+        if key not in previous:
+            continue
+        before, now = previous[key], entry['wall_seconds']
+        change = (now - before) / before if before else 0.0
+        flag = 'REGRESSION' if change > threshold else 'ok'
+        print(f"  {entry['operation']:<8} {before:8.3f}s -> {now:8.3f}s "
+              f"({change:+.1%}) {flag}  {entry['scenario_id']}")
+        if change > threshold:
+            regressions.append((key[0], key[1], before, now))
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_benchmarks(args)
+    status = 0
+    if not all(entry['identical'] for entry in report['parse']):
+        print("\nReader backends disagree with the C parser")
+        status = 1
+
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(report, handle, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)
+        if compare(report, baseline, args.threshold):
+            return 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
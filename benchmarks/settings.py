@@ -0,0 +1,59 @@
+"""
+Self-contained settings for the benchmark and load-test harnesses.
+
+Uses SQLite, an in-process cache and eager Celery so no MySQL or Redis is
+needed. Everything is written below BENCH_DIR (a temp dir by default).
+"""
+import os
+import tempfile
+
+from ravid_project.settings import *  # noqa: F401,F403
+
+BENCH_DIR = os.environ.get('BENCH_DIR') or tempfile.mkdtemp(prefix='ravid_bench_')
+
+DEBUG = False
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'benchmarks.sqlite',
+        'NAME': os.path.join(BENCH_DIR, 'bench.sqlite3'),
+        'OPTIONS': {'timeout': 30},
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+MEDIA_ROOT = os.path.join(BENCH_DIR, 'media')
+
+# Tasks run in-process, no broker required
+CELERY_BROKER_URL = 'memory://'
+CELERY_RESULT_BACKEND = 'cache+memory://'
+CELERY_TASK_ALWAYS_EAGER = True
+CELERY_TASK_EAGER_PROPAGATES = False
+
+if os.environ.get('BENCH_CELERY_MODE') == 'worker':
+    # File-system broker stand-in consumed by an in-process worker
+    BROKER_DIR = os.path.join(BENCH_DIR, 'broker')
+    os.makedirs(os.path.join(BROKER_DIR, 'queue'), exist_ok=True)
+    os.makedirs(os.path.join(BROKER_DIR, 'processed'), exist_ok=True)
+    os.makedirs(os.path.join(BROKER_DIR, 'control'), exist_ok=True)
+    CELERY_BROKER_URL = 'filesystem://'
+    CELERY_BROKER_TRANSPORT_OPTIONS = {
+        'data_folder_in': os.path.join(BROKER_DIR, 'queue'),
+        'data_folder_out': os.path.join(BROKER_DIR, 'queue'),
+        'processed_folder': os.path.join(BROKER_DIR, 'processed'),
+        'control_folder': os.path.join(BROKER_DIR, 'control'),
+        'store_processed': False,
+        'polling_interval': 0.05,
+    }
+    CELERY_TASK_ALWAYS_EAGER = False
+
+# Skip the per-request password hashing cost of the default hasher
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+# No worker metrics exporter for in-process workers
+CELERY_METRICS_PORT = 0
@@ -0,0 +1,21 @@
+"""
+SQLite backend for concurrent benchmark runs.
+
+Stock SQLite transactions start deferred, so two threads that both read
+and then write inside ``transaction.atomic()`` fail with "database is
+locked" instead of waiting. Taking the write lock up front and using WAL
+journaling lets the load test's threads queue behind each other the way
+they would on MySQL.
+"""
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+
+
+class DatabaseWrapper(SQLiteDatabaseWrapper):
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
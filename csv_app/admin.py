@@ -1,8 +1,49 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 from .models import User, CSVFile, TaskResult
 
 
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for very large tables: an unfiltered changelist uses the
+    database's table statistics instead of an exact COUNT(*).
+    """
+    # Below this an exact count is cheap and more useful than an estimate
+    EXACT_COUNT_LIMIT = 10000
+
+    def _estimated_count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        table = queryset.model._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                cursor.execute(
+                    "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                    [table]
+                )
+            elif connection.vendor == 'postgresql':
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                    [table]
+                )
+            else:
+                return None
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            estimate = self._estimated_count()
+            if estimate is not None and estimate > self.EXACT_COUNT_LIMIT:
+                return estimate
+        return super().count
+
+
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
     """Custom user admin"""
@@ -16,6 +57,7 @@ class CustomUserAdmin(UserAdmin):
         ('Permissions', {'fields': ('is_active', 'is_staff', 'is_superuser',
                                    'groups', 'user_permissions')}),
         ('Important dates', {'fields': ('last_login', 'date_joined')}),
+        ('Retention', {'fields': ('result_ttl_days',)}),
     )
 
     add_fieldsets = (
@@ -31,9 +73,15 @@ class CSVFileAdmin(admin.ModelAdmin):
     """CSV file admin"""
     list_display = ('original_name', 'user', 'file_size_mb', 
                    'upload_date', 'is_processed')
-    list_filter = ('upload_date', 'is_processed')
-    search_fields = ('original_name', 'user__email')
+    list_filter = ('is_processed',)
+    list_select_related = ('user',)
+    date_hierarchy = 'upload_date'
+    # Exact email match (unique index) and name prefix instead of %LIKE%
+    search_fields = ('=user__email', '^original_name')
+    raw_id_fields = ('user',)
     readonly_fields = ('upload_date', 'file_size', 'file_size_mb')
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
 
     # Exclude file_size from form since it's auto-calculated
     exclude = ()
@@ -61,16 +109,28 @@ class CSVFileAdmin(admin.ModelAdmin):
 @admin.register(TaskResult)
 class TaskResultAdmin(admin.ModelAdmin):
     """Task result admin"""
-    list_display = ('task_id', 'user', 'operation', 'status', 
+    list_display = ('task_id', 'user', 'operation', 'status', 'queue',
                    'created_at', 'completed_at')
-    list_filter = ('operation', 'status', 'created_at')
-    search_fields = ('task_id', 'user__email', 'csv_file__original_name')
-    readonly_fields = ('task_id', 'created_at', 'started_at', 'completed_at')
+    list_filter = ('operation', 'status', 'queue')
+    list_select_related = ('user',)
+    date_hierarchy = 'created_at'
+    # Exact matches only, so both lookups use a unique index
+    search_fields = ('=task_id', '=user__email')
+    raw_id_fields = ('user', 'csv_file')
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    readonly_fields = ('task_id', 'created_at', 'enqueued_at', 'started_at',
+                       'completed_at')
 
     fieldsets = (
         ('Task Info', {'fields': ('task_id', 'user', 'csv_file', 'operation')}),
         ('Status', {'fields': ('status', 'error_message')}),
-        ('Results', {'fields': ('result_file_path', 'processed_rows', 
+        ('Results', {'fields': ('result_file_path', 'result_size',
+                                'result_checksum', 'processed_rows',
                                 'original_rows', 'operation_params')}),
-        ('Timestamps', {'fields': ('created_at', 'started_at', 'completed_at')}),
+        ('Execution', {'fields': ('queue', 'execution_plan',
+                                  'peak_rss_bytes', 'timings',
+                                  'profile_artifacts')}),
+        ('Timestamps', {'fields': ('created_at', 'enqueued_at', 'started_at',
+                                   'completed_at')}),
     )
@@ -0,0 +1,92 @@
+"""
+Admission control for new operations.
+
+Before a task is created the current load is compared with configurable
+limits: the queue depth (messages waiting in the broker plus the
+fair-share backlog) and the bytes of input still waiting to be
+processed. When either is exceeded the API answers 429 instead of
+growing an unbounded backlog.
+"""
+import logging
+
+from celery import current_app
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+
+from .models import TaskResult
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_CACHE_KEY = 'csv_app:admission:snapshot'
+WAITING_STATUSES = ('QUEUED', 'PENDING')
+
+
+def broker_queue_depths():
+    """Number of messages waiting in each CSV queue of the broker"""
+    queues = (
+        settings.CSV_INTERACTIVE_QUEUE,
+        settings.CSV_BULK_QUEUE,
+        current_app.conf.task_default_queue,
+    )
+    depths = {}
+    try:
+        with current_app.connection_for_read() as connection:
+            # Fail fast: this runs on the request path
+            connection.ensure_connection(
+                max_retries=1, interval_start=0, timeout=1
+            )
+            channel = connection.default_channel
+            for queue in queues:
+                try:
+                    declared = channel.queue_declare(queue=queue, passive=True)
+                    depths[queue] = declared.message_count
+                except Exception:
+                    # Queue not declared yet: nothing waiting
+                    depths[queue] = 0
+    except Exception:
+        logger.warning("Could not read broker queue depth", exc_info=True)
+        return None
+    return depths
+
+
+def load_snapshot(use_cache=True):
+    """Current queue depth and pending bytes (cached for a few seconds)"""
+    if use_cache:
+        snapshot = cache.get(SNAPSHOT_CACHE_KEY)
+        if snapshot is not None:
+            return snapshot
+
+    waiting = TaskResult.objects.filter(status__in=WAITING_STATUSES).aggregate(
+        count=Count('id'),
+        pending_bytes=Sum('csv_file__file_size')
+    )
+    backlog = TaskResult.objects.filter(status='QUEUED').count()
+    broker = broker_queue_depths()
+    broker_messages = sum(broker.values()) if broker else 0
+
+    snapshot = {
+        'broker_queues': broker,
+        'broker_messages': broker_messages,
+        'backlog': backlog,
+        'queue_depth': broker_messages + backlog,
+        'waiting_tasks': waiting['count'],
+        'pending_bytes': waiting['pending_bytes'] or 0,
+        'max_queue_depth': settings.CSV_ADMISSION_MAX_QUEUE_DEPTH,
+        'max_pending_bytes': settings.CSV_ADMISSION_MAX_PENDING_MB * 1024 * 1024,
+    }
+    snapshot['saturated'] = (
+        snapshot['queue_depth'] >= snapshot['max_queue_depth']
+        or snapshot['pending_bytes'] >= snapshot['max_pending_bytes']
+    )
+    cache.set(SNAPSHOT_CACHE_KEY, snapshot,
+              settings.CSV_ADMISSION_CACHE_SECONDS)
+    return snapshot
+
+
+def check_admission():
+    """Return (admitted, retry_after_seconds, snapshot)"""
+    snapshot = load_snapshot()
+    if snapshot['saturated']:
+        return False, settings.CSV_ADMISSION_RETRY_AFTER, snapshot
+    return True, None, snapshot
@@ -0,0 +1,101 @@
+"""
+JWT authentication that caches the token's user.
+
+Clients poll task-status several times per second and simplejwt loads the
+user row on every request. For ``CSV_AUTH_CACHE_SECONDS`` the cache keeps
+what authentication needs of an active user, under its ID: the pk,
+``is_active`` and the digest tokens are revoked against, never the row
+itself. A cache hit gives a user with every other field deferred (loaded
+on first access). Saving or deleting the user (e.g. deactivating it in the
+admin) drops the entry once the transaction commits, see ``signals.py``.
+Changes made with ``QuerySet.update()`` send no signal and are picked up
+when the entry expires.
+"""
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_KEY = 'csv_app:auth:user:{}'
+
+
+def user_cache_key(user_id):
+    return USER_CACHE_KEY.format(user_id)
+
+
+def _cached_fields(user):
+    return {
+        'pk': user.pk,
+        'is_active': user.is_active,
+        'password_digest': get_md5_hash_password(user.password),
+    }
+
+
+def _cached_user(fields):
+    """User with only the pk and is_active loaded; other fields are deferred"""
+    return get_user_model().from_db(
+        None, ['id', 'is_active'], [fields['pk'], fields['is_active']]
+    )
+
+
+def invalidate_user(user_id):
+    try:
+        cache.delete(user_cache_key(user_id))
+    except Exception:
+        logger.warning("Could not invalidate cached user %s", user_id,
+                       exc_info=True)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication with a short-lived cache of active users"""
+
+    def get_user(self, validated_token):
+        timeout = settings.CSV_AUTH_CACHE_SECONDS
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if not timeout or user_id is None:
+            return super().get_user(validated_token)
+
+        key = user_cache_key(user_id)
+        try:
+            fields = cache.get(key)
+        except Exception:
+            # An unavailable cache must not lock users out
+            logger.warning("Auth cache unavailable", exc_info=True)
+            return super().get_user(validated_token)
+
+        if fields is None:
+            # Raises for unknown or inactive users, which are never cached
+            user = super().get_user(validated_token)
+            try:
+                cache.set(key, _cached_fields(user), timeout)
+            except Exception:
+                logger.warning("Auth cache unavailable", exc_info=True)
+            return user
+
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != fields['password_digest']:
+            # The cache is per user, the revocation check per token
+            raise AuthenticationFailed("The user's password has been changed.",
+                                       code='password_changed')
+        return _cached_user(fields)
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views; only the user lookup leaves the loop"""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        user = await sync_to_async(self.get_user)(validated_token)
+        return user, validated_token
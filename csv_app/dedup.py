@@ -0,0 +1,211 @@
+"""
+Key-based de-duplication for streamed CSV chunks.
+
+Rows are compared through a 64-bit hash of their (normalised) key. Only
+the sorted array of distinct hashes lives in memory, so memory grows by
+8 bytes per distinct key. The serialised key of every distinct row is
+kept in a temporary SQLite file and consulted whenever a hash is seen
+again, so a hash collision never causes a row to be dropped.
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+KEY_SEPARATOR = '\x1f'
+MAX_EXACT_FLOAT_INT = 2 ** 53
+
+
+def key_columns(chunk, subset=None, ignore_case=False, trim_whitespace=False,
+                round_digits=None, unify_numbers=True):
+    """
+    Yield the key columns of a chunk, normalised for comparison. Columns
+    that need no normalisation are yielded as they are, without a copy.
+
+    ``unify_numbers`` turns integers into floats and -0.0 into 0.0 so that
+    chunks parsed with different dtypes hash alike; within a single frame
+    comparisons do not need it.
+    """
+    columns = list(subset) if subset else list(chunk.columns)
+    missing = [column for column in columns if column not in chunk.columns]
+    if missing:
+        raise ValueError(
+            f"Column '{missing[0]}' not found in CSV file"
+        )
+
+    for column in columns:
+        values = chunk[column]
+        if unify_numbers and pd.api.types.is_integer_dtype(values.dtype):
+            # Chunks of the same column may be parsed as int or float
+            if values.empty or values.abs().max() < MAX_EXACT_FLOAT_INT:
+                values = values.astype(np.float64)
+        if pd.api.types.is_float_dtype(values.dtype):
+            if round_digits is not None:
+                values = values.round(round_digits)
+            if unify_numbers:
+                # Adding 0.0 folds -0.0 into 0.0
+                values = values + 0.0
+        elif values.dtype == object:
+            if trim_whitespace:
+                values = values.str.strip()
+            if ignore_case:
+                values = values.str.casefold()
+        yield column, values
+
+
+def normalize_keys(chunk, **options):
+    """Return the key columns of a chunk, normalised for comparison"""
+    return pd.DataFrame(dict(key_columns(chunk, **options)), index=chunk.index)
+
+
+def duplicated_rows(columns, keep='first'):
+    """
+    Like ``DataFrame.duplicated`` over ``columns`` (Series of equal length)
+    without building a frame of them: each column is factorised and the
+    codes are folded into one dense group id per row.
+    """
+    ids = None
+    for values in columns:
+        codes, uniques = pd.factorize(values)
+        # Missing values (-1) form a group of their own
+        codes += 1
+        if ids is None:
+            ids = codes
+        else:
+            # ids < rows and codes <= rows, so this cannot overflow int64
+            ids, _ = pd.factorize(ids * (len(uniques) + 1) + codes)
+    if ids is None:
+        return np.zeros(0, dtype=bool)
+    return pd.Series(ids, copy=False).duplicated(keep=keep).to_numpy()
+
+
+def serialize_keys(keys):
+    """Serialise each key row to a single string used for verification"""
+    serialized = None
+    for column in keys.columns:
+        values = keys[column].astype(str).where(keys[column].notna(), '\x00')
+        if serialized is None:
+            serialized = values
+        else:
+            serialized = serialized + KEY_SEPARATOR + values
+    return serialized
+
+
+class HashedDeduplicator:
+    """
+    Tracks distinct keys across chunks.
+
+    ``observe`` is fed the normalised keys of each chunk (indexed by row
+    number) and returns the row numbers that introduce a new key. With
+    ``keep='last'`` the row number stored for a key is replaced each time
+    it is seen again and ``kept_rows`` gives the final selection.
+    """
+
+    def __init__(self, keep='first', in_memory_hashes=True, spill_dir=None):
+        self.keep = keep
+        self.in_memory_hashes = in_memory_hashes
+        self.seen = np.empty(0, dtype=np.uint64)
+        self.distinct = 0
+        self.collisions = 0
+
+        self._tmpdir = tempfile.mkdtemp(prefix='dedup_', dir=spill_dir)
+        self._db = sqlite3.connect(os.path.join(self._tmpdir, 'keys.db'))
+        self._db.executescript(
+            'PRAGMA journal_mode = OFF;'
+            'PRAGMA synchronous = OFF;'
+            'CREATE TABLE keys ('
+            '  hash INTEGER NOT NULL, key TEXT NOT NULL, row INTEGER NOT NULL,'
+            '  PRIMARY KEY (hash, key)) WITHOUT ROWID;'
+            'CREATE TEMP TABLE probe ('
+            '  hash INTEGER NOT NULL, key TEXT NOT NULL, row INTEGER NOT NULL);'
+        )
+
+    def close(self):
+        self._db.close()
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _is_seen(self, hashes):
+        if not len(self.seen):
+            return np.zeros(len(hashes), dtype=bool)
+        positions = np.searchsorted(self.seen, hashes)
+        positions[positions == len(self.seen)] = 0
+        return self.seen[positions] == hashes
+
+    def _insert(self, hashes, keys, rows):
+        self._db.executemany(
+            'INSERT OR IGNORE INTO keys (hash, key, row) VALUES (?, ?, ?)',
+            zip(hashes.view(np.int64).tolist(), keys, rows)
+        )
+        self.distinct += len(rows)
+
+    def observe(self, keys):
+        """Return the row numbers of ``keys`` that are new distinct keys"""
+        # Exact comparison inside the chunk, hashes across chunks
+        representatives = keys[~keys.duplicated(keep=self.keep)]
+        rows = representatives.index.to_numpy(dtype=np.int64)
+        hashes = pd.util.hash_pandas_object(
+            representatives, index=False
+        ).to_numpy()
+        serialized = serialize_keys(representatives).to_numpy()
+
+        if self.in_memory_hashes:
+            hit = self._is_seen(hashes)
+        else:
+            hit = np.ones(len(hashes), dtype=bool)
+
+        new_rows = [rows[~hit]]
+        self._insert(hashes[~hit], serialized[~hit], rows[~hit].tolist())
+
+        if hit.any():
+            # Verify every hash hit against the stored key
+            self._db.execute('DELETE FROM probe')
+            self._db.executemany(
+                'INSERT INTO probe (hash, key, row) VALUES (?, ?, ?)',
+                zip(hashes[hit].view(np.int64).tolist(),
+                    serialized[hit], rows[hit].tolist())
+            )
+            matches = self._db.execute(
+                'SELECT p.hash, p.key, p.row FROM probe p JOIN keys k '
+                'ON k.hash = p.hash AND k.key = p.key'
+            ).fetchall()
+            duplicates = np.array([row for _, _, row in matches],
+                                  dtype=np.int64)
+            if self.keep == 'last':
+                self._db.executemany(
+                    'UPDATE keys SET row = ? WHERE hash = ? AND key = ?',
+                    ((row, hash_, key) for hash_, key, row in matches)
+                )
+
+            unmatched = hit.copy()
+            unmatched[hit] = ~np.isin(rows[hit], duplicates)
+            if self.in_memory_hashes:
+                # Same hash, different key: a genuine collision
+                self.collisions += int(unmatched.sum())
+            self._insert(hashes[unmatched], serialized[unmatched],
+                         rows[unmatched].tolist())
+            new_rows.append(rows[unmatched])
+
+        if self.in_memory_hashes:
+            self.seen = np.union1d(self.seen, hashes[~hit])
+
+        new_rows = np.concatenate(new_rows)
+        new_rows.sort()
+        return new_rows
+
+    def kept_rows(self):
+        """Sorted row numbers that survive de-duplication"""
+        rows = np.fromiter(
+            (row for (row,) in self._db.execute('SELECT row FROM keys')),
+            dtype=np.int64
+        )
+        rows.sort()
+        return rows
@@ -0,0 +1,155 @@
+"""
+Routing of CSV operations to Celery queues.
+
+Small, cheap jobs go to the interactive queue and large or expensive ones
+to the bulk queue, so a long dedup never sits in front of a quick filter.
+The file size is weighted by the operation's cost class before it is
+compared with ``CSV_BULK_QUEUE_THRESHOLD_MB``.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from . import tracing
+from .models import TaskResult
+from .tasks import (
+    process_csv_dedup,
+    process_csv_unique,
+    process_csv_filter,
+    process_csv_profile,
+    process_csv_sample,
+    process_csv_top_k
+)
+
+COST_CLASS_WEIGHTS = {
+    'light': 1,
+    'medium': 2,
+    'heavy': 4,
+}
+
+OPERATION_COST_CLASS = {
+    'filter': 'light',
+    'sample': 'light',
+    'top_k': 'light',
+    'profile': 'medium',
+    'unique': 'heavy',
+    'dedup': 'heavy',
+}
+
+
+def choose_queue(operation, file_size):
+    """Return the queue name for an operation on a file of ``file_size``"""
+    weight = COST_CLASS_WEIGHTS[OPERATION_COST_CLASS.get(operation, 'heavy')]
+    threshold = settings.CSV_BULK_QUEUE_THRESHOLD_MB * 1024 * 1024
+    if file_size * weight > threshold:
+        return settings.CSV_BULK_QUEUE
+    return settings.CSV_INTERACTIVE_QUEUE
+
+
+def _task_signature(task_result):
+    """Build (task, args, kwargs) from the stored operation parameters"""
+    params = task_result.operation_params
+    task_id = task_result.task_id
+    file_id = task_result.csv_file_id
+    operation = task_result.operation
+
+    if operation == 'dedup':
+        return process_csv_dedup, (task_id, file_id), {
+            'subset': params.get('subset'),
+            'keep': params.get('keep', 'first'),
+            'ignore_case': params.get('ignore_case', False),
+            'trim_whitespace': params.get('trim_whitespace', False),
+            'round_digits': params.get('round_digits'),
+        }
+    elif operation == 'unique':
+        return process_csv_unique, (task_id, file_id, params['column']), {}
+    elif operation == 'filter':
+        return process_csv_filter, (
+            task_id, file_id, params.get('filters', [])
+        ), {'use_index': params.get('use_index', False)}
+    elif operation == 'profile':
+        return process_csv_profile, (task_id, file_id), {}
+    elif operation == 'sample':
+        return process_csv_sample, (task_id, file_id), {
+            'k': params.get('k'),
+            'fraction': params.get('fraction'),
+            'seed': params.get('seed'),
+        }
+    elif operation == 'top_k':
+        return process_csv_top_k, (
+            task_id, file_id, params['column'], params['k']
+        ), {'order': params.get('order', 'largest')}
+    raise ValueError(f"Unsupported operation: {operation}")
+
+
+def enqueue_operation(task_result):
+    """Send the task to its queue and record where and when it went"""
+    task, args, kwargs = _task_signature(task_result)
+    queue = choose_queue(task_result.operation, task_result.csv_file.file_size)
+
+    task_result.queue = queue
+    task_result.enqueued_at = timezone.now()
+    task_result.save(update_fields=['queue', 'enqueued_at'])
+
+    # Carry the caller's trace to the worker
+    task.apply_async(args=args, kwargs=kwargs, queue=queue,
+                     headers=tracing.inject())
+    return queue
+
+
+def _percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def queue_wait_stats(hours=24, limit=10000):
+    """
+    Queue wait (enqueue -> start) per queue over the last ``hours``, plus
+    the number of tasks still waiting and how long the oldest has waited.
+    """
+    now = timezone.now()
+    started = TaskResult.objects.filter(
+        enqueued_at__gte=now - timedelta(hours=hours),
+        started_at__isnull=False
+    ).order_by('-enqueued_at').values_list(
+        'queue', 'enqueued_at', 'started_at'
+    )[:limit]
+
+    waits = {}
+    for queue, enqueued_at, started_at in started:
+        wait = max((started_at - enqueued_at).total_seconds(), 0.0)
+        waits.setdefault(queue, []).append(wait)
+
+    stats = {}
+    for queue, values in waits.items():
+        values.sort()
+        stats[queue] = {
+            'started': len(values),
+            'wait_avg_seconds': sum(values) / len(values),
+            'wait_p50_seconds': _percentile(values, 0.50),
+            'wait_p95_seconds': _percentile(values, 0.95),
+            'wait_max_seconds': values[-1],
+            'waiting': 0,
+            'oldest_waiting_seconds': None,
+        }
+
+    waiting = TaskResult.objects.filter(
+        enqueued_at__isnull=False, started_at__isnull=True, status='PENDING'
+    ).values('queue').annotate(count=Count('id'), oldest=Min('enqueued_at'))
+    for row in waiting:
+        entry = stats.setdefault(row['queue'], {
+            'started': 0,
+            'wait_avg_seconds': None,
+            'wait_p50_seconds': None,
+            'wait_p95_seconds': None,
+            'wait_max_seconds': None,
+        })
+        entry['waiting'] = row['count']
+        entry['oldest_waiting_seconds'] = (now - row['oldest']).total_seconds()
+
+    return stats
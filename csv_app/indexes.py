@@ -0,0 +1,624 @@
+"""
+On-disk indexes for repeated filters on the same file.
+
+Filters run with ``use_index`` build them on first use and keep them under
+``CSV_INDEX_DIR``, a cache local to each worker:
+
+* the ``layout`` of a file - the byte range of every row, found by a
+  quote-aware scan of the raw bytes, and the dtype every column has when
+  the whole file is parsed; shared by all indexes of the file
+* an ``equality`` index per column - the 64-bit hash of every value,
+  sorted, with the row each comes from and a directory of hash buckets,
+  so ``==`` and ``!=`` find their rows without parsing the file
+* a ``range`` index per numeric column - its finite values, sorted, with
+  their rows; ``>``, ``>=``, ``<`` and ``<=`` binary-search their bounds
+
+Arrays are stored as ``.npy`` files and memory-mapped when loaded. Each
+index records the size and modification time of the file it describes and
+is rebuilt when they change. Every index first counts the rows its
+condition selects; the planner (``plan_index_lookup``) keeps the selective
+conditions, or falls back to a scan when there are none. The file is also
+scanned when the rows they all select are too scattered to fetch in at most
+``CSV_INDEX_MAX_READS`` reads. Otherwise those rows are read by offset,
+parsed with the dtypes of the whole file, and every condition is then
+checked on them exactly as in a scan.
+"""
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from .planner import plan_index_lookup
+
+# Bytes scanned at a time for row boundaries
+SCAN_BLOCK_SIZE = 4 * 1024 * 1024
+# Rows parsed at a time while building
+BUILD_CHUNK_ROWS = 200000
+# Top hash bits selecting a bucket of the equality index
+BUCKET_BITS = 16
+# Largest read of selected rows merged across gaps
+READ_MAX_BYTES = 8 * 1024 * 1024
+
+# Recently loaded indexes: key -> (source signature, index)
+_loaded = {}
+_MAX_LOADED = 64
+
+
+def _index_dir(file_id):
+    return os.path.join(settings.CSV_INDEX_DIR, str(file_id))
+
+
+def drop_indexes(file_id):
+    """Delete every index of a file (e.g. once the file is deleted)"""
+    shutil.rmtree(_index_dir(file_id), ignore_errors=True)
+    for key in [key for key in _loaded if key[0] == file_id]:
+        del _loaded[key]
+
+
+def _source_signature(csv_file):
+    """(size, modification time) of the stored file"""
+    name = csv_file.file_path.name
+    return [default_storage.size(name),
+            default_storage.get_modified_time(name).timestamp()]
+
+
+def _save_array(directory, filename, array):
+    """Write an array next to its final name and rename it into place"""
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as handle:
+        np.save(handle, array)
+    os.replace(temp_path, os.path.join(directory, filename))
+
+
+def _save_meta(directory, filename, meta):
+    """The metadata goes last: an index exists once its metadata does"""
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as handle:
+        json.dump(meta, handle)
+    os.replace(temp_path, os.path.join(directory, filename))
+
+
+def _load_meta(directory, filename):
+    try:
+        with open(os.path.join(directory, filename)) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+def _load_array(directory, filename):
+    return np.load(os.path.join(directory, filename), mmap_mode='r')
+
+
+def _read_range(raw, start, stop):
+    """Bytes [start, stop) of a raw file, however short its reads are"""
+    raw.seek(start)
+    parts = []
+    remaining = stop - start
+    while remaining > 0:
+        data = raw.read(remaining)
+        if not data:
+            break
+        parts.append(data)
+        remaining -= len(data)
+    return b''.join(parts)
+
+
+def _line_bounds(source):
+    """Offsets where each line starts, plus the end of the last line"""
+    bounds = [np.zeros(1, dtype=np.int64)]
+    in_quotes = 0
+    position = 0
+    while True:
+        block = source.read(SCAN_BLOCK_SIZE)
+        if not block:
+            break
+        data = np.frombuffer(block, dtype=np.uint8)
+        # Quote parity after each byte; uint8 wraps but keeps the parity
+        parity = (np.cumsum(data == ord('"'), dtype=np.uint8) + in_quotes) & 1
+        newlines = np.flatnonzero((data == ord('\n')) & (parity == 0))
+        bounds.append(newlines.astype(np.int64) + position + 1)
+        in_quotes = int(parity[-1])
+        position += len(data)
+    bounds = np.concatenate(bounds)
+    if bounds[-1] != position:
+        # Last line without a trailing newline
+        bounds = np.append(bounds, position)
+    return bounds
+
+
+def _merge_dtypes(kinds):
+    """
+    Dtype of a column parsed whole, from the dtypes of its chunks (None:
+    an all-missing chunk), or None when the column mixes types
+    """
+    has_missing = None in kinds
+    kinds = kinds - {None}
+    if not kinds:
+        return 'float64'
+    if kinds == {'object'}:
+        return 'object'
+    if kinds <= {'int64', 'float64'}:
+        return 'int64' if kinds == {'int64'} and not has_missing else 'float64'
+    if len(kinds) == 1 and not has_missing and 'mixed' not in kinds:
+        return kinds.pop()
+    return None
+
+
+class Layout:
+    """Row byte ranges and column dtypes of one file"""
+
+    FILENAME = 'layout.json'
+
+    def __init__(self, meta, offsets):
+        self.meta = meta
+        self.offsets = offsets
+
+    @property
+    def rows(self):
+        return self.meta['rows']
+
+    @property
+    def dtypes(self):
+        return self.meta['dtypes']
+
+    @property
+    def usable(self):
+        return self.meta['reason'] is None
+
+    @classmethod
+    def build(cls, directory, source, signature):
+        started = time.perf_counter()
+        bounds = _line_bounds(source)
+        header_end = int(bounds[1]) if len(bounds) > 1 else 0
+        starts, ends = bounds[1:-1], bounds[2:]
+        # The parser skips empty lines
+        keep = (ends - starts) > 1
+        offsets = np.column_stack([starts[keep], ends[keep]])
+
+        source.seek(0)
+        rows = 0
+        kinds = {}
+        for chunk in pd.read_csv(source, chunksize=BUILD_CHUNK_ROWS):
+            rows += len(chunk)
+            for column in chunk.columns:
+                series = chunk[column]
+                if not series.notna().any():
+                    kind = None
+                elif series.dtype == object:
+                    kind = ('object' if pd.api.types.infer_dtype(
+                        series, skipna=True) == 'string' else 'mixed')
+                else:
+                    kind = series.dtype.name
+                kinds.setdefault(str(column), set()).add(kind)
+        dtypes = {column: _merge_dtypes(column_kinds)
+                  for column, column_kinds in kinds.items()}
+
+        reason = None
+        if rows != len(offsets):
+            reason = 'row boundaries differ from the parser'
+        elif None in dtypes.values():
+            reason = 'columns with mixed types'
+        meta = {
+            'source': signature,
+            'rows': rows,
+            'header_end': header_end,
+            'dtypes': dtypes,
+            'reason': reason,
+            'build_seconds': round(time.perf_counter() - started, 6),
+        }
+        _save_array(directory, 'offsets.npy', offsets)
+        _save_meta(directory, cls.FILENAME, meta)
+        return cls(meta, _load_array(directory, 'offsets.npy'))
+
+    @classmethod
+    def load(cls, directory, signature):
+        meta = _load_meta(directory, cls.FILENAME)
+        if meta is None or meta['source'] != signature:
+            return None
+        try:
+            return cls(meta, _load_array(directory, 'offsets.npy'))
+        except (OSError, ValueError):
+            return None
+
+    def read_rows(self, source, rows, batch_rows=None):
+        """
+        Yield (frame, bytes read) for the data rows ``rows`` (ascending),
+        at most ``batch_rows`` rows per frame, typed as when the whole
+        file is parsed. Nearby rows are fetched with one read (see
+        ``_reads``); an empty selection yields one empty frame.
+        """
+        raw = getattr(source, 'raw', source)
+        header = _read_range(raw, 0, self.meta['header_end'])
+        bytes_read = len(header)
+        batch_rows = batch_rows or max(len(rows), 1)
+        parts = [header]
+        count = 0
+        for group in _reads(_runs(self.offsets[rows], batch_rows)):
+            block_start = group[0][0]
+            block = memoryview(_read_range(raw, block_start, group[-1][1]))
+            bytes_read += len(block)
+            for start, stop, run_rows in group:
+                if count + run_rows > batch_rows:
+                    yield self._parse(parts), bytes_read
+                    parts, count, bytes_read = [header], 0, 0
+                parts.append(block[start - block_start:stop - block_start])
+                count += run_rows
+        if count or not len(rows):
+            yield self._parse(parts), bytes_read
+
+    def count_reads(self, rows):
+        """Reads ``read_rows`` needs for ``rows``, not counting size limits"""
+        if not len(rows):
+            return 0
+        spans = self.offsets[rows]
+        gaps = spans[1:, 0] - spans[:-1, 1]
+        return int(np.count_nonzero(
+            gaps > settings.CSV_INDEX_READ_GAP_KB * 1024
+        )) + 1
+
+    def _parse(self, parts):
+        return pd.read_csv(io.BytesIO(b''.join(parts)), dtype=self.dtypes)
+
+
+def _runs(spans, max_rows):
+    """
+    Yield (start, stop, rows) byte ranges of adjacent rows among ``spans``
+    (row start and end offsets), at most ``max_rows`` rows each
+    """
+    if not len(spans):
+        return
+    breaks = np.flatnonzero(spans[1:, 0] != spans[:-1, 1]) + 1
+    bounds = np.r_[0, breaks, len(spans)].tolist()
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        for begin in range(first, last, max_rows):
+            end = min(begin + max_rows, last)
+            yield int(spans[begin, 0]), int(spans[end - 1, 1]), end - begin
+
+
+def _reads(runs):
+    """
+    Group runs into reads: runs at most ``CSV_INDEX_READ_GAP_KB`` apart
+    are fetched together (the bytes between are read and dropped), up to
+    ``READ_MAX_BYTES`` per read. On S3 every read is a ranged GET.
+    """
+    gap = settings.CSV_INDEX_READ_GAP_KB * 1024
+    group = []
+    for run in runs:
+        if group and (run[0] - group[-1][1] > gap
+                      or run[1] - group[0][0] > READ_MAX_BYTES):
+            yield group
+            group = []
+        group.append(run)
+    if group:
+        yield group
+
+
+def _column_chunks(source, column, dtype):
+    """Yield (values, row of the first value) of one column, chunk by chunk"""
+    source.seek(0)
+    offset = 0
+    for chunk in pd.read_csv(source, usecols=[column], dtype={column: dtype},
+                             chunksize=BUILD_CHUNK_ROWS):
+        yield chunk[column], offset
+        offset += len(chunk)
+
+
+def _hash_values(values, dtype):
+    """64-bit hashes of values compared as the filter compares them"""
+    if dtype == 'object':
+        return pd.util.hash_array(np.asarray(values, dtype=object))
+    # Numbers are compared as floats; -0.0 == 0.0
+    return pd.util.hash_array(np.asarray(values, dtype=np.float64) + 0.0)
+
+
+class ColumnIndex:
+    """
+    Arrays built from one column, stored as ``{KIND}-{column key}.*.npy``.
+    Subclasses list the operators and column dtypes they serve and build
+    their ``ARRAYS`` from the column's values.
+    """
+
+    KIND = None
+    ARRAYS = ()
+    OPERATORS = ()
+    DTYPES = ()
+
+    def __init__(self, meta, arrays):
+        self.meta = meta
+        for name, array in zip(self.ARRAYS, arrays):
+            setattr(self, name, array)
+
+    @classmethod
+    def prefix(cls, column):
+        return f"{cls.KIND}-{hashlib.sha1(column.encode()).hexdigest()[:16]}"
+
+    @classmethod
+    def build(cls, directory, source, column, layout, signature):
+        started = time.perf_counter()
+        dtype = layout.dtypes[column]
+        arrays = cls.build_arrays(_column_chunks(source, column, dtype), dtype)
+        prefix = cls.prefix(column)
+        meta = {
+            'source': signature,
+            'column': column,
+            'dtype': dtype,
+            'build_seconds': round(time.perf_counter() - started, 6),
+        }
+        for name, array in zip(cls.ARRAYS, arrays):
+            _save_array(directory, f'{prefix}.{name}.npy', array)
+        _save_meta(directory, f'{prefix}.json', meta)
+        return cls.load(directory, column, signature)
+
+    @classmethod
+    def load(cls, directory, column, signature):
+        prefix = cls.prefix(column)
+        meta = _load_meta(directory, f'{prefix}.json')
+        if meta is None or meta['source'] != signature:
+            return None
+        try:
+            return cls(meta, [_load_array(directory, f'{prefix}.{name}.npy')
+                              for name in cls.ARRAYS])
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def build_arrays(cls, chunks, dtype):
+        raise NotImplementedError
+
+    @staticmethod
+    def filter_value(value, dtype):
+        """The filter value as the scan compares it, or None if it cannot be"""
+        if dtype == 'object':
+            return value
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            # The scan reports the error
+            return None
+
+    def probe(self, operator, value, total_rows):
+        """
+        (number of rows selected, function returning them in ascending
+        order): counting is cheap, fetching the rows is only done for
+        conditions the planner picks
+        """
+        raise NotImplementedError
+
+
+class EqualityIndex(ColumnIndex):
+    """Sorted value hashes of one column with their rows"""
+
+    KIND = 'eq'
+    ARRAYS = ('hashes', 'rows', 'buckets')
+    OPERATORS = ('==', '!=')
+    # Numbers are hashed as float64, text as strings
+    DTYPES = ('int64', 'float64', 'object')
+
+    @classmethod
+    def build_arrays(cls, chunks, dtype):
+        hashes = [np.empty(0, np.uint64)]
+        rows = [np.empty(0, np.int64)]
+        for values, offset in chunks:
+            # Missing values are never equal to anything
+            present = values.notna().to_numpy()
+            hashes.append(_hash_values(values[present], dtype))
+            rows.append(np.flatnonzero(present) + offset)
+        hashes = np.concatenate(hashes)
+        rows = np.concatenate(rows)
+
+        order = np.argsort(hashes, kind='stable')
+        hashes = hashes[order]
+        rows = rows[order].astype(np.int64)
+        buckets = np.searchsorted(
+            hashes, np.arange(2 ** BUCKET_BITS + 1, dtype=np.uint64)
+            << np.uint64(64 - BUCKET_BITS)
+        )
+        # The last boundary wraps around to 0: it is the end of the array
+        buckets[-1] = len(hashes)
+        return hashes, rows, buckets
+
+    def probe(self, operator, value, total_rows):
+        value_hash = _hash_values([value], self.meta['dtype'])[0]
+        bucket = int(value_hash >> np.uint64(64 - BUCKET_BITS))
+        low, high = int(self.buckets[bucket]), int(self.buckets[bucket + 1])
+        candidates = self.hashes[low:high]
+        start = low + int(np.searchsorted(candidates, value_hash, 'left'))
+        stop = low + int(np.searchsorted(candidates, value_hash, 'right'))
+
+        def rows():
+            # Rows whose hash matches; the scan's check drops collisions
+            matches = np.sort(self.rows[start:stop])
+            if operator == '!=':
+                return np.setdiff1d(np.arange(total_rows), matches,
+                                    assume_unique=True)
+            return matches
+
+        matched = stop - start
+        return (matched if operator == '==' else total_rows - matched), rows
+
+
+class RangeIndex(ColumnIndex):
+    """Finite values of a numeric column, sorted, with their rows"""
+
+    KIND = 'range'
+    ARRAYS = ('values', 'rows')
+    OPERATORS = ('>', '>=', '<', '<=')
+    # Dates are not parsed by the reader: date-like columns are text
+    DTYPES = ('int64', 'float64')
+
+    @classmethod
+    def build_arrays(cls, chunks, dtype):
+        values = [np.empty(0, np.float64)]
+        rows = [np.empty(0, np.int64)]
+        for column, offset in chunks:
+            column = column.to_numpy(dtype=np.float64)
+            # Infinities become missing before the scan compares anything
+            finite = np.isfinite(column)
+            values.append(column[finite])
+            rows.append(np.flatnonzero(finite) + offset)
+        values = np.concatenate(values)
+        rows = np.concatenate(rows)
+        order = np.argsort(values, kind='stable')
+        return values[order], rows[order].astype(np.int64)
+
+    def probe(self, operator, value, total_rows):
+        start, stop = 0, len(self.values)
+        if np.isnan(value):
+            stop = 0
+        elif operator == '>':
+            start = int(np.searchsorted(self.values, value, 'right'))
+        elif operator == '>=':
+            start = int(np.searchsorted(self.values, value, 'left'))
+        elif operator == '<':
+            stop = int(np.searchsorted(self.values, value, 'left'))
+        else:
+            stop = int(np.searchsorted(self.values, value, 'right'))
+        return stop - start, lambda: np.sort(self.rows[start:stop])
+
+
+INDEX_TYPES = (EqualityIndex, RangeIndex)
+
+
+def _index_type(operator):
+    for index_type in INDEX_TYPES:
+        if operator in index_type.OPERATORS:
+            return index_type
+    return None
+
+
+def _cached(key, signature, load):
+    entry = _loaded.get(key)
+    if entry is not None and entry[0] == signature:
+        return entry[1], False
+    index, built = load()
+    if index is not None:
+        if len(_loaded) >= _MAX_LOADED:
+            _loaded.clear()
+        _loaded[key] = (signature, index)
+    return index, built
+
+
+def select_rows(csv_file, conditions, timer):
+    """
+    Choose the rows the indexes select for ``conditions``.
+
+    Returns (``Selection`` of candidate rows or None, rows in the file,
+    report). The selection is None when the indexes cannot serve the
+    filter (the report says why) and the file has to be scanned. Every
+    condition must still be applied to the rows read from it.
+    """
+    report = {'used': False, 'reason': None, 'layout_build_seconds': None,
+              'build_seconds': {}}
+    if not any(_index_type(condition['operator']) for condition in conditions):
+        report['reason'] = 'no indexable condition'
+        return None, None, report
+
+    signature = _source_signature(csv_file)
+    directory = _index_dir(csv_file.id)
+    os.makedirs(directory, exist_ok=True)
+    with default_storage.open_input(csv_file.file_path.name) as source:
+        with timer.stage('index'):
+            def load_layout():
+                layout = Layout.load(directory, signature)
+                if layout is not None:
+                    return layout, False
+                timer.bytes_read += csv_file.file_size
+                return Layout.build(directory, source, signature), True
+
+            layout, built = _cached((csv_file.id, 'layout'), signature,
+                                    load_layout)
+            if built:
+                report['layout_build_seconds'] = layout.meta['build_seconds']
+            if not layout.usable:
+                report['reason'] = layout.meta['reason']
+                return None, None, report
+
+            # Rows each indexable condition selects: position -> (count, rows)
+            probes = {}
+            for position, condition in enumerate(conditions):
+                index_type = _index_type(condition['operator'])
+                column = condition['column']
+                dtype = layout.dtypes.get(column)
+                if index_type is None or dtype not in index_type.DTYPES:
+                    continue
+                value = index_type.filter_value(condition['value'], dtype)
+                if value is None:
+                    continue
+
+                def load_index():
+                    index = index_type.load(directory, column, signature)
+                    if index is not None:
+                        return index, False
+                    timer.bytes_read += csv_file.file_size
+                    return index_type.build(directory, source, column,
+                                            layout, signature), True
+
+                index, built = _cached(
+                    (csv_file.id, index_type.KIND, column), signature, load_index
+                )
+                if built:
+                    report['build_seconds'][
+                        f'{index_type.KIND}:{column}'
+                    ] = index.meta['build_seconds']
+                probes[position] = index.probe(condition['operator'], value,
+                                               layout.rows)
+
+            if not probes:
+                report['reason'] = 'no indexable condition'
+                return None, None, report
+            estimates = {position: count
+                         for position, (count, _) in probes.items()}
+            report['estimated_rows'] = estimates
+            chosen = plan_index_lookup(estimates, layout.rows)
+            if not chosen:
+                report['reason'] = 'not selective enough'
+                return None, None, report
+
+            selected = probes[chosen[0]][1]()
+            for position in chosen[1:]:
+                selected = np.intersect1d(selected, probes[position][1](),
+                                          assume_unique=True)
+        report['conditions_used'] = chosen
+        report['candidate_rows'] = int(len(selected))
+        # Scattered rows (typical of ranges) cost a read each
+        reads = layout.count_reads(selected)
+        report['reads'] = reads
+        if reads > settings.CSV_INDEX_MAX_READS:
+            report['reason'] = 'rows too scattered'
+            return None, None, report
+    report['used'] = True
+    return Selection(csv_file, layout, selected), layout.rows, report
+
+
+class Selection:
+    """Rows of a file chosen through its indexes"""
+
+    def __init__(self, csv_file, layout, rows):
+        self.csv_file = csv_file
+        self.layout = layout
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def chunks(self, batch_rows, timer):
+        """Yield the rows as frames of at most ``batch_rows`` rows"""
+        with default_storage.open_input(self.csv_file.file_path.name) as source:
+            batches = self.layout.read_rows(source, self.rows, batch_rows)
+            while True:
+                with timer.stage('read'):
+                    batch = next(batches, None)
+                if batch is None:
+                    return
+                frame, bytes_read = batch
+                timer.bytes_read += bytes_read
+                yield frame
@@ -0,0 +1,164 @@
+"""
+Prometheus metrics for the web and worker processes.
+
+The web process serves them at ``/metrics``; each Celery worker starts a
+small exporter on ``CELERY_METRICS_PORT`` when it is ready. With a
+prefork pool (or several gunicorn workers) set ``PROMETHEUS_MULTIPROC_DIR``
+so that the samples of every child process are aggregated.
+"""
+import logging
+import os
+
+from django.conf import settings
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Seconds, from quick filters on small files to long bulk jobs
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300,
+                    600, 1800, 3600)
+SIZE_BUCKETS = tuple(2 ** power for power in range(10, 34, 2))
+
+TASKS = Counter(
+    'csv_tasks_total', 'Finished CSV tasks',
+    ['operation', 'status']
+)
+TASK_DURATION = Histogram(
+    'csv_task_duration_seconds', 'Run time of CSV tasks',
+    ['operation'], buckets=DURATION_BUCKETS
+)
+TASK_STAGE_SECONDS = Counter(
+    'csv_task_stage_seconds_total', 'Time spent per task stage',
+    ['operation', 'stage']
+)
+QUEUE_WAIT = Histogram(
+    'csv_task_queue_wait_seconds', 'Time between enqueue and start',
+    ['queue'], buckets=DURATION_BUCKETS
+)
+ROWS = Counter(
+    'csv_rows_total', 'Rows read and produced by CSV tasks',
+    ['operation', 'kind']
+)
+BYTES_READ = Counter(
+    'csv_bytes_read_total', 'CSV bytes parsed by tasks', ['operation']
+)
+BYTES_WRITTEN = Counter(
+    'csv_bytes_written_total', 'Result bytes written by tasks', ['operation']
+)
+UPLOAD_SIZE = Histogram(
+    'csv_upload_size_bytes', 'Size of uploaded CSV files',
+    buckets=SIZE_BUCKETS
+)
+TASK_STATUS_LATENCY = Histogram(
+    'csv_task_status_request_seconds', 'Latency of the task-status endpoint'
+)
+
+
+class QueueDepthCollector:
+    """Queue depth and pending bytes, read when the metrics are scraped"""
+
+    def collect(self):
+        # Imported lazily: the snapshot touches the ORM and the broker
+        from .admission import load_snapshot
+
+        snapshot = load_snapshot()
+        depth = GaugeMetricFamily(
+            'csv_queue_depth', 'Messages waiting per Celery queue',
+            labels=['queue']
+        )
+        for queue, messages in (snapshot['broker_queues'] or {}).items():
+            depth.add_metric([queue], messages)
+        yield depth
+        yield GaugeMetricFamily(
+            'csv_backlog_tasks', 'Tasks parked by the fair-share scheduler',
+            value=snapshot['backlog']
+        )
+        yield GaugeMetricFamily(
+            'csv_pending_bytes', 'Input bytes of tasks not yet started',
+            value=snapshot['pending_bytes']
+        )
+
+
+class _RegistryCollector:
+    """Adapter exposing another registry's samples as a collector"""
+
+    def __init__(self, source):
+        self.source = source
+
+    def collect(self):
+        return self.source.collect()
+
+
+def _multiprocess_enabled():
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+
+def registry():
+    """Registry to expose: merged across processes in multiprocess mode"""
+    if not _multiprocess_enabled():
+        return REGISTRY
+    merged = CollectorRegistry()
+    multiprocess.MultiProcessCollector(merged)
+    return merged
+
+
+def render():
+    """Return (body, content type) for a scrape of the web process"""
+    scrape = CollectorRegistry()
+    if _multiprocess_enabled():
+        multiprocess.MultiProcessCollector(scrape)
+    else:
+        scrape.register(_RegistryCollector(REGISTRY))
+    scrape.register(QueueDepthCollector())
+    return generate_latest(scrape), CONTENT_TYPE_LATEST
+
+
+def observe_task(task_result):
+    """Record a finished task (called from the worker's task_postrun)"""
+    operation = task_result.operation
+    TASKS.labels(operation, task_result.status).inc()
+    ROWS.labels(operation, 'read').inc(task_result.original_rows or 0)
+    ROWS.labels(operation, 'produced').inc(task_result.processed_rows or 0)
+
+    timings = task_result.timings
+    if not timings:
+        return
+    TASK_DURATION.labels(operation).observe(timings['total_seconds'])
+    for stage, seconds in timings['stages'].items():
+        TASK_STAGE_SECONDS.labels(operation, stage).inc(seconds)
+    if timings['queue_wait_seconds'] is not None:
+        QUEUE_WAIT.labels(task_result.queue or 'default').observe(
+            timings['queue_wait_seconds']
+        )
+    BYTES_READ.labels(operation).inc(timings['bytes_read'])
+    BYTES_WRITTEN.labels(operation).inc(timings['bytes_written'])
+
+
+def start_worker_exporter():
+    """Serve the worker's metrics over HTTP (once per worker)"""
+    port = settings.CELERY_METRICS_PORT
+    if not port:
+        return
+    try:
+        start_http_server(port, registry=registry())
+    except OSError:
+        logger.warning("Could not start metrics exporter on port %s", port,
+                       exc_info=True)
+    else:
+        logger.info("Metrics exporter listening on port %s", port)
+
+
+def mark_process_dead(pid):
+    """Drop live gauges of a pool process that exited"""
+    if _multiprocess_enabled():
+        multiprocess.mark_process_dead(pid)
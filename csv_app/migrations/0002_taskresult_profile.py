@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('csv_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskresult',
+            name='result_summary',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='taskresult',
+            name='operation',
+            field=models.CharField(choices=[('dedup', 'Deduplication'), ('unique', 'Unique Values'), ('filter', 'Filter Data'), ('profile', 'Column Profile')], max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('csv_app', '0002_taskresult_profile'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='taskresult',
+            name='operation',
+            field=models.CharField(choices=[('dedup', 'Deduplication'), ('unique', 'Unique Values'), ('filter', 'Filter Data'), ('profile', 'Column Profile'), ('sample', 'Random Sample'), ('top_k', 'Top K Rows')], max_length=10),
+        ),
+    ]
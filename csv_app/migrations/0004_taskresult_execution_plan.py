@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('csv_app', '0003_taskresult_sample_top_k'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskresult',
+            name='execution_plan',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='taskresult',
+            name='peak_rss_bytes',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('csv_app', '0004_taskresult_execution_plan'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskresult',
+            name='enqueued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='taskresult',
+            name='queue',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
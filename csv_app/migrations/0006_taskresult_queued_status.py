@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('csv_app', '0005_taskresult_queue'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='taskresult',
+            name='status',
+            field=models.CharField(choices=[('QUEUED', 'Queued'), ('PENDING', 'Pending'), ('PROGRESS', 'In Progress'), ('SUCCESS', 'Success'), ('FAILURE', 'Failed'), ('RETRY', 'Retrying')], default='PENDING', max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('csv_app', '0006_taskresult_queued_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskresult',
+            name='timings',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
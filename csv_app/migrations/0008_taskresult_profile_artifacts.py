@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('csv_app', '0007_taskresult_timings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskresult',
+            name='profile_artifacts',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
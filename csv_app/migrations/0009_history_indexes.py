@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('csv_app', '0008_taskresult_profile_artifacts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='csvfile',
+            index=models.Index(fields=['user', 'upload_date'], name='csv_files_user_upload_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taskresult',
+            index=models.Index(fields=['user', 'created_at'], name='task_results_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taskresult',
+            index=models.Index(fields=['user', 'status', 'created_at'], name='task_results_user_status_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('csv_app', '0009_history_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='csvfile',
+            index=models.Index(fields=['upload_date'], name='csv_files_upload_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taskresult',
+            index=models.Index(fields=['created_at'], name='task_results_created_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('csv_app', '0010_admin_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='result_ttl_days',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:53
+
+from django.conf import settings
+from django.db import migrations
+
+TASK_NAME = 'Expire old CSV results'
+
+
+def create_schedule(apps, schema_editor):
+    CrontabSchedule = apps.get_model('django_celery_beat', 'CrontabSchedule')
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+
+    # Daily at 03:30, outside business hours
+    schedule, _ = CrontabSchedule.objects.get_or_create(
+        minute='30', hour='3', day_of_week='*', day_of_month='*',
+        month_of_year='*', timezone=settings.TIME_ZONE,
+    )
+    PeriodicTask.objects.update_or_create(
+        name=TASK_NAME,
+        defaults={
+            'task': 'csv_app.tasks.expire_results',
+            'crontab': schedule,
+            # Long-running maintenance: keep it off the interactive workers
+            'queue': settings.CSV_BULK_QUEUE,
+            'description': 'Delete expired task results and orphaned files',
+        },
+    )
+
+
+def delete_schedule(apps, schema_editor):
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    PeriodicTask.objects.filter(name=TASK_NAME).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('csv_app', '0011_user_result_ttl_days'),
+        ('django_celery_beat', '0018_improve_crontab_helptext'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_schedule, delete_schedule),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('csv_app', '0012_retention_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskresult',
+            name='result_checksum',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='taskresult',
+            name='result_size',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
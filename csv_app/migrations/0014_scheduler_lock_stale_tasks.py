@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+TASK_NAME = 'Fail stale CSV tasks'
+
+
+def create_schedule(apps, schema_editor):
+    IntervalSchedule = apps.get_model('django_celery_beat', 'IntervalSchedule')
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+
+    schedule, _ = IntervalSchedule.objects.get_or_create(
+        every=10, period='minutes',
+    )
+    PeriodicTask.objects.update_or_create(
+        name=TASK_NAME,
+        defaults={
+            'task': 'csv_app.tasks.reap_stale_tasks',
+            'interval': schedule,
+            # Quick bookkeeping: must not wait behind bulk work
+            'queue': settings.CSV_INTERACTIVE_QUEUE,
+            'description': 'Fail tasks lost with their worker and free their '
+                           'fair-share slots',
+        },
+    )
+
+
+def delete_schedule(apps, schema_editor):
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    PeriodicTask.objects.filter(name=TASK_NAME).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('csv_app', '0013_taskresult_result_checksum'),
+        ('django_celery_beat', '0018_improve_crontab_helptext'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchedulerLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+            options={
+                'db_table': 'scheduler_lock',
+            },
+        ),
+        migrations.RunPython(create_schedule, delete_schedule),
+    ]
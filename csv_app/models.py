@@ -33,6 +33,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     date_joined = models.DateTimeField(default=timezone.now)
+    # Days to keep results (None: CSV_RESULT_TTL_DAYS, 0: keep forever)
+    result_ttl_days = models.PositiveIntegerField(null=True, blank=True)
 
     objects = UserManager()
 
@@ -59,6 +61,13 @@ class CSVFile(models.Model):
     class Meta:
         db_table = 'csv_files'
         ordering = ['-upload_date']
+        indexes = [
+            models.Index(fields=['user', 'upload_date'],
+                         name='csv_files_user_upload_idx'),
+            # Admin changelist ordering and date drill-down
+            models.Index(fields=['upload_date'],
+                         name='csv_files_upload_idx'),
+        ]
 
     def __str__(self):
         return f"{self.original_name} - {self.user.email}"
@@ -69,9 +78,13 @@ class TaskResult(models.Model):
         ('dedup', 'Deduplication'),
         ('unique', 'Unique Values'),
         ('filter', 'Filter Data'),
+        ('profile', 'Column Profile'),
+        ('sample', 'Random Sample'),
+        ('top_k', 'Top K Rows'),
     ]
 
     STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
         ('PENDING', 'Pending'),
         ('PROGRESS', 'In Progress'),
         ('SUCCESS', 'Success'),
@@ -92,16 +105,54 @@ class TaskResult(models.Model):
     result_file_path = models.FileField(upload_to='processed_csv/%Y/%m/%d/', null=True, blank=True)
     processed_rows = models.PositiveIntegerField(null=True, blank=True)
     original_rows = models.PositiveIntegerField(null=True, blank=True)
+    # Size and SHA-256 of the result file, computed while writing it
+    result_size = models.PositiveBigIntegerField(null=True, blank=True)
+    result_checksum = models.CharField(max_length=64, blank=True, default='')
     error_message = models.TextField(blank=True, null=True)
+    # JSON results for operations that do not produce a file (e.g. profile)
+    result_summary = models.JSONField(null=True, blank=True)
+
+    # Execution strategy chosen by the planner and peak worker memory
+    execution_plan = models.JSONField(null=True, blank=True)
+    peak_rss_bytes = models.PositiveBigIntegerField(null=True, blank=True)
+
+    # Per-stage durations, bytes read/written and queue wait
+    timings = models.JSONField(null=True, blank=True)
+
+    # cProfile/tracemalloc artifacts when profiling was requested
+    profile_artifacts = models.JSONField(null=True, blank=True)
+
+    # Celery queue the task was routed to
+    queue = models.CharField(max_length=32, blank=True, default='')
 
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
+    enqueued_at = models.DateTimeField(null=True, blank=True)
     started_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         db_table = 'task_results'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at'],
+                         name='task_results_user_created_idx'),
+            models.Index(fields=['user', 'status', 'created_at'],
+                         name='task_results_user_status_idx'),
+            # Admin changelist ordering and date drill-down
+            models.Index(fields=['created_at'],
+                         name='task_results_created_idx'),
+        ]
 
     def __str__(self):
         return f"Task {self.task_id} - {self.operation} - {self.status}"
+
+
+class SchedulerLock(models.Model):
+    """
+    Single row locked while the fair-share scheduler checks and claims a
+    slot under the global cap
+    """
+
+    class Meta:
+        db_table = 'scheduler_lock'
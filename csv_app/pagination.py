@@ -0,0 +1,68 @@
+"""
+Keyset (seek) pagination for the history endpoints.
+
+Pages are ordered newest first by (timestamp, id) and the cursor encodes
+the last row of the previous page, so every page is a single range scan
+on a (user, timestamp) index regardless of how deep the client has
+paged, unlike OFFSET which reads and discards every earlier row.
+"""
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(timestamp, pk):
+    raw = f'{timestamp.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (timestamp, pk) from a cursor; raises ValueError if invalid"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, pk = base64.urlsafe_b64decode(padded).decode().split('|')
+        parsed = parse_datetime(timestamp)
+        if parsed is None:
+            raise ValueError
+        return parsed, int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def parse_page_size(value):
+    """Page size from the query string, clamped to MAX_PAGE_SIZE"""
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        page_size = 0
+    if page_size < 1:
+        raise ValueError("page_size must be a positive integer")
+    return min(page_size, MAX_PAGE_SIZE)
+
+
+def paginate(queryset, field, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Return (rows, next_cursor) for the page after ``cursor``, newest first
+    by (``field``, id). ``next_cursor`` is None on the last page.
+    """
+    if cursor:
+        timestamp, pk = decode_cursor(cursor)
+        # The redundant <= bound gives MySQL an index range to seek to
+        queryset = queryset.filter(**{f'{field}__lte': timestamp}).filter(
+            Q(**{f'{field}__lt': timestamp}) | Q(id__lt=pk)
+        )
+
+    # One extra row tells whether there is a next page
+    rows = list(queryset.order_by(f'-{field}', '-id')[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, field), last.pk)
@@ -0,0 +1,161 @@
+"""
+Memory-budgeted execution planning for the CSV tasks.
+
+The planner samples the head of a file to estimate how wide a row is on
+disk and once parsed, then picks one of three strategies:
+
+* ``in_memory`` - parse the whole file at once (fastest, small files)
+* ``chunked``   - stream the file in chunks sized to the budget
+* ``spill``     - stream, and keep per-key state on disk instead of RAM
+
+Filters run with ``use_index`` also ask it which conditions to answer from
+column indexes (``plan_index_lookup``).
+"""
+import os
+import resource
+import threading
+
+import pandas as pd
+from django.conf import settings
+
+IN_MEMORY = 'in_memory'
+CHUNKED = 'chunked'
+SPILL = 'spill'
+
+SAMPLE_ROWS = 1000
+MIN_CHUNK_ROWS = 1000
+
+# Peak working set as a multiple of the parsed frame, per operation
+OPERATION_MEMORY_FACTOR = {
+    'dedup': 3.0,
+    'unique': 3.0,
+    'filter': 2.5,
+    'profile': 1.5,
+    'sample': 1.5,
+    'top_k': 1.5,
+}
+
+# Operations whose state grows with the number of distinct keys
+KEYED_OPERATIONS = ('dedup', 'unique')
+# In-memory bytes per distinct key for the hashed dedup (hash array and
+# the temporary copy made while merging it)
+KEY_STATE_BYTES = 16
+
+
+def estimate_row_width(source):
+    """
+    Return (bytes per row on disk, bytes per row once parsed) of the
+    seekable binary file ``source``
+    """
+    sample = pd.read_csv(source, nrows=SAMPLE_ROWS)
+    if sample.empty:
+        return 0, 0
+    source.seek(0)
+    lines = source.readlines(1 << 20)
+    # Header line excluded from the on-disk width
+    sampled = lines[1:len(sample) + 1]
+    disk_width = sum(len(line) for line in sampled) / max(len(sampled), 1)
+    memory_width = sample.memory_usage(index=True, deep=True).sum() / len(sample)
+    return disk_width, memory_width
+
+
+def plan_execution(operation, file_size, source):
+    """Choose an execution strategy for one task (``source``: the file)"""
+    budget = settings.CSV_WORKER_MEMORY_BUDGET_MB * 1024 * 1024
+    disk_width, memory_width = estimate_row_width(source)
+    factor = OPERATION_MEMORY_FACTOR.get(operation, 3.0)
+
+    plan = {
+        'operation': operation,
+        'memory_budget': budget,
+        'file_size': file_size,
+        'row_width_disk': round(disk_width, 1),
+        'row_width_memory': round(memory_width, 1),
+    }
+    if not disk_width:
+        plan.update({'strategy': IN_MEMORY, 'estimated_rows': 0,
+                     'estimated_memory': 0, 'chunk_size': None,
+                     'reason': 'empty file'})
+        return plan
+
+    estimated_rows = int(file_size / disk_width)
+    estimated_memory = int(estimated_rows * memory_width * factor)
+    plan.update({
+        'estimated_rows': estimated_rows,
+        'estimated_memory': estimated_memory,
+    })
+
+    if estimated_memory <= budget:
+        plan.update({'strategy': IN_MEMORY, 'chunk_size': None,
+                     'reason': 'whole file fits in the memory budget'})
+        return plan
+
+    # Leave half the budget for chunk processing, the rest for state
+    chunk_size = int(budget / 2 / (memory_width * factor))
+    chunk_size = max(MIN_CHUNK_ROWS, min(chunk_size, settings.CSV_CHUNK_SIZE))
+    plan['chunk_size'] = chunk_size
+
+    key_state = estimated_rows * KEY_STATE_BYTES
+    if operation in KEYED_OPERATIONS and key_state > budget / 2:
+        plan.update({'strategy': SPILL,
+                     'reason': 'distinct-key state may exceed the budget'})
+    else:
+        plan.update({'strategy': CHUNKED,
+                     'reason': 'file exceeds the memory budget'})
+    return plan
+
+
+def plan_index_lookup(estimates, total_rows):
+    """
+    Choose the filter conditions to answer from column indexes, given the
+    rows each indexed condition selects (condition position -> rows).
+
+    Fetching a row by offset costs far more than parsing it in a scan, so
+    conditions selecting more than ``CSV_INDEX_MAX_SELECTIVITY`` of the
+    rows are left to be checked on what the others select. Returns the
+    positions to use, most selective first; empty means scan the file.
+    """
+    limit = settings.CSV_INDEX_MAX_SELECTIVITY * total_rows
+    return sorted(
+        (position for position, rows in estimates.items() if rows <= limit),
+        key=estimates.get
+    )
+
+
+def current_rss():
+    """Resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakRSSMonitor:
+    """Samples RSS on a background thread and remembers the peak"""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        self.peak = max(self.peak, current_rss())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
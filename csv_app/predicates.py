@@ -0,0 +1,179 @@
+"""
+String predicates of the filter operation.
+
+Operators (and what ``value`` holds):
+
+* ``contains`` / ``not_contains`` (text) - substring, matched literally
+* ``startswith`` / ``endswith`` (text)
+* ``in`` (list) - equal to one of the values, looked up in a hash set;
+  numeric columns compare numbers, like ``==``
+* ``is_null`` (optional bool, default true) - the value is missing
+  (``false``: present)
+* ``regex`` (pattern) - the pattern matches anywhere in the value
+
+``ignore_case`` on a condition compares casefolded text. Other columns are
+matched through their string form (``1.5``, ``True``). Missing values only
+match ``is_null`` and ``not_contains``.
+
+Conditions are prepared once per task (``compile_condition``: needles,
+value sets, compiled patterns) and the string form of a column is made
+once per chunk however many conditions read it (``StringColumns``).
+Columns that repeat their values are factorised once per chunk and
+matched on their distinct values only.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+OPERATORS = ('contains', 'not_contains', 'startswith', 'endswith', 'in',
+             'is_null', 'regex')
+# Operators whose value is optional
+VALUELESS_OPERATORS = ('is_null',)
+
+# Values sampled to decide whether a column is worth factorising, and the
+# largest share of distinct values in the sample for which it is
+DISTINCT_SAMPLE_ROWS = 10000
+MAX_DISTINCT_RATIO = 0.5
+
+
+class StringColumns:
+    """The columns of one chunk as text, each converted at most once"""
+
+    def __init__(self, frame):
+        self.frame = frame
+        self._strings = {}
+        self._distinct = {}
+
+    def values(self, column):
+        if column not in self.frame.columns:
+            raise ValueError(f"Column '{column}' not found in CSV file")
+        return self.frame[column]
+
+    def strings(self, column, casefold=False):
+        """Column as str values, missing values kept as NaN"""
+        key = (column, casefold)
+        if key not in self._strings:
+            if casefold:
+                strings = self.strings(column).str.casefold()
+            else:
+                values = self.values(column)
+                if (values.dtype == object and pd.api.types.infer_dtype(
+                        values, skipna=True) in ('string', 'empty')):
+                    strings = values
+                else:
+                    strings = values.astype(str).where(values.notna())
+            self._strings[key] = strings
+        return self._strings[key]
+
+    def distinct(self, column, casefold=False):
+        """
+        (codes, distinct str values) of a column that repeats its values,
+        missing values coded -1; None when most values are distinct
+        """
+        key = (column, casefold)
+        if key not in self._distinct:
+            if casefold:
+                distinct = self.distinct(column)
+                if distinct is not None:
+                    codes, uniques = distinct
+                    distinct = codes, uniques.str.casefold()
+            else:
+                strings = self.strings(column)
+                sample = strings.iloc[:DISTINCT_SAMPLE_ROWS]
+                distinct = None
+                if sample.nunique() <= len(sample) * MAX_DISTINCT_RATIO:
+                    codes, uniques = pd.factorize(strings)
+                    distinct = codes, pd.Series(uniques, dtype=object)
+            self._distinct[key] = distinct
+        return self._distinct[key]
+
+    def match(self, column, predicate, casefold=False):
+        """
+        Boolean array of the rows whose str value satisfies ``predicate``
+        (str Series -> bool Series, False for missing values)
+        """
+        distinct = self.distinct(column, casefold)
+        if distinct is None:
+            return predicate(self.strings(column, casefold)).to_numpy(dtype=bool)
+        codes, uniques = distinct
+        # Code -1 (missing) picks the trailing False
+        matches = np.append(predicate(uniques).to_numpy(dtype=bool), False)
+        return matches[codes]
+
+
+def _numbers(column, values):
+    numbers = []
+    for value in values:
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(
+                f"Value '{value}' for column '{column}' must be a number."
+            )
+        # Missing values never compare equal
+        if not np.isnan(number):
+            numbers.append(number)
+    return numbers
+
+
+def compile_condition(condition):
+    """
+    Prepare a string condition for the whole task. Returns a function of a
+    chunk's ``StringColumns`` giving the boolean array of matching rows.
+    """
+    column = condition['column']
+    operator = condition['operator']
+    value = condition.get('value')
+    ignore_case = bool(condition.get('ignore_case'))
+
+    if operator == 'is_null':
+        present = value is not None and not value
+
+        def mask(columns):
+            missing = columns.values(column).isna().to_numpy()
+            return ~missing if present else missing
+        return mask
+
+    if operator == 'in':
+        texts = {str(item).casefold() if ignore_case else str(item)
+                 for item in value}
+        numbers = None
+
+        def mask(columns):
+            nonlocal numbers
+            values = columns.values(column)
+            if pd.api.types.is_numeric_dtype(values.dtype):
+                if numbers is None:
+                    numbers = _numbers(column, value)
+                return values.isin(numbers).to_numpy()
+            return columns.match(column, lambda strings: strings.isin(texts),
+                                 casefold=ignore_case)
+        return mask
+
+    if operator == 'regex':
+        pattern = re.compile(value, re.IGNORECASE if ignore_case else 0)
+
+        def mask(columns):
+            return columns.match(
+                column, lambda strings: strings.str.contains(pattern, na=False)
+            )
+        return mask
+
+    needle = str(value).casefold() if ignore_case else str(value)
+    if operator in ('contains', 'not_contains'):
+        def match(strings):
+            return strings.str.contains(needle, regex=False, na=False)
+    elif operator == 'startswith':
+        def match(strings):
+            return strings.str.startswith(needle, na=False)
+    elif operator == 'endswith':
+        def match(strings):
+            return strings.str.endswith(needle, na=False)
+    else:
+        raise ValueError(f"Unsupported operator: {operator}")
+
+    def mask(columns):
+        matches = columns.match(column, match, casefold=ignore_case)
+        return ~matches if operator == 'not_contains' else matches
+    return mask
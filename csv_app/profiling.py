@@ -0,0 +1,101 @@
+"""
+Opt-in CPU and memory profiling of a single task run.
+
+Requested with ``profile=true`` on perform-operation. The task runs under
+cProfile and tracemalloc and the results are written through the default
+storage under ``profiles/``, like results, so any web process can serve
+them whichever worker ran the task; only staff can download them through
+the API.
+"""
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import tracemalloc
+
+from django.core.files.storage import default_storage
+
+TOP_FUNCTIONS = 50
+TOP_ALLOCATIONS = 25
+TRACEBACK_FRAMES = 5
+
+ARTIFACT_FILES = {
+    'cpu_profile': '{task_id}.prof',
+    'cpu_summary': '{task_id}_cpu.txt',
+    'allocations': '{task_id}_allocations.txt',
+}
+PROFILE_DIR = 'profiles'
+
+
+def artifact_name(filename):
+    """Storage name of an artifact file"""
+    return f'{PROFILE_DIR}/{os.path.basename(filename)}'
+
+
+def _store(filename, data):
+    output = default_storage.open_output(artifact_name(filename))
+    try:
+        output.write(data)
+    except BaseException:
+        output.abort()
+        raise
+    output.commit()
+
+
+class TaskProfiler:
+    """Runs the wrapped block under cProfile and tracemalloc"""
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.snapshot = None
+        self.peak_traced_bytes = None
+
+    def __enter__(self):
+        tracemalloc.start(TRACEBACK_FRAMES)
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.disable()
+        self.snapshot = tracemalloc.take_snapshot()
+        self.peak_traced_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return False
+
+    def _cpu_summary(self):
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=stream)
+        stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        return stream.getvalue()
+
+    def _allocation_summary(self):
+        snapshot = self.snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        lines = [f"Peak traced memory: {self.peak_traced_bytes} bytes", '']
+        for index, stat in enumerate(
+            snapshot.statistics('traceback')[:TOP_ALLOCATIONS], 1
+        ):
+            lines.append(f"#{index}: {stat.size / 1024:.1f} KiB "
+                         f"in {stat.count} blocks")
+            lines.extend(f"    {line}" for line in stat.traceback.format())
+        return '\n'.join(lines) + '\n'
+
+    def save(self, task_id):
+        """Store the artifacts and return their file names"""
+        names = {
+            kind: pattern.format(task_id=task_id)
+            for kind, pattern in ARTIFACT_FILES.items()
+        }
+        # Same format as Profile.dump_stats, which needs a local path
+        self.profiler.create_stats()
+        _store(names['cpu_profile'], marshal.dumps(self.profiler.stats))
+        _store(names['cpu_summary'], self._cpu_summary().encode())
+        _store(names['allocations'], self._allocation_summary().encode())
+
+        return {
+            'files': names,
+            'peak_traced_bytes': self.peak_traced_bytes,
+        }
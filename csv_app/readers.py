@@ -0,0 +1,119 @@
+"""
+CSV reader backends.
+
+* ``c``       - pandas' C parser; streams in chunks (default)
+* ``pyarrow`` - pyarrow's multithreaded parser, for whole-file reads of
+  larger files; used only when the optional ``pyarrow`` package is installed
+* ``python``  - pandas' pure-Python parser, slow but the most lenient
+
+``CSV_READER_BACKEND`` forces a backend; ``auto`` picks one per file. All
+backends produce the same frame: pyarrow output is normalised to what the
+C parser returns, and files it would read differently are left to the C
+parser. Those are files with float columns (pyarrow parses them exactly,
+the C parser's default precision can differ in the last bit), columns it
+infers as dates, or types changing after the first block.
+"""
+import importlib.util
+import logging
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+AUTO = 'auto'
+C = 'c'
+PYARROW = 'pyarrow'
+PYTHON = 'python'
+BACKENDS = (C, PYARROW, PYTHON)
+
+_pyarrow_installed = None
+
+
+def pyarrow_available():
+    global _pyarrow_installed
+    if _pyarrow_installed is None:
+        _pyarrow_installed = importlib.util.find_spec('pyarrow') is not None
+    return _pyarrow_installed
+
+
+def choose_backend(file_size, chunked):
+    """Backend for a file of ``file_size`` bytes read whole or in chunks"""
+    backend = settings.CSV_READER_BACKEND
+    if backend == AUTO:
+        threshold = settings.CSV_PYARROW_MIN_MB * 1024 * 1024
+        backend = PYARROW if file_size >= threshold else C
+    # pandas cannot stream with pyarrow
+    if backend == PYARROW and (chunked or not pyarrow_available()):
+        return C
+    return backend
+
+
+def _rewind(source):
+    """Back to the start of a file object (paths need nothing)"""
+    if hasattr(source, 'seek'):
+        source.seek(0)
+
+
+def _pyarrow_matches_c(source):
+    """Whether pyarrow types the first block as the C parser would"""
+    import pyarrow
+    from pyarrow import csv as pyarrow_csv
+
+    try:
+        reader = pyarrow_csv.open_csv(source)
+    except pyarrow.ArrowInvalid:
+        return False
+    try:
+        types = reader.schema.types
+    finally:
+        reader.close()
+        _rewind(source)
+    return not any(
+        pyarrow.types.is_floating(column_type)
+        or pyarrow.types.is_temporal(column_type)
+        for column_type in types
+    )
+
+
+def _read_pyarrow(source):
+    """Whole file with pyarrow, or None when the C parser must read it"""
+    import pyarrow
+
+    if not _pyarrow_matches_c(source):
+        return None
+    try:
+        frame = pd.read_csv(source, engine=PYARROW)
+    except pyarrow.ArrowInvalid as exc:
+        # pyarrow fixes column types from the first block
+        logger.info("pyarrow could not parse %s, using the C parser: %s",
+                    getattr(source, 'name', source), exc)
+        _rewind(source)
+        return None
+
+    # Nulls in text and boolean columns are None with pyarrow, NaN with C
+    for column in frame.columns[frame.dtypes == object]:
+        values = frame[column].to_numpy()
+        missing = pd.isna(values)
+        if missing.any():
+            values = values.copy()
+            values[missing] = np.nan
+            frame[column] = values
+    return frame
+
+
+def read_csv(source, backend=C, chunksize=None):
+    """
+    Read ``source`` (a path or a seekable binary file) with ``backend``: a
+    frame, or an iterator of frames when ``chunksize`` is given. Returns
+    (frame or iterator, backend used).
+    """
+    if backend == PYARROW and chunksize is None:
+        frame = _read_pyarrow(source)
+        if frame is not None:
+            return frame, PYARROW
+        backend = C
+    elif backend == PYARROW:
+        backend = C
+    return pd.read_csv(source, engine=backend, chunksize=chunksize), backend
@@ -0,0 +1,146 @@
+"""
+Retention of processed results.
+
+Finished tasks older than their owner's TTL (``User.result_ttl_days``, or
+``CSV_RESULT_TTL_DAYS`` when unset; 0 keeps results forever) are deleted
+together with their result files, in batches of
+``CSV_RETENTION_BATCH_SIZE`` rows so no statement holds locks for long.
+Files under ``csv_files/`` and ``processed_csv/`` that no row references
+any more are reclaimed as well. Runs daily from celery-beat.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import CSVFile, TaskResult, User
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = ('SUCCESS', 'FAILURE')
+
+# Storage directory -> (model, file field) referencing the files in it
+MANAGED_DIRS = {
+    'csv_files': (CSVFile, 'file_path'),
+    'processed_csv': (TaskResult, 'result_file_path'),
+}
+
+
+def _file_size(name):
+    try:
+        return default_storage.size(name)
+    except Exception:
+        return 0
+
+
+def _expired(ttl_days, users):
+    """Finished tasks of ``users`` completed more than ``ttl_days`` ago"""
+    cutoff = timezone.now() - timedelta(days=ttl_days)
+    return TaskResult.objects.filter(users, status__in=FINAL_STATUSES).filter(
+        Q(completed_at__lt=cutoff)
+        | Q(completed_at__isnull=True, created_at__lt=cutoff)
+    )
+
+
+def _delete_in_batches(queryset, batch_size):
+    """Delete rows (and, through post_delete, their files) batch by batch"""
+    deleted = 0
+    freed = 0
+    while True:
+        batch = list(queryset.values_list(
+            'id', 'result_file_path', 'result_size'
+        )[:batch_size])
+        if not batch:
+            return deleted, freed
+        ids = [pk for pk, _, _ in batch]
+        # Sizes recorded when the results were written, else from storage
+        freed += sum(
+            size if size is not None else _file_size(name)
+            for _, name, size in batch if name
+        )
+        with transaction.atomic():
+            TaskResult.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+
+
+def expire_results(batch_size=None):
+    """Delete expired task rows and result files; returns (rows, bytes)"""
+    batch_size = batch_size or settings.CSV_RETENTION_BATCH_SIZE
+    deleted = 0
+    freed = 0
+
+    # Users on the global TTL, then each distinct per-user TTL
+    groups = []
+    if settings.CSV_RESULT_TTL_DAYS:
+        groups.append((settings.CSV_RESULT_TTL_DAYS,
+                       Q(user__result_ttl_days__isnull=True)))
+    custom_ttls = User.objects.filter(
+        result_ttl_days__gt=0
+    ).values_list('result_ttl_days', flat=True).distinct()
+    groups.extend((ttl, Q(user__result_ttl_days=ttl)) for ttl in custom_ttls)
+
+    for ttl_days, users in groups:
+        rows, size = _delete_in_batches(_expired(ttl_days, users), batch_size)
+        deleted += rows
+        freed += size
+    return deleted, freed
+
+
+def _candidate_batches(directory, grace, batch_size):
+    """Yield batches of (name, size) of stored files older than ``grace``"""
+    cutoff = (timezone.now() - grace).timestamp()
+    batch = []
+    for name, size, modified in default_storage.scan(directory):
+        # Skip files still being written or just uploaded
+        if modified >= cutoff:
+            continue
+        batch.append((name, size))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def reclaim_orphans(batch_size=None):
+    """Remove managed media files no row references; returns (files, bytes)"""
+    batch_size = batch_size or settings.CSV_RETENTION_BATCH_SIZE
+    grace = timedelta(hours=settings.CSV_RETENTION_ORPHAN_GRACE_HOURS)
+    removed = 0
+    freed = 0
+    for directory, (model, field) in MANAGED_DIRS.items():
+        for batch in _candidate_batches(directory, grace, batch_size):
+            referenced = set(model.objects.filter(**{
+                f'{field}__in': [name for name, _ in batch]
+            }).values_list(field, flat=True))
+            for name, size in batch:
+                if name in referenced:
+                    continue
+                try:
+                    default_storage.delete(name)
+                except Exception:
+                    logger.warning("Could not remove orphan %s", name,
+                                   exc_info=True)
+                    continue
+                removed += 1
+                freed += size
+    return removed, freed
+
+
+def run_retention(batch_size=None):
+    """Expire old results, reclaim orphans and report what was freed"""
+    expired_tasks, result_bytes = expire_results(batch_size)
+    orphan_files, orphan_bytes = reclaim_orphans(batch_size)
+    report = {
+        'expired_tasks': expired_tasks,
+        'result_bytes_freed': result_bytes,
+        'orphan_files_removed': orphan_files,
+        'orphan_bytes_freed': orphan_bytes,
+        'bytes_freed': result_bytes + orphan_bytes,
+    }
+    logger.info("Retention: %s", report)
+    return report
@@ -0,0 +1,179 @@
+"""
+S3-compatible object storage (``CSV_STORAGE_BACKEND=s3``).
+
+Needs ``django-storages`` and ``boto3``. Files are read with ranged GETs of
+``CSV_S3_READ_BLOCK_MB``, so chunked tasks stream a file without
+downloading it first. Uploads and results are sent as multipart uploads
+of ``CSV_S3_PART_MB`` parts, and a result only becomes visible when its
+upload is completed. Downloads use presigned URLs, signed for
+``CSV_S3_PUBLIC_ENDPOINT_URL`` when clients reach the store under another
+address than the workers do (e.g. MinIO inside docker-compose).
+"""
+import io
+import logging
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.client import Config
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+from storages.backends import s3
+from storages.utils import clean_name
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+class RangedReader(io.RawIOBase):
+    """Seekable read-only object: each read is one ranged GET"""
+
+    def __init__(self, client, bucket, key):
+        self._client = client
+        self._bucket = bucket
+        self._key = key
+        self._size = client.head_object(Bucket=bucket, Key=key)['ContentLength']
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._size
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self._position = offset
+        return offset
+
+    def readinto(self, buffer):
+        if self._position >= self._size or not len(buffer):
+            return 0
+        end = min(self._position + len(buffer), self._size) - 1
+        body = self._client.get_object(
+            Bucket=self._bucket, Key=self._key,
+            Range=f'bytes={self._position}-{end}'
+        )['Body']
+        data = body.read()
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+class MultipartOutput:
+    """Multipart upload of ``key``, completed on commit"""
+
+    def __init__(self, client, bucket, key, part_size):
+        self._client = client
+        self._bucket = bucket
+        self._key = key
+        self._part_size = part_size
+        self._upload_id = client.create_multipart_upload(
+            Bucket=bucket, Key=key, ContentType='text/csv'
+        )['UploadId']
+        self._parts = []
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+        if len(self._buffer) >= self._part_size:
+            self._upload_part()
+        return len(data)
+
+    def _upload_part(self):
+        number = len(self._parts) + 1
+        response = self._client.upload_part(
+            Bucket=self._bucket, Key=self._key, UploadId=self._upload_id,
+            PartNumber=number, Body=bytes(self._buffer)
+        )
+        self._parts.append({'ETag': response['ETag'], 'PartNumber': number})
+        self._buffer.clear()
+
+    def commit(self):
+        # Only the last part may be smaller than the minimum part size
+        if self._buffer or not self._parts:
+            self._upload_part()
+        self._client.complete_multipart_upload(
+            Bucket=self._bucket, Key=self._key, UploadId=self._upload_id,
+            MultipartUpload={'Parts': self._parts}
+        )
+
+    def abort(self):
+        try:
+            self._client.abort_multipart_upload(
+                Bucket=self._bucket, Key=self._key, UploadId=self._upload_id
+            )
+        except (BotoCoreError, ClientError):
+            # A bucket lifecycle rule cleans up what is left behind
+            logger.warning("Could not abort upload of %s", self._key,
+                           exc_info=True)
+
+
+class S3Storage(s3.S3Storage):
+    """django-storages' S3Storage with streaming reads and writes"""
+
+    remote = True
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        part_size = settings.CSV_S3_PART_MB * MB
+        # Uploads through FileField (the CSV uploads) use the same parts
+        self.transfer_config = TransferConfig(
+            multipart_threshold=part_size, multipart_chunksize=part_size,
+            use_threads=self.use_threads
+        )
+        self._presign_client = None
+
+    @property
+    def client(self):
+        return self.connection.meta.client
+
+    def _key(self, name):
+        return self._normalize_name(clean_name(name))
+
+    def open_input(self, name):
+        return io.BufferedReader(
+            RangedReader(self.client, self.bucket_name, self._key(name)),
+            buffer_size=settings.CSV_S3_READ_BLOCK_MB * MB
+        )
+
+    def open_output(self, name, fsync=False):
+        # The store makes a completed upload durable; fsync does not apply
+        return MultipartOutput(self.client, self.bucket_name, self._key(name),
+                               settings.CSV_S3_PART_MB * MB)
+
+    def download_url(self, name, request=None):
+        if self._presign_client is None:
+            self._presign_client = boto3.client(
+                's3',
+                endpoint_url=(settings.CSV_S3_PUBLIC_ENDPOINT_URL
+                              or self.endpoint_url),
+                aws_access_key_id=self.access_key or None,
+                aws_secret_access_key=self.secret_key or None,
+                region_name=self.region_name,
+                config=Config(signature_version='s3v4', s3={
+                    'addressing_style': self.addressing_style or 'auto'
+                }),
+            )
+        return self._presign_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket_name, 'Key': self._key(name)},
+            ExpiresIn=self.querystring_expire,
+        )
+
+    def scan(self, prefix):
+        location = f'{self.location}/' if self.location else ''
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name,
+                                       Prefix=self._key(prefix) + '/'):
+            for item in page.get('Contents', ()):
+                yield (item['Key'][len(location):], item['Size'],
+                       item['LastModified'].timestamp())
@@ -0,0 +1,178 @@
+"""
+Per-user fair-share scheduling between the API and the broker.
+
+Each user may have at most ``CSV_FAIR_SHARE_USER_SLOTS`` tasks in flight
+(dispatched to Celery and not finished). Further submissions are parked
+with status ``QUEUED`` and released round-robin across users, least
+recently served first, whenever a task finishes. An optional global cap
+(``CSV_FAIR_SHARE_GLOBAL_SLOTS``) bounds the total number in flight; it is
+checked and the slot claimed while holding the ``SchedulerLock`` row.
+
+Tasks left in ``PROGRESS`` by a lost worker would hold their slots
+forever: ``reap_stale_tasks`` (run by celery-beat) fails those started
+more than ``CSV_STALE_TASK_MINUTES`` ago and releases their slots.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .dispatch import enqueue_operation
+from .models import SchedulerLock, TaskResult, User
+
+logger = logging.getLogger(__name__)
+
+IN_FLIGHT_STATUSES = ('PENDING', 'PROGRESS', 'RETRY')
+
+
+def _in_flight(**filters):
+    return TaskResult.objects.filter(
+        status__in=IN_FLIGHT_STATUSES, **filters
+    ).count()
+
+
+def _global_slot_free():
+    limit = settings.CSV_FAIR_SHARE_GLOBAL_SLOTS
+    return not limit or _in_flight() < limit
+
+
+def _claim_slot(user_id, task_result=None):
+    """
+    Promote one QUEUED task of ``user_id`` to PENDING if the user (and,
+    with a global cap, the whole system) has a free slot. Returns the
+    promoted task or None.
+    """
+    with transaction.atomic():
+        if settings.CSV_FAIR_SHARE_GLOBAL_SLOTS:
+            # Serialise every claim while the global cap is checked
+            SchedulerLock.objects.select_for_update().get_or_create(pk=1)
+            if not _global_slot_free():
+                return None
+        # Lock the user row so concurrent claims for a user are serialised
+        User.objects.select_for_update().filter(pk=user_id).exists()
+        if _in_flight(user_id=user_id) >= settings.CSV_FAIR_SHARE_USER_SLOTS:
+            return None
+
+        queued = TaskResult.objects.select_for_update(skip_locked=True).filter(
+            user_id=user_id, status='QUEUED'
+        )
+        if task_result is not None:
+            queued = queued.filter(pk=task_result.pk)
+        task = queued.order_by('created_at', 'id').first()
+        if task is None:
+            return None
+        task.status = 'PENDING'
+        task.save(update_fields=['status'])
+        return task
+
+
+def _dispatch(task):
+    try:
+        enqueue_operation(task)
+    except Exception as exc:
+        logger.exception("Failed to dispatch task %s", task.task_id)
+        task.status = 'FAILURE'
+        task.error_message = str(exc)
+        task.save(update_fields=['status', 'error_message'])
+        raise
+
+
+def submit(task_result):
+    """
+    Dispatch a newly created (QUEUED) task if its user has a free slot,
+    otherwise leave it in the user's backlog. Returns True if dispatched.
+    """
+    task = _claim_slot(task_result.user_id, task_result)
+    if task is not None:
+        _dispatch(task)
+        task_result.refresh_from_db()
+        return True
+    return False
+
+
+def release_slots():
+    """
+    Dispatch backlogged tasks round-robin across users until every user
+    is at its cap, the global cap is reached or the backlog is empty.
+    """
+    backlog_users = list(TaskResult.objects.filter(
+        status='QUEUED'
+    ).values_list('user_id', flat=True).distinct())
+    if not backlog_users:
+        return 0
+
+    # Least recently served users go first
+    last_served = dict(TaskResult.objects.filter(
+        user_id__in=backlog_users, enqueued_at__isnull=False
+    ).values('user_id').annotate(
+        last=Max('enqueued_at')
+    ).values_list('user_id', 'last'))
+    backlog_users.sort(key=lambda user_id: (
+        last_served.get(user_id) is not None, last_served.get(user_id)
+    ))
+
+    released = 0
+    while backlog_users:
+        for user_id in list(backlog_users):
+            task = _claim_slot(user_id)
+            if task is None:
+                if not _global_slot_free():
+                    return released
+                # Backlog empty or user at its cap: skip in later rounds
+                backlog_users.remove(user_id)
+                continue
+            try:
+                _dispatch(task)
+            except Exception:
+                continue
+            released += 1
+    return released
+
+
+def reap_stale_tasks():
+    """
+    Fail tasks stuck in PROGRESS for longer than ``CSV_STALE_TASK_MINUTES``
+    (their worker died) and hand their slots to backlogged work
+    """
+    minutes = settings.CSV_STALE_TASK_MINUTES
+    if not minutes:
+        return 0
+    cutoff = timezone.now() - timedelta(minutes=minutes)
+    reaped = TaskResult.objects.filter(
+        status='PROGRESS', started_at__lt=cutoff
+    ).update(
+        status='FAILURE',
+        error_message=f'Task did not finish within {minutes} minutes',
+        completed_at=timezone.now(),
+    )
+    if reaped:
+        logger.warning("Failed %d stale tasks", reaped)
+        release_slots()
+    return reaped
+
+
+def user_counts(user_id=None):
+    """Queued and running task counts per user"""
+    rows = TaskResult.objects.filter(
+        status__in=('QUEUED',) + IN_FLIGHT_STATUSES
+    )
+    if user_id is not None:
+        rows = rows.filter(user_id=user_id)
+    rows = rows.values('user_id', 'user__email', 'status').annotate(
+        count=Count('id')
+    )
+
+    counts = {}
+    for row in rows:
+        entry = counts.setdefault(row['user_id'], {
+            'user_id': row['user_id'],
+            'email': row['user__email'],
+            'queued': 0,
+            'running': 0,
+        })
+        key = 'queued' if row['status'] == 'QUEUED' else 'running'
+        entry[key] += row['count']
+    return list(counts.values())
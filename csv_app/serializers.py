@@ -3,6 +3,9 @@ from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 from .models import User, CSVFile, TaskResult
+from .predicates import (
+    OPERATORS as STRING_OPERATORS, VALUELESS_OPERATORS
+)
 import re
 
 
@@ -132,6 +135,9 @@ class OperationRequestSerializer(serializers.Serializer):
         ('dedup', 'Deduplication'),
         ('unique', 'Unique Values'),
         ('filter', 'Filter Data'),
+        ('profile', 'Column Profile'),
+        ('sample', 'Random Sample'),
+        ('top_k', 'Top K Rows'),
     ]
 
     file_id = serializers.IntegerField()
@@ -140,6 +146,31 @@ class OperationRequestSerializer(serializers.Serializer):
     # Optional parameters for different operations
     column = serializers.CharField(required=False, allow_blank=True)
     filters = serializers.JSONField(required=False, default=list)
+    # Serve comparison filters from per-column indexes kept by the workers
+    use_index = serializers.BooleanField(required=False, default=False)
+    k = serializers.IntegerField(required=False, min_value=1)
+    fraction = serializers.FloatField(
+        required=False, min_value=0, max_value=1
+    )
+    seed = serializers.IntegerField(required=False, min_value=0)
+    order = serializers.ChoiceField(
+        choices=['largest', 'smallest'], required=False, default='largest'
+    )
+
+    # Dedup options
+    subset = serializers.ListField(
+        child=serializers.CharField(), required=False, allow_empty=False
+    )
+    keep = serializers.ChoiceField(
+        choices=['first', 'last'], required=False, default='first'
+    )
+    ignore_case = serializers.BooleanField(required=False, default=False)
+    trim_whitespace = serializers.BooleanField(required=False, default=False)
+    round_digits = serializers.IntegerField(
+        required=False, min_value=0, max_value=15
+    )
+    # Run the task under cProfile and tracemalloc
+    profile = serializers.BooleanField(required=False, default=False)
 
     def validate_file_id(self, value):
         """Validate file exists and belongs to user"""
@@ -162,6 +193,28 @@ class OperationRequestSerializer(serializers.Serializer):
                     "Column name is required for unique operation"
                 )
 
+        elif operation == 'sample':
+            has_k = attrs.get('k') is not None
+            has_fraction = attrs.get('fraction') is not None
+            if has_k == has_fraction:
+                raise serializers.ValidationError(
+                    "Provide either k or fraction for sample operation"
+                )
+            if has_fraction and attrs['fraction'] == 0:
+                raise serializers.ValidationError(
+                    "Fraction must be greater than 0"
+                )
+
+        elif operation == 'top_k':
+            if not attrs.get('column'):
+                raise serializers.ValidationError(
+                    "Column name is required for top_k operation"
+                )
+            if attrs.get('k') is None:
+                raise serializers.ValidationError(
+                    "k is required for top_k operation"
+                )
+
         elif operation == 'filter':
             filters = attrs.get('filters', [])
             if not filters:
@@ -175,7 +228,9 @@ class OperationRequestSerializer(serializers.Serializer):
                         "Each filter must be an object"
                     )
 
-                required_fields = ['column', 'operator', 'value']
+                required_fields = ['column', 'operator']
+                if filter_item.get('operator') not in VALUELESS_OPERATORS:
+                    required_fields.append('value')
                 for field in required_fields:
                     if field not in filter_item:
                         raise serializers.ValidationError(
@@ -183,17 +238,72 @@ class OperationRequestSerializer(serializers.Serializer):
                         )
 
                 # Validate operator
+                operator = filter_item['operator']
                 valid_operators = [
-                    '>', '>=', '<', '<=', '==', '!=', 'contains',
-                    'not_contains'
+                    '>', '>=', '<', '<=', '==', '!=', *STRING_OPERATORS
                 ]
-                if filter_item['operator'] not in valid_operators:
+                if operator not in valid_operators:
                     raise serializers.ValidationError(
-                        f"Invalid operator: {filter_item['operator']}"
+                        f"Invalid operator: {operator}"
                     )
+                self._validate_filter_value(operator, filter_item)
 
         return attrs
 
+    def _validate_filter_value(self, operator, filter_item):
+        """Check the value (and options) a filter operator expects"""
+        value = filter_item.get('value')
+        column = filter_item['column']
+        if not isinstance(filter_item.get('ignore_case', False), bool):
+            raise serializers.ValidationError(
+                f"ignore_case for column '{column}' must be true or false"
+            )
+
+        if operator == 'in':
+            if not isinstance(value, list) or not value:
+                raise serializers.ValidationError(
+                    f"Value for 'in' on column '{column}' must be a "
+                    "non-empty list"
+                )
+            if any(isinstance(item, (list, dict)) for item in value):
+                raise serializers.ValidationError(
+                    f"Values for 'in' on column '{column}' must be scalars"
+                )
+        elif operator == 'is_null':
+            if value is not None and not isinstance(value, bool):
+                raise serializers.ValidationError(
+                    f"Value for 'is_null' on column '{column}' must be "
+                    "true or false"
+                )
+        elif isinstance(value, (list, dict)):
+            raise serializers.ValidationError(
+                f"Value for '{operator}' on column '{column}' must be a scalar"
+            )
+        elif operator == 'regex':
+            try:
+                re.compile(str(value))
+            except re.error as exc:
+                raise serializers.ValidationError(
+                    f"Invalid regex for column '{column}': {exc}"
+                )
+
+
+class CSVFileListSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CSVFile
+        fields = ('id', 'original_name', 'file_size', 'upload_date',
+                  'is_processed')
+
+
+class TaskResultListSerializer(serializers.ModelSerializer):
+    file_id = serializers.IntegerField(source='csv_file_id')
+
+    class Meta:
+        model = TaskResult
+        fields = ('task_id', 'file_id', 'operation', 'status',
+                  'processed_rows', 'original_rows', 'queue', 'created_at',
+                  'started_at', 'completed_at')
+
 
 class TaskStatusSerializer(serializers.ModelSerializer):
     file_link = serializers.SerializerMethodField()
@@ -202,8 +312,9 @@ class TaskStatusSerializer(serializers.ModelSerializer):
         model = TaskResult
         fields = (
             'task_id', 'status', 'operation', 'processed_rows', 
-            'original_rows', 'error_message', 'file_link',
-            'created_at', 'completed_at'
+            'original_rows', 'error_message', 'result_summary', 'timings',
+            'file_link', 'result_size', 'result_checksum', 'created_at',
+            'completed_at'
         )
 
     def get_file_link(self, obj):
@@ -0,0 +1,91 @@
+import logging
+import os
+
+from celery.signals import task_postrun, worker_process_shutdown, worker_ready
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import metrics, scheduling
+from .authentication import invalidate_user
+from .indexes import drop_indexes
+from .models import CSVFile, TaskResult, User
+from .profiling import artifact_name
+
+logger = logging.getLogger(__name__)
+
+# Processing tasks only; maintenance tasks hold no fair-share slot
+CSV_TASK_PREFIX = 'csv_app.tasks.process_csv_'
+
+
+@task_postrun.connect
+def release_fair_share_slots(sender=None, **kwargs):
+    """A finished CSV task frees a slot: release backlogged work"""
+    if sender is not None and sender.name.startswith(CSV_TASK_PREFIX):
+        scheduling.release_slots()
+
+
+@task_postrun.connect
+def record_task_metrics(sender=None, args=None, **kwargs):
+    """Count the finished task, its rows, bytes and stage timings"""
+    if sender is None or not sender.name.startswith(CSV_TASK_PREFIX) or not args:
+        return
+    task_result = TaskResult.objects.filter(task_id=args[0]).only(
+        'operation', 'status', 'queue', 'original_rows', 'processed_rows',
+        'timings'
+    ).first()
+    if task_result is not None:
+        metrics.observe_task(task_result)
+
+
+@worker_ready.connect
+def start_metrics_exporter(sender=None, **kwargs):
+    metrics.start_worker_exporter()
+
+
+@worker_process_shutdown.connect
+def mark_metrics_process_dead(pid=None, **kwargs):
+    metrics.mark_process_dead(pid or os.getpid())
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Deactivated, edited or deleted users must not stay authenticated"""
+    # After commit: a request reading the old row until then could put it
+    # back in the cache right after an earlier delete
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_user(user_id))
+
+
+def _remove_after_commit(names):
+    """Delete stored files once the transaction removing their rows commits"""
+    def remove():
+        for name in names:
+            try:
+                default_storage.delete(name)
+            except Exception:
+                logger.warning("Could not remove %s", name, exc_info=True)
+    transaction.on_commit(remove)
+
+
+@receiver(post_delete, sender=CSVFile)
+def delete_uploaded_file(sender, instance, **kwargs):
+    if instance.file_path:
+        _remove_after_commit([instance.file_path.name])
+    # Indexes kept by this process (workers rebuild stale ones anyway)
+    file_id = instance.pk
+    transaction.on_commit(lambda: drop_indexes(file_id))
+
+
+@receiver(post_delete, sender=TaskResult)
+def delete_result_files(sender, instance, **kwargs):
+    names = [
+        artifact_name(name)
+        for name in ((instance.profile_artifacts or {}).get('files') or {}).values()
+    ]
+    if instance.result_file_path:
+        names.append(instance.result_file_path.name)
+    if names:
+        _remove_after_commit(names)
@@ -0,0 +1,102 @@
+"""
+Storage of uploaded CSV files and task results.
+
+``CSV_STORAGE_BACKEND`` selects the Django default storage:
+
+* ``local`` - ``MEDIA_ROOT``; web and workers must share the directory
+* ``s3``    - an S3-compatible object store (AWS S3, MinIO), so workers can
+  run on any host; see ``csv_app/s3.py``
+
+Besides the usual Storage API both backends provide what the tasks need:
+
+* ``open_input(name)``  - binary file to stream a stored file from
+* ``open_output(name)`` - sink that writes a file atomically: nothing
+  appears under ``name`` unless ``commit()`` is called
+* ``download_url(name, request)`` - absolute URL to download a file
+* ``scan(prefix)``      - (name, size, modified timestamp) of stored files
+
+``remote`` is true when files are not on the local disk (downloads are
+then redirected instead of streamed by the web process).
+"""
+import io
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+LOCAL = 'local'
+S3 = 's3'
+
+
+def _fsync_directory(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class LocalOutput:
+    """
+    Hidden temporary file next to ``path``, renamed into place on commit.
+    With ``fsync`` the file and its directory are synced around the rename.
+    """
+
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.fsync = fsync
+        directory, name = os.path.split(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, self._temp_path = tempfile.mkstemp(
+            dir=directory, prefix=f'.{name}.', suffix='.tmp'
+        )
+        # mkstemp creates the file private to the worker
+        if settings.FILE_UPLOAD_PERMISSIONS is not None:
+            os.chmod(self._temp_path, settings.FILE_UPLOAD_PERMISSIONS)
+        self._file = io.FileIO(fd, 'w')
+
+    def write(self, data):
+        return self._file.write(data)
+
+    def commit(self):
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._temp_path, self.path)
+        if self.fsync:
+            _fsync_directory(os.path.dirname(self.path) or '.')
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._temp_path)
+        except FileNotFoundError:
+            pass
+
+
+class LocalStorage(FileSystemStorage):
+    """MEDIA_ROOT, shared by the web and worker containers"""
+
+    remote = False
+
+    def open_input(self, name):
+        return open(self.path(name), 'rb')
+
+    def open_output(self, name, fsync=False):
+        return LocalOutput(self.path(name), fsync=fsync)
+
+    def download_url(self, name, request):
+        return request.build_absolute_uri(self.url(name))
+
+    def scan(self, prefix):
+        directory = self.path(prefix)
+        for root, _, filenames in os.walk(directory):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                name = os.path.relpath(path, self.location).replace(os.sep, '/')
+                yield name, stat.st_size, stat.st_mtime
@@ -1,213 +1,540 @@
-import os
 import uuid
+from contextlib import contextmanager, nullcontext
+
 import pandas as pd
 import numpy as np
 
 from celery import shared_task
+from django.core.files.storage import default_storage
 from django.utils import timezone
 from django.conf import settings
+from . import indexes, predicates, readers, tracing
 from .models import CSVFile, TaskResult
+from .dedup import (
+    HashedDeduplicator,
+    duplicated_rows,
+    key_columns,
+    normalize_keys,
+)
+from .planner import IN_MEMORY, SPILL, PeakRSSMonitor, plan_execution
+from .profiling import TaskProfiler
+from .retention import run_retention
+from .sketches import ColumnProfile, RowReservoir, TopRows
+from .timings import StageTimer
+from .writers import ResultWriter
+
+# Rows copied at a time when writing a selection of a frame
+WRITE_BATCH_ROWS = 50000
+
+
+@contextmanager
+def _run_task(task_id, file_id):
+    """
+    Shared bookkeeping for every CSV task: marks the task as running,
+    plans the execution, records peak RSS and stage timings (and a CPU
+    and allocation profile when requested) and stores the outcome.
+    """
+    with tracing.trace('csv_task', 'worker', kind='CONSUMER',
+                       traceparent=tracing.task_traceparent(),
+                       **{'task.id': task_id}) as root:
+        timer = StageTimer()
 
-
-@shared_task(bind=True)
-def process_csv_dedup(self, task_id, file_id):
-    """Remove duplicate rows from CSV file"""
-    try:
         # Update task status to PROGRESS
-        task = TaskResult.objects.get(task_id=task_id)
-        task.status = 'PROGRESS'
-        task.started_at = timezone.now()
-        task.save()
-
-        # Load CSV file
-        csv_file = CSVFile.objects.get(id=file_id)
-        df = pd.read_csv(csv_file.file_path.path)
-        df = df.replace([np.inf, -np.inf], np.nan)
+        with timer.stage('db'):
+            task = TaskResult.objects.get(task_id=task_id)
+            task.status = 'PROGRESS'
+            task.started_at = timezone.now()
+            task.save()
+        if root is not None:
+            root.name = f'csv_task {task.operation}'
+        if task.enqueued_at:
+            timer.queue_wait = max(
+                (task.started_at - task.enqueued_at).total_seconds(), 0.0
+            )
+            tracing.record_span('broker.wait', task.enqueued_at,
+                                task.started_at, queue=task.queue)
+
+        monitor = PeakRSSMonitor()
+        profiler = TaskProfiler() if task.operation_params.get('profile') else None
+        plan = None
+        try:
+            with monitor, profiler or nullcontext():
+                with timer.stage('db'):
+                    csv_file = CSVFile.objects.get(id=file_id)
+                with timer.stage('plan'):
+                    with default_storage.open_input(
+                        csv_file.file_path.name
+                    ) as source:
+                        plan = plan_execution(
+                            task.operation, csv_file.file_size, source
+                        )
+                    plan['reader'] = readers.choose_backend(
+                        csv_file.file_size, plan['strategy'] != IN_MEMORY
+                    )
+                task.execution_plan = plan
+                yield task, csv_file, plan, timer
+
+            if task.result_size is not None:
+                timer.bytes_written = task.result_size
+
+            # Update task result
+            task.status = 'SUCCESS'
+            task.peak_rss_bytes = monitor.peak
+            task.timings = timer.to_dict()
+            if profiler is not None:
+                task.profile_artifacts = profiler.save(task_id)
+            task.completed_at = timezone.now()
+            task.save()
+
+        except Exception as exc:
+            # Update task with error
+            task = TaskResult.objects.get(task_id=task_id)
+            task.status = 'FAILURE'
+            task.error_message = str(exc)
+            task.execution_plan = plan
+            task.peak_rss_bytes = monitor.peak or None
+            task.timings = timer.to_dict()
+            if profiler is not None and profiler.snapshot is not None:
+                task.profile_artifacts = profiler.save(task_id)
+            task.completed_at = timezone.now()
+            task.save()
+            raise
+
+
+def _read_chunks(csv_file, plan, timer):
+    """Yield the CSV as a single frame or as chunks, depending on the plan"""
+    timer.bytes_read += csv_file.file_size
+    with default_storage.open_input(csv_file.file_path.name) as source:
+        with timer.stage('read'):
+            chunk_size = (None if plan['strategy'] == IN_MEMORY
+                          else plan['chunk_size'])
+            # Record the backend actually used (pyarrow may hand over to C)
+            data, plan['reader'] = readers.read_csv(
+                source, plan.get('reader', readers.C), chunk_size
+            )
+            chunks = iter([data]) if chunk_size is None else data
+
+        while True:
+            with timer.stage('read'):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            with timer.stage('clean'):
+                _replace_inf(chunk)
+            yield chunk
+
+
+def _read_selection(selection, plan, timer):
+    """Yield rows chosen through column indexes, chunked like the file"""
+    for chunk in selection.chunks(plan.get('chunk_size'), timer):
+        with timer.stage('clean'):
+            _replace_inf(chunk)
+        yield chunk
+
+
+def _replace_inf(frame):
+    """Replace +/-inf with NaN in place; only float columns can hold inf"""
+    for column in frame.columns[frame.dtypes.map(pd.api.types.is_float_dtype)]:
+        infinite = np.isinf(frame[column].to_numpy())
+        if infinite.any():
+            frame.loc[infinite, column] = np.nan
+
+
+def _write_rows(frame, mask, output, timer, header=True):
+    """
+    Write the rows of ``frame`` selected by the boolean array ``mask``.
+    The selection is copied one slice at a time instead of as a whole
+    frame. Returns the number of rows written.
+    """
+    written = 0
+    with timer.stage('write'):
+        # An empty frame still gets its header
+        for start in range(0, max(len(frame), 1), WRITE_BATCH_ROWS):
+            stop = start + WRITE_BATCH_ROWS
+            selected = frame.iloc[start:stop][mask[start:stop]]
+            output.write_frame(selected, header=header)
+            header = False
+            written += len(selected)
+    return written
+
+
+def _output_name(suffix):
+    """Storage name for a new result file"""
+    return f"processed_csv/{uuid.uuid4()}_{suffix}.csv"
+
+
+def _store_result(task, output):
+    """Point the task at a finished ResultWriter's file"""
+    task.result_file_path = output.name
+    task.result_size = output.size
+    task.result_checksum = output.checksum
+
+
+def _read_header(csv_file):
+    """Empty frame with the columns of ``csv_file``"""
+    with default_storage.open_input(csv_file.file_path.name) as source:
+        return pd.read_csv(source, nrows=0)
+
+
+def _write_header(csv_file, output, timer):
+    """Write only the header line (used when no row is selected)"""
+    with timer.stage('write'):
+        output.write_frame(_read_header(csv_file))
+
+
+def _deduplicate(csv_file, plan, timer, output, keep='first', **key_options):
+    """
+    Write the rows of ``csv_file`` with distinct keys to ``output``.
+
+    Returns (original_rows, processed_rows, hash_collisions).
+    """
+    if plan['strategy'] == IN_MEMORY:
+        # Small files: exact comparison on the whole frame
+        df = next(_read_chunks(csv_file, plan, timer))
+        keys = (values for _, values in
+                key_columns(df, unify_numbers=False, **key_options))
+        kept = ~duplicated_rows(keys, keep=keep)
+        return len(df), _write_rows(df, kept, output, timer), 0
+
+    original_rows = 0
+    processed_rows = 0
+    header = True
+    deduplicator = HashedDeduplicator(
+        keep=keep,
+        in_memory_hashes=(plan['strategy'] != SPILL),
+        spill_dir=settings.CSV_SPILL_DIR
+    )
+    with deduplicator:
+        for chunk in _read_chunks(csv_file, plan, timer):
+            original_rows += len(chunk)
+            new_rows = deduplicator.observe(normalize_keys(chunk, **key_options))
+            if keep == 'first':
+                # First occurrences can be written straight away
+                kept = chunk.loc[new_rows]
+                with timer.stage('write'):
+                    output.write_frame(kept, header=header)
+                header = False
+                processed_rows += len(kept)
+
+        if keep == 'last':
+            # Second pass writes the last occurrence of every key
+            kept_rows = deduplicator.kept_rows()
+            for chunk in _read_chunks(csv_file, plan, timer):
+                kept = chunk[np.isin(chunk.index.to_numpy(), kept_rows)]
+                with timer.stage('write'):
+                    output.write_frame(kept, header=header)
+                header = False
+                processed_rows += len(kept)
+
+    if header:
+        _write_header(csv_file, output, timer)
+    return original_rows, processed_rows, deduplicator.collisions
 
-        # Remove duplicates
-        original_rows = len(df)
-        df_dedup = df.drop_duplicates()
-        processed_rows = len(df_dedup)
 
-        # Create output directory if not exists
-        output_dir = os.path.join(settings.MEDIA_ROOT, 'processed_csv')
-        os.makedirs(output_dir, exist_ok=True)
+@shared_task(bind=True)
+def process_csv_dedup(self, task_id, file_id, subset=None, keep='first',
+                      ignore_case=False, trim_whitespace=False,
+                      round_digits=None):
+    """Remove duplicate rows (or rows with duplicate keys) from CSV file"""
+    with _run_task(task_id, file_id) as (task, csv_file, plan, timer):
+        output_name = _output_name('dedup')
+        with ResultWriter(output_name) as output:
+            original_rows, processed_rows, collisions = _deduplicate(
+                csv_file, plan, timer, output, keep=keep, subset=subset,
+                ignore_case=ignore_case, trim_whitespace=trim_whitespace,
+                round_digits=round_digits
+            )
 
-        # Save result file
-        output_filename = f"{uuid.uuid4()}_dedup.csv"
-        output_path = os.path.join(output_dir, output_filename)
-        df_dedup.to_csv(output_path, index=False)
+        # Store operation metadata
+        task.operation_params = {
+            'subset': subset,
+            'keep': keep,
+            'ignore_case': ignore_case,
+            'trim_whitespace': trim_whitespace,
+            'round_digits': round_digits,
+            'hash_collisions': collisions
+        }
 
-        # Update task result
-        task.status = 'SUCCESS'
         task.processed_rows = processed_rows
         task.original_rows = original_rows
-        task.result_file_path = f'processed_csv/{output_filename}'
-        task.completed_at = timezone.now()
-        task.save()
+        _store_result(task, output)
 
-        return (f"Deduplication completed: "
-                f"{processed_rows}/{original_rows} rows")
-
-    except Exception as exc:
-        # Update task with error
-        task = TaskResult.objects.get(task_id=task_id)
-        task.status = 'FAILURE'
-        task.error_message = str(exc)
-        task.completed_at = timezone.now()
-        task.save()
-        raise
+    return (f"Deduplication completed: "
+            f"{processed_rows}/{original_rows} rows")
 
 
 @shared_task(bind=True)
 def process_csv_unique(self, task_id, file_id, column_name):
     """Extract unique values from specific column"""
-    try:
-        # Update task status to PROGRESS
-        task = TaskResult.objects.get(task_id=task_id)
-        task.status = 'PROGRESS'
-        task.started_at = timezone.now()
-        task.save()
-
-        # Load CSV file
-        csv_file = CSVFile.objects.get(id=file_id)
-        df = pd.read_csv(csv_file.file_path.path)
-        df = df.replace([np.inf, -np.inf], np.nan)
-
+    with _run_task(task_id, file_id) as (task, csv_file, plan, timer):
         # Validate column exists
-        if column_name not in df.columns:
+        columns = _read_header(csv_file).columns
+        if column_name not in columns:
             raise ValueError(f"Column '{column_name}' not found in CSV file")
 
-        # Extract unique values and create unique rows
-        original_rows = len(df)
-        unique_values = df[column_name].unique()
-        df_unique = df.drop_duplicates(subset=[column_name])
-        processed_rows = len(df_unique)
-
-        # Create output directory if not exists
-        output_dir = os.path.join(settings.MEDIA_ROOT, 'processed_csv')
-        os.makedirs(output_dir, exist_ok=True)
-
-        # Save result file
-        output_filename = f"{uuid.uuid4()}_unique_{column_name}.csv"
-        output_path = os.path.join(output_dir, output_filename)
-        df_unique.to_csv(output_path, index=False)
+        # Keep the first row for every distinct value of the column
+        output_name = _output_name(f'unique_{column_name}')
+        with ResultWriter(output_name) as output:
+            original_rows, processed_rows, _ = _deduplicate(
+                csv_file, plan, timer, output, subset=[column_name]
+            )
+        unique_values = output.head[column_name]
 
         # Store operation metadata
         task.operation_params = {
             'column': column_name,
-            'unique_count': len(unique_values),
-            'unique_values_sample': [str(val) for val in unique_values[:10]]
+            'unique_count': processed_rows,
+            'unique_values_sample': [str(val) for val in unique_values]
         }
 
-        # Update task result
-        task.status = 'SUCCESS'
         task.processed_rows = processed_rows
         task.original_rows = original_rows
-        task.result_file_path = f'processed_csv/{output_filename}'
-        task.completed_at = timezone.now()
-        task.save()
+        _store_result(task, output)
+
+    return (f"Unique extraction completed: {processed_rows} "
+            f"unique rows from column '{column_name}'")
+
+
+def _filter_mask(df, column, operator, value):
+    """
+    Boolean array of the rows of a frame matching one comparison
+    (string conditions are handled by predicates.py)
+    """
+    if column not in df.columns:
+        raise ValueError(f"Column '{column}' not found in CSV file")
+    else:
+        dtype = df[column].dtype
+        if pd.api.types.is_numeric_dtype(dtype):
+            try:
+                value = float(value)
+            except Exception:
+                raise ValueError(f"Value '{value}' for column '{column}' must be a number.")
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            value = pd.to_datetime(value)
+    # Apply filter based on operator
+    if operator == '>':
+        mask = df[column] > value
+    elif operator == '>=':
+        mask = df[column] >= value
+    elif operator == '<':
+        mask = df[column] < value
+    elif operator == '<=':
+        mask = df[column] <= value
+    elif operator == '==':
+        mask = df[column] == value
+    elif operator == '!=':
+        mask = df[column] != value
+    else:
+        raise ValueError(f"Unsupported operator: {operator}")
+    return mask.to_numpy()
+
+
+@shared_task(bind=True)
+def process_csv_filter(self, task_id, file_id, filter_conditions,
+                       use_index=False):
+    """
+    Filter CSV data based on conditions. With ``use_index`` selective
+    comparisons read only the matching rows (see indexes.py).
+    """
+    with _run_task(task_id, file_id) as (task, csv_file, plan, timer):
+        output_name = _output_name('filtered')
+
+        original_rows = 0
+        processed_rows = 0
+        index_report = None
+        chunks = None
+        if use_index:
+            selection, total_rows, index_report = indexes.select_rows(
+                csv_file, filter_conditions, timer
+            )
+            if selection is not None:
+                chunks = _read_selection(selection, plan, timer)
+                # Rows the index skipped still count as examined
+                original_rows = total_rows - len(selection)
+        if chunks is None:
+            chunks = _read_chunks(csv_file, plan, timer)
+
+        # String conditions are prepared once for every chunk
+        string_masks = [
+            predicates.compile_condition(condition)
+            if condition['operator'] in predicates.OPERATORS else None
+            for condition in filter_conditions
+        ]
+
+        with ResultWriter(output_name) as output:
+            header = True
+            for chunk in chunks:
+                original_rows += len(chunk)
+
+                # Apply filters: one combined mask, no intermediate frames
+                mask = np.ones(len(chunk), dtype=bool)
+                strings = predicates.StringColumns(chunk)
+                for condition, string_mask in zip(filter_conditions,
+                                                  string_masks):
+                    if string_mask is not None:
+                        mask &= string_mask(strings)
+                        continue
+                    mask &= _filter_mask(
+                        chunk,
+                        condition['column'],
+                        condition['operator'],
+                        condition['value']
+                    )
+
+                processed_rows += _write_rows(chunk, mask, output, timer,
+                                              header=header)
+                header = False
+
+            if header:
+                _write_header(csv_file, output, timer)
+
+        # Store filter metadata
+        task.operation_params = {
+            'filters_applied': filter_conditions,
+            'filter_count': len(filter_conditions)
+        }
+        if index_report is not None:
+            task.operation_params['index'] = index_report
 
-        return (f"Unique extraction completed: {processed_rows} "
-                f"unique rows from column '{column_name}'")
+        task.processed_rows = processed_rows
+        task.original_rows = original_rows
+        _store_result(task, output)
 
-    except Exception as exc:
-        # Update task with error
-        task = TaskResult.objects.get(task_id=task_id)
-        task.status = 'FAILURE'
-        task.error_message = str(exc)
-        task.completed_at = timezone.now()
-        task.save()
-        raise
+    return f"Filter completed: {processed_rows}/{original_rows} rows match conditions"
 
 
 @shared_task(bind=True)
-def process_csv_filter(self, task_id, file_id, filter_conditions):
-    """Filter CSV data based on conditions"""
-    try:
-        # Update task status to PROGRESS
-        task = TaskResult.objects.get(task_id=task_id)
-        task.status = 'PROGRESS'
-        task.started_at = timezone.now()
-        task.save()
-
-        # Load CSV file
-        csv_file = CSVFile.objects.get(id=file_id)
-        df = pd.read_csv(csv_file.file_path.path)
-        df = df.replace([np.inf, -np.inf], np.nan)
-
-        original_rows = len(df)
-        filtered_df = df.copy()
-
-        # Apply filters
-        for condition in filter_conditions:
-            column = condition['column']
-            operator = condition['operator']
-            value = condition['value']
-
-            if column not in df.columns:
-                raise ValueError(f"Column '{column}' not found in CSV file")
-            else:
-                dtype = df[column].dtype
-                if pd.api.types.is_numeric_dtype(dtype):
-                    try:
-                        value = float(value)
-                    except Exception:
-                        raise ValueError(f"Value '{value}' for column '{column}' must be a number.")
-                elif pd.api.types.is_datetime64_any_dtype(dtype):
-                    value = pd.to_datetime(value)
-            # Apply filter based on operator
-            if operator == '>':
-                filtered_df = filtered_df[filtered_df[column] > value]
-            elif operator == '>=':
-                filtered_df = filtered_df[filtered_df[column] >= value]
-            elif operator == '<':
-                filtered_df = filtered_df[filtered_df[column] < value]
-            elif operator == '<=':
-                filtered_df = filtered_df[filtered_df[column] <= value]
-            elif operator == '==':
-                filtered_df = filtered_df[filtered_df[column] == value]
-            elif operator == '!=':
-                filtered_df = filtered_df[filtered_df[column] != value]
-            elif operator == 'contains':
-                filtered_df = filtered_df[filtered_df[column].astype(str).str.contains(str(value), na=False)]
-            elif operator == 'not_contains':
-                filtered_df = filtered_df[~filtered_df[column].astype(str).str.contains(str(value), na=False)]
+def process_csv_profile(self, task_id, file_id):
+    """Profile every column of a CSV file in a single chunked pass"""
+    with _run_task(task_id, file_id) as (task, csv_file, plan, timer):
+        original_rows = 0
+        profiles = {}
+        for chunk in _read_chunks(csv_file, plan, timer):
+            original_rows += len(chunk)
+            for column in chunk.columns:
+                if column not in profiles:
+                    profiles[column] = ColumnProfile(column)
+                profiles[column].update(chunk[column])
+
+        task.processed_rows = original_rows
+        task.original_rows = original_rows
+        task.result_summary = {
+            'rows': original_rows,
+            'columns': {
+                str(name): profile.to_dict()
+                for name, profile in profiles.items()
+            }
+        }
+
+    return (f"Profile completed: {len(profiles)} columns, "
+            f"{original_rows} rows")
+
+
+@shared_task(bind=True)
+def process_csv_sample(self, task_id, file_id, k=None, fraction=None,
+                       seed=None):
+    """Uniform random sample of k rows (or a fraction of rows)"""
+    with _run_task(task_id, file_id) as (task, csv_file, plan, timer):
+        output_name = _output_name('sample')
+
+        original_rows = 0
+        processed_rows = 0
+        with ResultWriter(output_name) as output:
+            if fraction is not None:
+                # Bernoulli sampling: every row is kept with probability
+                # ``fraction`` and written out as soon as it is seen
+                rng = np.random.default_rng(seed)
+                header = True
+                for chunk in _read_chunks(csv_file, plan, timer):
+                    original_rows += len(chunk)
+                    processed_rows += _write_rows(
+                        chunk, rng.random(len(chunk)) < fraction, output,
+                        timer, header=header
+                    )
+                    header = False
             else:
-                raise ValueError(f"Unsupported operator: {operator}")
+                reservoir = RowReservoir(k, seed=seed)
+                for chunk in _read_chunks(csv_file, plan, timer):
+                    original_rows += len(chunk)
+                    reservoir.update(chunk)
+
+                df_sample = reservoir.result()
+                if df_sample is None:
+                    _write_header(csv_file, output, timer)
+                else:
+                    processed_rows = len(df_sample)
+                    with timer.stage('write'):
+                        output.write_frame(df_sample)
+
+        # Store operation metadata
+        task.operation_params = {
+            'k': k,
+            'fraction': fraction,
+            'seed': seed
+        }
+
+        task.processed_rows = processed_rows
+        task.original_rows = original_rows
+        _store_result(task, output)
 
-        processed_rows = len(filtered_df)
+    return f"Sample completed: {processed_rows}/{original_rows} rows"
 
-        # Create output directory if not exists
-        output_dir = os.path.join(settings.MEDIA_ROOT, 'processed_csv')
-        os.makedirs(output_dir, exist_ok=True)
+
+@shared_task(bind=True)
+def process_csv_top_k(self, task_id, file_id, column_name, k,
+                      order='largest'):
+    """Rows with the k largest (or smallest) values of a column"""
+    with _run_task(task_id, file_id) as (task, csv_file, plan, timer):
+        original_rows = 0
+        top_rows = TopRows(k, column_name, largest=(order == 'largest'))
+        for chunk in _read_chunks(csv_file, plan, timer):
+            # Validate column exists
+            if column_name not in chunk.columns:
+                raise ValueError(
+                    f"Column '{column_name}' not found in CSV file"
+                )
+            original_rows += len(chunk)
+            top_rows.update(chunk)
+
+        df_top = top_rows.result()
+        if df_top is None and top_rows.non_numeric:
+            raise ValueError(f"Column '{column_name}' must be numeric")
 
         # Save result file
-        output_filename = f"{uuid.uuid4()}_filtered.csv"
-        output_path = os.path.join(output_dir, output_filename)
-        filtered_df.to_csv(output_path, index=False)
+        output_name = _output_name(f'top_{k}_{column_name}')
+        with ResultWriter(output_name) as output:
+            if df_top is None:
+                _write_header(csv_file, output, timer)
+            else:
+                with timer.stage('write'):
+                    output.write_frame(df_top)
+        processed_rows = len(df_top) if df_top is not None else 0
 
-        # Store filter metadata
+        # Store operation metadata
         task.operation_params = {
-            'filters_applied': filter_conditions,
-            'filter_count': len(filter_conditions)
+            'column': column_name,
+            'k': k,
+            'order': order,
+            'non_numeric_skipped': top_rows.non_numeric
         }
 
-        # Update task result
-        task.status = 'SUCCESS'
         task.processed_rows = processed_rows
         task.original_rows = original_rows
-        task.result_file_path = f'processed_csv/{output_filename}'
-        task.completed_at = timezone.now()
-        task.save()
-
-        return f"Filter completed: {processed_rows}/{original_rows} rows match conditions"
-
-    except Exception as exc:
-        # Update task with error
-        task = TaskResult.objects.get(task_id=task_id)
-        task.status = 'FAILURE'
-        task.error_message = str(exc)
-        task.completed_at = timezone.now()
-        task.save()
-        raise
+        _store_result(task, output)
+
+    return (f"Top-k completed: {processed_rows} rows by "
+            f"{order} '{column_name}'")
+
+
+@shared_task
+def reap_stale_tasks():
+    """Fail tasks abandoned by lost workers (scheduled by celery-beat)"""
+    # scheduling dispatches through this module: import it lazily
+    from .scheduling import reap_stale_tasks as reap
+    return reap()
+
+
+@shared_task
+def expire_results():
+    """Delete expired results and orphaned files (scheduled by celery-beat)"""
+    return run_retention()
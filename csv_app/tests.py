@@ -1,3 +1,857 @@
-from django.test import TestCase
+import gc
+import os
+import shutil
+import tempfile
+import tracemalloc
+import uuid
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import predicates, scheduling, tasks
+from .authentication import user_cache_key
+from .dedup import HashedDeduplicator
+from .models import CSVFile, TaskResult, User
+from .planner import PeakRSSMonitor, current_rss
+from .retention import expire_results, reclaim_orphans, run_retention
+from .serializers import OperationRequestSerializer
+from .sketches import ColumnProfile
+
+ROWS = 200000
+# Peak traced memory of a task, as a multiple of parsing the file alone
+ALLOCATION_BUDGET = 1.2
+# RSS also covers allocator slack and memory tracemalloc does not see
+RSS_SLACK_BYTES = 64 * 1024 * 1024
+
+# label -> (operation, task, args, kwargs)
+OPERATIONS = {
+    'dedup': ('dedup', tasks.process_csv_dedup, (), {}),
+    'dedup_subset': ('dedup', tasks.process_csv_dedup, (),
+                     {'subset': ['text'], 'keep': 'last', 'ignore_case': True}),
+    'unique': ('unique', tasks.process_csv_unique, ('key',), {}),
+    'filter': ('filter', tasks.process_csv_filter, ([
+        {'column': 'value', 'operator': '>', 'value': '0'},
+        {'column': 'key', 'operator': '<', 'value': '500'},
+        {'column': 'text', 'operator': 'contains', 'value': 'a'},
+    ],), {}),
+    'profile': ('profile', tasks.process_csv_profile, (), {}),
+    'sample': ('sample', tasks.process_csv_sample, (), {'k': 1000, 'seed': 0}),
+    'sample_fraction': ('sample', tasks.process_csv_sample, (),
+                        {'fraction': 0.5, 'seed': 0}),
+    'top_k': ('top_k', tasks.process_csv_top_k, ('value', 100), {}),
+}
+
+
+def _traced_peak(function, *args, **kwargs):
+    """Peak bytes traced by tracemalloc while ``function`` runs"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        function(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+
+@override_settings(CSV_READER_BACKEND='c', CSV_WORKER_MEMORY_BUDGET_MB=2048,
+                   CSV_TRACE_FILE='', CSV_TRACE_COLLECTOR_URL='')
+class TaskMemoryBudgetTests(TestCase):
+    """Each operation's peak memory stays close to the cost of the parse"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media.enable()
+
+        rng = np.random.default_rng(0)
+        words = np.array([''.join(word) for word in rng.choice(
+            list('abcdefghijklmnopqrstuvwxyz'), (5000, 10)
+        )])
+        value = rng.normal(size=ROWS).round(3)
+        value[::1000] = np.inf
+        frame = pd.DataFrame({
+            'id': np.arange(ROWS),
+            'key': rng.integers(0, 1000, ROWS),
+            'value': value,
+            'text': words[rng.integers(0, len(words), ROWS)],
+            'ratio': rng.random(ROWS),
+            'label': rng.choice(['red', 'green', 'blue', ''], ROWS),
+        })
+        cls.relative_path = 'csv_files/memory.csv'
+        cls.path = os.path.join(cls.media_root, cls.relative_path)
+        os.makedirs(os.path.dirname(cls.path))
+        frame.to_csv(cls.path, index=False)
+        cls.parse_peak = _traced_peak(pd.read_csv, cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user('memory@example.com', 'password')
+        self.csv_file = CSVFile.objects.create(
+            user=self.user, original_name='memory.csv',
+            file_path=self.relative_path, file_size=os.path.getsize(self.path)
+        )
+
+    def _run(self, label):
+        operation, task, args, kwargs = OPERATIONS[label]
+        task_id = str(uuid.uuid4())
+        TaskResult.objects.create(
+            task_id=task_id, user=self.user, csv_file=self.csv_file,
+            operation=operation
+        )
+        baseline_rss = current_rss()
+        with PeakRSSMonitor() as monitor:
+            peak = _traced_peak(
+                task.apply, args=(task_id, self.csv_file.id) + args,
+                kwargs=kwargs
+            )
+        result = TaskResult.objects.get(task_id=task_id)
+        self.assertEqual(result.status, 'SUCCESS', result.error_message)
+        return result, peak, monitor.peak - baseline_rss
+
+    def test_operations_within_budget(self):
+        budget = ALLOCATION_BUDGET * self.parse_peak
+        for label in OPERATIONS:
+            with self.subTest(operation=label):
+                result, peak, rss_growth = self._run(label)
+                self.assertEqual(result.execution_plan['strategy'], 'in_memory')
+                self.assertLessEqual(
+                    peak, budget,
+                    f"{label} traced {peak / 2 ** 20:.1f} MB, budget "
+                    f"{budget / 2 ** 20:.1f} MB"
+                )
+                self.assertLessEqual(rss_growth, budget + RSS_SLACK_BYTES)
+
+    def test_inf_replaced_in_place_on_float_columns_only(self):
+        frame = pd.DataFrame({
+            'number': [1.0, np.inf, -np.inf],
+            'text': ['inf', 'a', 'b'],
+            'count': [1, 2, 3],
+        })
+        number = frame['number'].to_numpy()
+        tasks._replace_inf(frame)
+        self.assertTrue(np.isnan(frame['number'].iloc[1:]).all())
+        self.assertEqual(frame['text'].tolist(), ['inf', 'a', 'b'])
+        self.assertEqual(frame['count'].tolist(), [1, 2, 3])
+        # Same buffer: no copy of the column was made
+        self.assertTrue(np.shares_memory(number, frame['number'].to_numpy()))
+
+
+class HistoryPaginationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('history@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        files = [
+            CSVFile.objects.create(
+                user=self.user, original_name=f'{i}.csv',
+                file_path=f'csv_files/{i}.csv', file_size=1
+            )
+            for i in range(11)
+        ]
+        for i in range(11):
+            TaskResult.objects.create(
+                task_id=str(uuid.uuid4()), user=self.user, csv_file=files[0],
+                operation='dedup'
+            )
+        # Runs of rows share a timestamp, so pages split inside a run
+        base = timezone.now()
+        for model, field in ((CSVFile, 'upload_date'),
+                             (TaskResult, 'created_at')):
+            for i, pk in enumerate(model.objects.values_list('pk', flat=True)):
+                model.objects.filter(pk=pk).update(
+                    **{field: base - timedelta(seconds=i // 4)}
+                )
+        self.files = files
+
+    def _walk(self, url):
+        """Items of every page of ``url``, creating a newer row mid-walk"""
+        items = []
+        cursor = None
+        while True:
+            params = {'page_size': 3}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            items.extend(response.data['results'])
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                return items
+            if len(items) == 3:
+                CSVFile.objects.create(
+                    user=self.user, original_name='new.csv',
+                    file_path='csv_files/new.csv', file_size=1
+                )
+                TaskResult.objects.create(
+                    task_id=str(uuid.uuid4()), user=self.user,
+                    csv_file=self.files[0], operation='dedup'
+                )
+
+    def test_cursor_stable_across_equal_timestamps(self):
+        for url, queryset, field, key in (
+            ('/api/files/', CSVFile.objects.all(), 'upload_date', 'id'),
+            ('/api/tasks/', TaskResult.objects.all(), 'created_at', 'task_id'),
+        ):
+            with self.subTest(url=url):
+                expected = list(queryset.order_by(f'-{field}', '-id')
+                                .values_list(key, flat=True))
+                items = self._walk(url)
+                # Rows created after the first page never shift later ones
+                self.assertEqual([item[key] for item in items], expected)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/tasks/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+@mock.patch('csv_app.scheduling.enqueue_operation')
+class SchedulingTests(TestCase):
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(f'user{i}@example.com', 'password')
+            for i in range(2)
+        ]
+        self.csv_file = CSVFile.objects.create(
+            user=self.users[0], original_name='input.csv',
+            file_path='csv_files/input.csv', file_size=1
+        )
+
+    def _task(self, user, status='QUEUED', **fields):
+        return TaskResult.objects.create(
+            task_id=str(uuid.uuid4()), user=user, csv_file=self.csv_file,
+            operation='dedup', status=status, **fields
+        )
+
+    @override_settings(CSV_FAIR_SHARE_GLOBAL_SLOTS=1)
+    def test_global_cap(self, enqueue):
+        first, second = (self._task(user) for user in self.users)
+        self.assertTrue(scheduling.submit(first))
+        self.assertFalse(scheduling.submit(second))
+        self.assertEqual(scheduling.release_slots(), 0)
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'QUEUED')
+        self.assertEqual(enqueue.call_count, 1)
+
+    @override_settings(CSV_FAIR_SHARE_USER_SLOTS=1, CSV_STALE_TASK_MINUTES=60)
+    def test_stale_tasks_reaped(self, enqueue):
+        now = timezone.now()
+        stale = self._task(self.users[0], 'PROGRESS',
+                           started_at=now - timedelta(minutes=90))
+        running = self._task(self.users[1], 'PROGRESS',
+                             started_at=now - timedelta(minutes=30))
+        queued = self._task(self.users[0])
+
+        self.assertEqual(scheduling.reap_stale_tasks(), 1)
+        for task, expected in ((stale, 'FAILURE'), (running, 'PROGRESS'),
+                               (queued, 'PENDING')):
+            task.refresh_from_db()
+            self.assertEqual(task.status, expected)
+        enqueue.assert_called_once_with(queued)
+
+
+def _constant_hashes(frame, index=False):
+    """Every key hashes alike, so each repeated hash is a collision"""
+    return pd.Series(np.zeros(len(frame), dtype=np.uint64), index=frame.index)
+
+
+class HashedDeduplicatorTests(SimpleTestCase):
+    CHUNKS = [
+        pd.DataFrame({'key': ['a', 'b', 'a']}, index=[0, 1, 2]),
+        pd.DataFrame({'key': ['c', 'b', 'd', 'c']}, index=[3, 4, 5, 6]),
+        pd.DataFrame({'key': ['a', 'e']}, index=[7, 8]),
+    ]
+
+    def _observe(self, keep, in_memory_hashes=True):
+        with HashedDeduplicator(keep=keep,
+                                in_memory_hashes=in_memory_hashes) as dedup:
+            new_rows = [dedup.observe(chunk).tolist() for chunk in self.CHUNKS]
+            return new_rows, dedup.kept_rows().tolist(), dedup.collisions
+
+    def _expected(self, keep):
+        keys = pd.concat(self.CHUNKS)['key']
+        return keys.index[~keys.duplicated(keep=keep)].tolist()
+
+    def test_keep_first(self):
+        new_rows, kept, collisions = self._observe('first')
+        self.assertEqual(new_rows, [[0, 1], [3, 5], [8]])
+        self.assertEqual(kept, self._expected('first'))
+        self.assertEqual(collisions, 0)
+
+    def test_keep_last(self):
+        # The stored row moves to each later occurrence of a key
+        _, kept, _ = self._observe('last')
+        self.assertEqual(kept, self._expected('last'))
+
+    @mock.patch.object(pd.util, 'hash_pandas_object', _constant_hashes)
+    def test_hash_collisions_keep_distinct_keys(self):
+        for keep in ('first', 'last'):
+            with self.subTest(keep=keep):
+                _, kept, collisions = self._observe(keep)
+                self.assertEqual(kept, self._expected(keep))
+                # c, d and e share a hash with an earlier, different key
+                self.assertEqual(collisions, 3)
+
+                _, kept, collisions = self._observe(keep, in_memory_hashes=False)
+                self.assertEqual(kept, self._expected(keep))
+                self.assertEqual(collisions, 0)
+
+
+@override_settings(CSV_WORKER_MEMORY_BUDGET_MB=1, CSV_TRACE_FILE='',
+                   CSV_TRACE_COLLECTOR_URL='')
+class ChunkedDedupTests(TestCase):
+    ROWS = 20000
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings.enable()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.addCleanup(self.settings.disable)
+
+        rng = np.random.default_rng(0)
+        self.frame = pd.DataFrame({
+            'id': np.arange(self.ROWS),
+            'key': rng.integers(0, 300, self.ROWS),
+            'text': rng.choice(['Red', 'red ', 'BLUE', 'blue'], self.ROWS),
+        })
+        path = os.path.join(self.media_root, 'csv_files', 'dedup.csv')
+        os.makedirs(os.path.dirname(path))
+        self.frame.to_csv(path, index=False)
+        self.user = User.objects.create_user('dedup@example.com', 'password')
+        self.csv_file = CSVFile.objects.create(
+            user=self.user, original_name='dedup.csv',
+            file_path='csv_files/dedup.csv', file_size=os.path.getsize(path)
+        )
+
+    def _dedup(self, **kwargs):
+        task_id = str(uuid.uuid4())
+        TaskResult.objects.create(
+            task_id=task_id, user=self.user, csv_file=self.csv_file,
+            operation='dedup'
+        )
+        tasks.process_csv_dedup.apply(args=(task_id, self.csv_file.id),
+                                      kwargs=kwargs)
+        result = TaskResult.objects.get(task_id=task_id)
+        self.assertEqual(result.status, 'SUCCESS', result.error_message)
+        self.assertNotEqual(result.execution_plan['strategy'], 'in_memory')
+        with default_storage.open(result.result_file_path.name, 'rb') as handle:
+            return result, pd.read_csv(handle)
+
+    def test_keep_last_across_chunks(self):
+        for keep in ('first', 'last'):
+            with self.subTest(keep=keep):
+                result, output = self._dedup(subset=['key', 'text'], keep=keep,
+                                             ignore_case=True,
+                                             trim_whitespace=True)
+                keys = pd.DataFrame({
+                    'key': self.frame['key'],
+                    'text': self.frame['text'].str.strip().str.casefold(),
+                })
+                expected = self.frame[~keys.duplicated(keep=keep)]
+                pd.testing.assert_frame_equal(
+                    output, expected.reset_index(drop=True)
+                )
+                self.assertEqual(result.processed_rows, len(expected))
+
+
+class ColumnProfileTests(SimpleTestCase):
+
+    def test_int_and_float_chunks_count_alike(self):
+        # A chunk with a missing value parses the int column as float
+        profile = ColumnProfile('number')
+        profile.update(pd.Series([1, 2, 3, 1, 1]))
+        profile.update(pd.Series([1.0, 2.0, np.nan, 1.0]))
+        result = profile.to_dict()
+        self.assertEqual(result['distinct_estimate'], 3)
+        self.assertEqual(result['top_values'], [
+            {'value': '1', 'count': 5},
+            {'value': '2', 'count': 2},
+            {'value': '3', 'count': 1},
+        ])
+
+    def test_float_labels(self):
+        profile = ColumnProfile('number')
+        profile.update(pd.Series([0.5, 0.5, -0.0, 0.0, 1e20]))
+        # -0.0 counts as 0.0; integral floats read like ints
+        self.assertCountEqual(profile.to_dict()['top_values'], [
+            {'value': '0', 'count': 2},
+            {'value': '0.5', 'count': 2},
+            {'value': '1e+20', 'count': 1},
+        ])
+
+
+@override_settings(CSV_INDEX_MAX_SELECTIVITY=1.0, CSV_TRACE_FILE='',
+                   CSV_TRACE_COLLECTOR_URL='')
+class IndexedFilterTests(TestCase):
+    """Filters served from column indexes return what a scan returns"""
+
+    ROWS = 20000
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings = override_settings(
+            MEDIA_ROOT=self.media_root,
+            CSV_INDEX_DIR=os.path.join(self.media_root, 'indexes')
+        )
+        self.settings.enable()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.addCleanup(self.settings.disable)
+
+        rng = np.random.default_rng(0)
+        value = rng.normal(size=self.ROWS).round(2)
+        value[::500] = np.nan
+        value[7] = np.inf
+        frame = pd.DataFrame({
+            'id': np.arange(self.ROWS),
+            'key': rng.integers(0, 200, self.ROWS),
+            'value': value,
+            'text': rng.choice(['plain', 'a,"quoted"', 'multi\nline', ''],
+                               self.ROWS),
+        })
+        self.path = os.path.join(self.media_root, 'csv_files', 'index.csv')
+        os.makedirs(os.path.dirname(self.path))
+        self._write(frame.to_csv(index=False) + '\n')
+        self.user = User.objects.create_user('index@example.com', 'password')
+        self.csv_file = CSVFile.objects.create(
+            user=self.user, original_name='index.csv',
+            file_path='csv_files/index.csv', file_size=os.path.getsize(self.path)
+        )
+
+    def _write(self, text):
+        with open(self.path, 'w', newline='') as handle:
+            handle.write(text)
+
+    def _filter(self, conditions, **kwargs):
+        task_id = str(uuid.uuid4())
+        TaskResult.objects.create(
+            task_id=task_id, user=self.user, csv_file=self.csv_file,
+            operation='filter'
+        )
+        tasks.process_csv_filter.apply(
+            args=(task_id, self.csv_file.id, conditions), kwargs=kwargs
+        )
+        result = TaskResult.objects.get(task_id=task_id)
+        self.assertEqual(result.status, 'SUCCESS', result.error_message)
+        with default_storage.open(result.result_file_path.name, 'rb') as handle:
+            return result, handle.read()
+
+    def assertIndexedMatchesScan(self, conditions):
+        scanned, expected = self._filter(conditions)
+        indexed, output = self._filter(conditions, use_index=True)
+        self.assertTrue(indexed.operation_params['index']['used'])
+        self.assertEqual(output, expected)
+        self.assertEqual(indexed.processed_rows, scanned.processed_rows)
+        self.assertEqual(indexed.original_rows, scanned.original_rows)
+
+    def test_equality(self):
+        for conditions in (
+            [{'column': 'key', 'operator': '==', 'value': '7'}],
+            [{'column': 'key', 'operator': '==', 'value': '7.0'}],
+            [{'column': 'value', 'operator': '==', 'value': '-0'}],
+            [{'column': 'text', 'operator': '==', 'value': 'multi\nline'}],
+            [{'column': 'text', 'operator': '==', 'value': 'missing'}],
+            [{'column': 'key', 'operator': '!=', 'value': '7'},
+             {'column': 'text', 'operator': '==', 'value': 'a,"quoted"'}],
+        ):
+            with self.subTest(conditions=conditions):
+                self.assertIndexedMatchesScan(conditions)
+
+    @override_settings(CSV_INDEX_READ_GAP_KB=0, CSV_WORKER_MEMORY_BUDGET_MB=1)
+    def test_scattered_rows_in_chunks(self):
+        # Every row is its own read and the rows come back in chunks
+        conditions = [{'column': 'key', 'operator': '!=', 'value': '7'}]
+        self.assertIndexedMatchesScan(conditions)
+        indexed, _ = self._filter(conditions, use_index=True)
+        self.assertEqual(indexed.execution_plan['strategy'], 'chunked')
+
+    def test_rebuilt_when_file_changes(self):
+        conditions = [{'column': 'text', 'operator': '==', 'value': 'x'}]
+        self._filter(conditions, use_index=True)
+        self._write('id,text\n1,x\n2,y\n3,x\n')
+        self.csv_file.file_size = os.path.getsize(self.path)
+        self.csv_file.save()
+        indexed, output = self._filter(conditions, use_index=True)
+        self.assertEqual(output, b'id,text\n1,x\n3,x\n')
+        self.assertIsNotNone(
+            indexed.operation_params['index']['layout_build_seconds']
+        )
+
+    def test_ranges(self):
+        for conditions in (
+            [{'column': 'value', 'operator': '>', 'value': '2'}],
+            [{'column': 'value', 'operator': '>=', 'value': '2.01'}],
+            [{'column': 'value', 'operator': '<', 'value': '-2.5'}],
+            [{'column': 'value', 'operator': '<=', 'value': '-2.5'}],
+            [{'column': 'value', 'operator': '<', 'value': 'inf'}],
+            [{'column': 'value', 'operator': '>', 'value': 'nan'}],
+            [{'column': 'key', 'operator': '<', 'value': '3'},
+             {'column': 'key', 'operator': '>=', 'value': '1'},
+             {'column': 'text', 'operator': 'contains', 'value': 'line'}],
+        ):
+            with self.subTest(conditions=conditions):
+                self.assertIndexedMatchesScan(conditions)
+
+    @override_settings(CSV_INDEX_MAX_READS=10, CSV_INDEX_READ_GAP_KB=0)
+    def test_scattered_rows_scan(self):
+        indexed, _ = self._filter(
+            [{'column': 'key', 'operator': '<', 'value': '10'}],
+            use_index=True
+        )
+        self.assertFalse(indexed.operation_params['index']['used'])
+        self.assertEqual(indexed.operation_params['index']['reason'],
+                         'rows too scattered')
+
+    @override_settings(CSV_INDEX_MAX_SELECTIVITY=0.01)
+    def test_unselective_filter_scans(self):
+        indexed, _ = self._filter(
+            [{'column': 'text', 'operator': '==', 'value': 'plain'}],
+            use_index=True
+        )
+        self.assertFalse(indexed.operation_params['index']['used'])
+        self.assertEqual(indexed.operation_params['index']['reason'],
+                         'not selective enough')
+
+
+@override_settings(CSV_RESULT_TTL_DAYS=30, CSV_RETENTION_BATCH_SIZE=500,
+                   CSV_RETENTION_ORPHAN_GRACE_HOURS=24)
+class RetentionTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings.enable()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.addCleanup(self.settings.disable)
+
+        self.default_user = User.objects.create_user('ttl@example.com', 'password')
+        self.short_user = User.objects.create_user(
+            'short@example.com', 'password', result_ttl_days=2
+        )
+        self.forever_user = User.objects.create_user(
+            'forever@example.com', 'password', result_ttl_days=0
+        )
+        self.csv_file = CSVFile.objects.create(
+            user=self.default_user, original_name='input.csv',
+            file_path=self._store('csv_files/input.csv', b'a\n1\n', hours=100),
+            file_size=4
+        )
+
+    def _store(self, name, data, hours=0):
+        """Write a media file last modified ``hours`` ago"""
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as handle:
+            handle.write(data)
+        modified = (timezone.now() - timedelta(hours=hours)).timestamp()
+        os.utime(path, (modified, modified))
+        return name
+
+    def _task(self, user, days, status='SUCCESS', size=10, record_size=True):
+        # A recent file: not an orphan candidate before its row is deleted
+        name = self._store(f'processed_csv/{uuid.uuid4()}.csv', b'x' * size)
+        return TaskResult.objects.create(
+            task_id=str(uuid.uuid4()), user=user, csv_file=self.csv_file,
+            operation='dedup', status=status, result_file_path=name,
+            result_size=size if record_size else None,
+            completed_at=timezone.now() - timedelta(days=days)
+        )
+
+    def _expire(self, batch_size=None):
+        # Result files are removed once the deleting transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            return expire_results(batch_size)
+
+    def assertKept(self, kept, expired):
+        remaining = set(TaskResult.objects.values_list('pk', flat=True))
+        self.assertEqual(remaining, {task.pk for task in kept})
+        for task in kept:
+            self.assertTrue(default_storage.exists(task.result_file_path.name))
+        for task in expired:
+            self.assertFalse(default_storage.exists(task.result_file_path.name))
+
+    def test_user_ttl_overrides_global(self):
+        kept = [
+            self._task(self.default_user, 10),
+            self._task(self.short_user, 1),
+            self._task(self.forever_user, 1000),
+            # Unfinished tasks never expire
+            self._task(self.default_user, 100, status='PROGRESS'),
+        ]
+        expired = [
+            self._task(self.default_user, 40, size=7),
+            self._task(self.short_user, 5, size=11),
+        ]
+        self.assertEqual(self._expire(), (2, 18))
+        self.assertKept(kept, expired)
+
+    @override_settings(CSV_RESULT_TTL_DAYS=0)
+    def test_zero_ttl_keeps_results(self):
+        kept = [self._task(self.default_user, 1000),
+                self._task(self.forever_user, 1000)]
+        expired = [self._task(self.short_user, 5)]
+        self.assertEqual(self._expire(), (1, 10))
+        self.assertKept(kept, expired)
+
+    def test_deletes_in_batches(self):
+        expired = [self._task(self.default_user, 40 + i) for i in range(5)]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self._expire(batch_size=2), (5, 50))
+        deletes = [query for query in queries.captured_queries
+                   if query['sql'].startswith('DELETE FROM "task_results"')]
+        self.assertEqual(len(deletes), 3)
+        self.assertKept([], expired)
+
+    def test_orphans_older_than_grace_removed(self):
+        task = self._task(self.default_user, 10)
+        old = [self._store('processed_csv/old.csv', b'x' * 5, hours=48),
+               self._store('csv_files/old.csv', b'x' * 6, hours=25)]
+        recent = [self._store('processed_csv/recent.csv', b'x', hours=1),
+                  self._store('csv_files/recent.csv', b'x', hours=23)]
+
+        self.assertEqual(reclaim_orphans(batch_size=1), (2, 11))
+        for name in old:
+            self.assertFalse(default_storage.exists(name))
+        # Referenced files are kept however old they are
+        for name in recent + [task.result_file_path.name,
+                              self.csv_file.file_path.name]:
+            self.assertTrue(default_storage.exists(name))
+
+    def test_report(self):
+        self._task(self.default_user, 10)
+        self._task(self.default_user, 40, size=7)
+        # Sizes not recorded when written are taken from storage
+        self._task(self.short_user, 5, size=11, record_size=False)
+        self._store('processed_csv/orphan.csv', b'x' * 13, hours=48)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            report = run_retention()
+        self.assertEqual(report, {
+            'expired_tasks': 2,
+            'result_bytes_freed': 18,
+            'orphan_files_removed': 1,
+            'orphan_bytes_freed': 13,
+            'bytes_freed': 31,
+        })
+
+
+class PredicateTests(SimpleTestCase):
+    VALUES = ['Apple pie', 'apple', 'Banana', 'cherry.', 'a.b', np.nan]
+    # (operator, value, ignore_case) -> rows of VALUES matched
+    CASES = [
+        ('contains', 'apple', False, [0, 1, 0, 0, 0, 0]),
+        ('contains', 'apple', True, [1, 1, 0, 0, 0, 0]),
+        # Literal text, not a pattern
+        ('contains', '.', False, [0, 0, 0, 1, 1, 0]),
+        ('not_contains', 'apple', False, [1, 0, 1, 1, 1, 1]),
+        ('not_contains', 'APPLE', True, [0, 0, 1, 1, 1, 1]),
+        ('startswith', 'a', False, [0, 1, 0, 0, 1, 0]),
+        ('startswith', 'a', True, [1, 1, 0, 0, 1, 0]),
+        ('endswith', 'E', False, [0, 0, 0, 0, 0, 0]),
+        ('endswith', 'E', True, [1, 1, 0, 0, 0, 0]),
+        ('in', ['apple', 'Banana'], False, [0, 1, 1, 0, 0, 0]),
+        ('in', ['APPLE'], False, [0, 0, 0, 0, 0, 0]),
+        ('in', ['APPLE', 'banana'], True, [0, 1, 1, 0, 0, 0]),
+        ('is_null', None, False, [0, 0, 0, 0, 0, 1]),
+        ('is_null', True, False, [0, 0, 0, 0, 0, 1]),
+        ('is_null', False, False, [1, 1, 1, 1, 1, 0]),
+        ('regex', '^a', False, [0, 1, 0, 0, 1, 0]),
+        ('regex', '^a', True, [1, 1, 0, 0, 1, 0]),
+        ('regex', r'\.', False, [0, 0, 0, 1, 1, 0]),
+    ]
+    REPEATS = 4
+
+    def _columns(self):
+        """(label, frame, factorised) for each way a column can be matched"""
+        repeated = self.VALUES * self.REPEATS
+        return [
+            ('distinct', pd.DataFrame({'c': self.VALUES}), False),
+            ('repeated', pd.DataFrame({'c': repeated}), True),
+            ('category', pd.DataFrame({'c': pd.Categorical(repeated)}), True),
+        ]
+
+    def test_masks(self):
+        for label, frame, factorised in self._columns():
+            repeats = len(frame) // len(self.VALUES)
+            for operator, value, ignore_case, expected in self.CASES:
+                condition = {'column': 'c', 'operator': operator,
+                             'ignore_case': ignore_case}
+                if value is not None:
+                    condition['value'] = value
+                with self.subTest(column=label, condition=condition):
+                    columns = predicates.StringColumns(frame)
+                    mask = predicates.compile_condition(condition)(columns)
+                    self.assertEqual(mask.dtype, bool)
+                    self.assertEqual(mask.tolist(),
+                                     [bool(m) for m in expected] * repeats)
+            self.assertEqual(
+                predicates.StringColumns(frame).distinct('c') is not None,
+                factorised
+            )
+
+    def test_numeric_columns(self):
+        frame = pd.DataFrame({'n': [1.0, 2.5, np.nan, 10.0]})
+        for operator, value, expected in (
+            ('in', ['1', '2.50'], [True, True, False, False]),
+            ('contains', '1', [True, False, False, True]),
+            ('is_null', None, [False, False, True, False]),
+        ):
+            with self.subTest(operator=operator):
+                mask = predicates.compile_condition(
+                    {'column': 'n', 'operator': operator, 'value': value}
+                )(predicates.StringColumns(frame))
+                self.assertEqual(mask.tolist(), expected)
+
+        condition = {'column': 'n', 'operator': 'in', 'value': ['x']}
+        with self.assertRaises(ValueError):
+            predicates.compile_condition(condition)(
+                predicates.StringColumns(frame)
+            )
+
+    def test_missing_column(self):
+        condition = {'column': 'missing', 'operator': 'contains', 'value': 'a'}
+        with self.assertRaises(ValueError):
+            predicates.compile_condition(condition)(
+                predicates.StringColumns(pd.DataFrame({'c': ['a']}))
+            )
+
+
+class FilterValidationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('filters@example.com', 'password')
+        self.csv_file = CSVFile.objects.create(
+            user=self.user, original_name='input.csv',
+            file_path='csv_files/input.csv', file_size=1
+        )
+
+    def _validate(self, condition):
+        serializer = OperationRequestSerializer(data={
+            'file_id': self.csv_file.id,
+            'operation': 'filter',
+            'filters': [condition],
+        }, context={'request': mock.Mock(user=self.user)})
+        return serializer.is_valid(), serializer.errors
+
+    def test_valid_conditions(self):
+        for condition in (
+            {'column': 'c', 'operator': 'contains', 'value': 'a',
+             'ignore_case': True},
+            {'column': 'c', 'operator': 'in', 'value': ['a', 1]},
+            {'column': 'c', 'operator': 'is_null'},
+            {'column': 'c', 'operator': 'is_null', 'value': False},
+            {'column': 'c', 'operator': 'regex', 'value': '^a+$'},
+            {'column': 'c', 'operator': '>=', 'value': '1'},
+        ):
+            with self.subTest(condition=condition):
+                valid, errors = self._validate(condition)
+                self.assertTrue(valid, errors)
+
+    def test_invalid_conditions(self):
+        for condition in (
+            {'column': 'c', 'operator': 'like', 'value': 'a'},
+            {'column': 'c', 'operator': 'contains'},
+            {'column': 'c', 'operator': 'contains', 'value': ['a']},
+            {'column': 'c', 'operator': 'contains', 'value': 'a',
+             'ignore_case': 'yes'},
+            {'column': 'c', 'operator': 'in', 'value': 'a'},
+            {'column': 'c', 'operator': 'in', 'value': []},
+            {'column': 'c', 'operator': 'in', 'value': [['a']]},
+            {'column': 'c', 'operator': 'is_null', 'value': 'yes'},
+            {'column': 'c', 'operator': 'regex', 'value': '('},
+        ):
+            with self.subTest(condition=condition):
+                valid, _ = self._validate(condition)
+                self.assertFalse(valid)
+
+
+@override_settings(
+    CSV_AUTH_CACHE_SECONDS=60,
+    CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+    }},
+)
+class AuthCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('poller@example.com', 'password')
+        csv_file = CSVFile.objects.create(
+            user=self.user, original_name='input.csv',
+            file_path='csv_files/input.csv', file_size=1
+        )
+        self.task = TaskResult.objects.create(
+            task_id=str(uuid.uuid4()), user=self.user, csv_file=csv_file,
+            operation='dedup'
+        )
+        self.client.defaults['HTTP_AUTHORIZATION'] = (
+            f'Bearer {AccessToken.for_user(self.user)}'
+        )
+
+    def _poll(self, url='/api/task-status/'):
+        return self.client.get(url, {'task_id': self.task.task_id})
+
+    def test_warm_cache_skips_user_query(self):
+        for url in ('/api/task-status/', '/api/async/task-status/'):
+            with self.subTest(url=url):
+                self.assertEqual(self._poll(url).status_code, 200)
+                # Only the task lookup
+                with self.assertNumQueries(1):
+                    response = self._poll(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['task_id'],
+                                 self.task.task_id)
+
+    def test_cache_holds_no_password_hash(self):
+        self._poll()
+        cached = cache.get(user_cache_key(self.user.pk))
+        self.assertEqual(set(cached), {'pk', 'is_active', 'password_digest'})
+        self.assertNotIn(self.user.password, cached.values())
+
+    def test_cached_user_loads_other_fields(self):
+        self._poll()
+        response = self.client.get('/api/scheduler-status/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['users'][0]['email'], self.user.email)
+
+    def test_saving_user_invalidates_after_commit(self):
+        key = user_cache_key(self.user.pk)
+        for change in (lambda user: user.set_password('changed'),
+                       lambda user: setattr(user, 'is_active', False)):
+            self._poll()
+            with self.captureOnCommitCallbacks(execute=True):
+                change(self.user)
+                self.user.save()
+                self.assertIsNotNone(cache.get(key))
+            self.assertIsNone(cache.get(key))
+        # The deactivated user is looked up again and rejected
+        self.assertEqual(self._poll().status_code, 401)
+
+    def test_unavailable_cache_falls_back_to_database(self):
+        self._poll()
+        with mock.patch.object(cache, 'get', side_effect=ConnectionError), \
+                mock.patch.object(cache, 'set', side_effect=ConnectionError), \
+                self.assertLogs('csv_app.authentication', 'WARNING'):
+            # User and task lookups
+            with self.assertNumQueries(2):
+                response = self._poll()
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,124 @@
+"""
+Per-stage timing of CSV tasks.
+
+Every task records how long it spent parsing the CSV (``read``), replacing
+infinities (``clean``), running the operation itself (``transform``),
+serialising the result (``write``), talking to the database (``db``) and
+building or looking up column indexes (``index``), along with the bytes
+read and written and the time it waited in the queue. The numbers are
+stored in ``TaskResult.timings``.
+"""
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.utils import timezone
+
+from . import tracing
+from .models import TaskResult
+
+STAGES = ('db', 'plan', 'index', 'read', 'clean', 'transform', 'write')
+
+# (label, upper bound in bytes) for the summary, smallest first
+SIZE_BUCKETS = (
+    ('<1MB', 1024 ** 2),
+    ('1-10MB', 10 * 1024 ** 2),
+    ('10-100MB', 100 * 1024 ** 2),
+    ('100MB-1GB', 1024 ** 3),
+    ('>=1GB', None),
+)
+
+
+class StageTimer:
+    """Accumulates wall time per stage plus bytes read and written"""
+
+    def __init__(self):
+        self.stages = dict.fromkeys(STAGES, 0.0)
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.queue_wait = None
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            with tracing.span(name):
+                yield
+        finally:
+            self.stages[name] += time.perf_counter() - start
+
+    def to_dict(self):
+        total = time.perf_counter() - self._started
+        stages = dict(self.stages)
+        # Whatever was not attributed to a stage is the operation itself
+        stages['transform'] += max(total - sum(stages.values()), 0.0)
+        return {
+            'stages': {name: round(seconds, 6) for name, seconds in stages.items()},
+            'total_seconds': round(total, 6),
+            'queue_wait_seconds': (
+                round(self.queue_wait, 6) if self.queue_wait is not None else None
+            ),
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+        }
+
+
+def size_bucket(file_size):
+    """Label of the summary bucket ``file_size`` falls into"""
+    for label, limit in SIZE_BUCKETS:
+        if limit is None or file_size < limit:
+            return label
+
+
+def timing_summary(hours=24, limit=10000):
+    """
+    Average and p95 stage timings of finished tasks over the last ``hours``,
+    grouped by operation and input file size bucket.
+    """
+    # dispatch imports the tasks, which import this module
+    from .dispatch import _percentile
+
+    rows = TaskResult.objects.filter(
+        completed_at__gte=timezone.now() - timedelta(hours=hours),
+        timings__isnull=False
+    ).order_by('-completed_at').values_list(
+        'operation', 'status', 'csv_file__file_size', 'timings'
+    )[:limit]
+
+    groups = {}
+    for operation, task_status, file_size, timings in rows:
+        key = (operation, size_bucket(file_size or 0))
+        groups.setdefault(key, []).append((task_status, timings))
+
+    summary = []
+    bucket_order = [label for label, _ in SIZE_BUCKETS]
+    for (operation, bucket), entries in sorted(
+        groups.items(), key=lambda item: (item[0][0], bucket_order.index(item[0][1]))
+    ):
+        totals = sorted(timings['total_seconds'] for _, timings in entries)
+        waits = sorted(
+            timings['queue_wait_seconds'] for _, timings in entries
+            if timings.get('queue_wait_seconds') is not None
+        )
+        summary.append({
+            'operation': operation,
+            'size_bucket': bucket,
+            'tasks': len(entries),
+            'failed': sum(1 for status, _ in entries if status == 'FAILURE'),
+            'total_avg_seconds': sum(totals) / len(totals),
+            'total_p95_seconds': _percentile(totals, 0.95),
+            'queue_wait_avg_seconds': sum(waits) / len(waits) if waits else None,
+            'queue_wait_p95_seconds': _percentile(waits, 0.95),
+            'stage_avg_seconds': {
+                stage: sum(
+                    timings['stages'].get(stage, 0.0) for _, timings in entries
+                ) / len(entries)
+                for stage in STAGES
+            },
+            'bytes_read': sum(timings['bytes_read'] for _, timings in entries),
+            'bytes_written': sum(
+                timings['bytes_written'] for _, timings in entries
+            ),
+        })
+    return summary
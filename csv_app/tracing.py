@@ -0,0 +1,247 @@
+"""
+Lightweight distributed tracing from the API to the Celery worker.
+
+A trace starts in PerformOperationView (or continues an incoming W3C
+``traceparent`` header), travels to the worker in the Celery message
+headers and is continued there. Child spans cover database queries,
+CSV reads, inf replacement, output writes and the time the message sat
+in the broker.
+
+Finished traces are exported as Zipkin v2 JSON, appended to
+``CSV_TRACE_FILE`` (one JSON array per line) and/or posted to
+``CSV_TRACE_COLLECTOR_URL`` (e.g. ``http://zipkin:9411/api/v2/spans``).
+Tracing is off when neither is set.
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_HEADER = 'traceparent'
+TRACEPARENT_RE = re.compile(
+    r'^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$'
+)
+MAX_STATEMENT_LENGTH = 500
+
+_current_span = contextvars.ContextVar('csv_app_current_span', default=None)
+_file_lock = threading.Lock()
+
+
+def enabled():
+    return bool(settings.CSV_TRACE_FILE or settings.CSV_TRACE_COLLECTOR_URL)
+
+
+def _now_us():
+    return int(time.time() * 1_000_000)
+
+
+class Span:
+    """A timed operation; spans of one process share a ``finished`` list"""
+
+    def __init__(self, name, trace_id, parent_id=None, kind=None,
+                 service=None, finished=None, tags=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.service = service
+        self.finished = finished if finished is not None else []
+        self.tags = {key: str(value) for key, value in (tags or {}).items()}
+        self.timestamp = _now_us()
+        self.duration = None
+
+    def child(self, name, kind=None, **tags):
+        return Span(name, self.trace_id, parent_id=self.span_id, kind=kind,
+                    service=self.service, finished=self.finished, tags=tags)
+
+    def tag(self, key, value):
+        self.tags[key] = str(value)
+
+    def finish(self, end=None):
+        self.duration = max((end or _now_us()) - self.timestamp, 1)
+        self.finished.append(self)
+
+    def to_zipkin(self):
+        span = {
+            'traceId': self.trace_id,
+            'id': self.span_id,
+            'name': self.name,
+            'timestamp': self.timestamp,
+            'duration': self.duration,
+            'localEndpoint': {'serviceName': self.service},
+        }
+        if self.parent_id:
+            span['parentId'] = self.parent_id
+        if self.kind:
+            span['kind'] = self.kind
+        if self.tags:
+            span['tags'] = self.tags
+        return span
+
+
+def current_span():
+    return _current_span.get()
+
+
+def parse_traceparent(value):
+    """Return (trace_id, parent_span_id) from a W3C traceparent, or None"""
+    match = TRACEPARENT_RE.match((value or '').strip().lower())
+    return match.groups() if match else None
+
+
+def inject():
+    """Headers carrying the current span to another process"""
+    span = current_span()
+    if span is None:
+        return {}
+    return {TRACEPARENT_HEADER: f'00-{span.trace_id}-{span.span_id}-01'}
+
+
+def task_traceparent():
+    """traceparent sent with the Celery task currently executing"""
+    from celery import current_task
+
+    request = getattr(current_task, 'request', None)
+    if request is None:
+        return None
+    # Custom headers end up on the request itself or in request.headers
+    return (getattr(request, TRACEPARENT_HEADER, None)
+            or (request.headers or {}).get(TRACEPARENT_HEADER))
+
+
+def _db_span(execute, sql, params, many, context):
+    """connection.execute_wrapper hook: one CLIENT span per query"""
+    with span('db.query', kind='CLIENT', **{
+        'db.statement': sql[:MAX_STATEMENT_LENGTH],
+        'db.vendor': context['connection'].vendor,
+    }):
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def trace(name, role, traceparent=None, kind='SERVER', **tags):
+    """
+    Root span of this process for a request or a task. Continues the
+    trace in ``traceparent`` when given, traces database queries and
+    exports every span when it ends.
+    """
+    if not enabled():
+        yield None
+        return
+
+    parent = parse_traceparent(traceparent)
+    trace_id, parent_id = parent if parent else (secrets.token_hex(16), None)
+    root = Span(name, trace_id, parent_id=parent_id, kind=kind,
+                service=f'{settings.CSV_TRACE_SERVICE_NAME}-{role}', tags=tags)
+    # An eager task inside a traced request must not trace queries twice
+    nested = current_span() is not None
+    token = _current_span.set(root)
+    try:
+        with nullcontext() if nested else connection.execute_wrapper(_db_span):
+            yield root
+    except Exception as exc:
+        root.tag('error', str(exc))
+        raise
+    finally:
+        _current_span.reset(token)
+        root.finish()
+        export(root.finished)
+
+
+@contextmanager
+def span(name, kind=None, **tags):
+    """Child span of the current span (no-op outside a trace)"""
+    parent = current_span()
+    if parent is None:
+        yield None
+        return
+
+    child = parent.child(name, kind=kind, **tags)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except Exception as exc:
+        child.tag('error', str(exc))
+        raise
+    finally:
+        _current_span.reset(token)
+        child.finish()
+
+
+def record_span(name, start, end, kind=None, **tags):
+    """Add an already finished span (e.g. broker wait) under the current one"""
+    parent = current_span()
+    if parent is None:
+        return
+    child = parent.child(name, kind=kind, **tags)
+    child.timestamp = int(start.timestamp() * 1_000_000)
+    child.finish(end=int(end.timestamp() * 1_000_000))
+
+
+def traced_view(name):
+    """Decorator for APIView methods: continue or start a trace per request"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            with trace(name, 'web',
+                       traceparent=request.META.get('HTTP_TRACEPARENT'),
+                       **{'http.method': request.method,
+                          'http.path': request.path}) as root:
+                response = method(view, request, *args, **kwargs)
+                if root is not None:
+                    root.tag('http.status_code', response.status_code)
+                    response['traceparent'] = (
+                        f'00-{root.trace_id}-{root.span_id}-01'
+                    )
+                return response
+        return wrapper
+    return decorator
+
+
+def export(spans):
+    """Write finished spans to the configured file and/or collector"""
+    if not spans:
+        return
+    payload = json.dumps([item.to_zipkin() for item in spans])
+
+    if settings.CSV_TRACE_FILE:
+        try:
+            directory = os.path.dirname(settings.CSV_TRACE_FILE)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with _file_lock, open(settings.CSV_TRACE_FILE, 'a') as handle:
+                handle.write(payload + '\n')
+        except OSError:
+            logger.warning("Could not write trace file", exc_info=True)
+
+    if settings.CSV_TRACE_COLLECTOR_URL:
+        # Never hold up the request or task on the collector
+        threading.Thread(
+            target=_post, args=(settings.CSV_TRACE_COLLECTOR_URL, payload),
+            daemon=True
+        ).start()
+
+
+def _post(url, payload):
+    request = urllib.request.Request(
+        url, data=payload.encode(), method='POST',
+        headers={'Content-Type': 'application/json'}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5):
+            pass
+    except Exception:
+        logger.warning("Could not send spans to %s", url, exc_info=True)
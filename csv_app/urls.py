@@ -14,4 +14,16 @@ urlpatterns = [
     path('api/upload-csv/', views.CSVUploadView.as_view(), name='upload_csv'),
     path('api/perform-operation/', views.PerformOperationView.as_view(), name='perform_operation'),
     path('api/task-status/', views.TaskStatusView.as_view(), name='task_status'),
+    path('api/async/task-status/', views.AsyncTaskStatusView.as_view(), name='async_task_status'),
+    path('api/async/task-result/', views.AsyncTaskResultView.as_view(), name='async_task_result'),
+    path('api/scheduler-status/', views.SchedulerStatusView.as_view(), name='scheduler_status'),
+    path('api/files/', views.FileListView.as_view(), name='file_list'),
+    path('api/tasks/', views.TaskListView.as_view(), name='task_list'),
+
+    # Operations endpoints
+    path('api/queue-stats/', views.QueueStatsView.as_view(), name='queue_stats'),
+    path('api/timing-stats/', views.TimingStatsView.as_view(), name='timing_stats'),
+    path('api/task-profile/', views.TaskProfileView.as_view(), name='task_profile'),
+    path('api/health/queue/', views.QueueHealthView.as_view(), name='queue_health'),
+    path('metrics', views.MetricsView.as_view(), name='metrics'),
 ]
@@ -1,23 +1,43 @@
 from rest_framework import status
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.generics import CreateAPIView
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.tokens import RefreshToken
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
+import asyncio
+import os
 import uuid
 import pandas as pd
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
+from django.views import View
 from .serializers import (
     UserRegistrationSerializer,
     LoginSerializer,
     CSVFileUploadSerializer,
     OperationRequestSerializer,
-    TaskStatusSerializer
+    TaskStatusSerializer,
+    CSVFileListSerializer,
+    TaskResultListSerializer
 )
 from .models import CSVFile, TaskResult
-from .tasks import process_csv_dedup, process_csv_unique, process_csv_filter
+from .authentication import CachedJWTAuthentication
+from . import admission, metrics, scheduling, tracing
+from .pagination import paginate, parse_page_size
+from .dispatch import queue_wait_stats
+from .profiling import ARTIFACT_FILES, artifact_name
+from .timings import timing_summary
 
 
 class RegisterView(APIView):
@@ -280,6 +300,7 @@ class CSVUploadView(CreateAPIView):
 
         if serializer.is_valid():
             csv_file = serializer.save()
+            metrics.UPLOAD_SIZE.observe(csv_file.file_size)
 
             return Response({
                 'message': 'File uploaded successfully',
@@ -302,7 +323,7 @@ class PerformOperationView(APIView):
     permission_classes = [IsAuthenticated]
 
     @swagger_auto_schema(
-        operation_description="Perform CSV operation (dedup/unique/filter)",
+        operation_description="Perform CSV operation (dedup/unique/filter/profile/sample/top_k)",
         request_body=openapi.Schema(
             type=openapi.TYPE_OBJECT,
             required=['file_id', 'operation'],
@@ -313,12 +334,57 @@ class PerformOperationView(APIView):
                 ),
                 'operation': openapi.Schema(
                     type=openapi.TYPE_STRING,
-                    enum=['dedup', 'unique', 'filter'],
+                    enum=['dedup', 'unique', 'filter', 'profile', 'sample',
+                          'top_k'],
                     description='Type of operation to perform'
                 ),
                 'column': openapi.Schema(
                     type=openapi.TYPE_STRING,
-                    description='Column name (required for unique operation)'
+                    description='Column name (required for unique/top_k operation)'
+                ),
+                'k': openapi.Schema(
+                    type=openapi.TYPE_INTEGER,
+                    description='Number of rows (sample or top_k)'
+                ),
+                'fraction': openapi.Schema(
+                    type=openapi.TYPE_NUMBER,
+                    description='Fraction of rows to sample (instead of k)'
+                ),
+                'seed': openapi.Schema(
+                    type=openapi.TYPE_INTEGER,
+                    description='Random seed for reproducible samples'
+                ),
+                'order': openapi.Schema(
+                    type=openapi.TYPE_STRING,
+                    enum=['largest', 'smallest'],
+                    description='Which end of the column to keep for top_k'
+                ),
+                'subset': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(type=openapi.TYPE_STRING),
+                    description='Key columns for dedup (default: all columns)'
+                ),
+                'keep': openapi.Schema(
+                    type=openapi.TYPE_STRING,
+                    enum=['first', 'last'],
+                    description='Which duplicate to keep for dedup'
+                ),
+                'ignore_case': openapi.Schema(
+                    type=openapi.TYPE_BOOLEAN,
+                    description='Case-insensitive key comparison for dedup'
+                ),
+                'trim_whitespace': openapi.Schema(
+                    type=openapi.TYPE_BOOLEAN,
+                    description='Trim surrounding whitespace before comparing'
+                ),
+                'round_digits': openapi.Schema(
+                    type=openapi.TYPE_INTEGER,
+                    description='Round numeric keys to this many decimals'
+                ),
+                'profile': openapi.Schema(
+                    type=openapi.TYPE_BOOLEAN,
+                    description='Capture a CPU and allocation profile (default: false)',
+                    default=False
                 ),
                 'filters': openapi.Schema(
                     type=openapi.TYPE_ARRAY,
@@ -328,12 +394,28 @@ class PerformOperationView(APIView):
                             'column': openapi.Schema(type=openapi.TYPE_STRING),
                             'operator': openapi.Schema(
                                 type=openapi.TYPE_STRING,
-                                enum=['>', '>=', '<', '<=', '==', '!=', 'contains', 'not_contains']
+                                enum=['>', '>=', '<', '<=', '==', '!=', 'contains', 'not_contains',
+                                      'startswith', 'endswith', 'in', 'is_null', 'regex']
+                            ),
+                            'value': openapi.Schema(
+                                type=openapi.TYPE_STRING,
+                                description='A list for in, true/false (optional) for is_null, '
+                                            'a pattern for regex; contains matches literally'
                             ),
-                            'value': openapi.Schema(type=openapi.TYPE_STRING)
+                            'ignore_case': openapi.Schema(
+                                type=openapi.TYPE_BOOLEAN,
+                                description='Case-insensitive text matching (default: false)'
+                            )
                         }
                     ),
                     description='Filter conditions (required for filter operation)'
+                ),
+                'use_index': openapi.Schema(
+                    type=openapi.TYPE_BOOLEAN,
+                    description='Use (and build) column indexes for ==, !=, '
+                                '<, <=, > and >= filters on this file '
+                                '(default: false)',
+                    default=False
                 )
             }
         ),
@@ -350,6 +432,15 @@ class PerformOperationView(APIView):
                         'task_id': openapi.Schema(
                             type=openapi.TYPE_STRING,
                             example='abc123-def456-ghi789'
+                        ),
+                        'status': openapi.Schema(
+                            type=openapi.TYPE_STRING,
+                            enum=['PENDING', 'QUEUED'],
+                            description='QUEUED when waiting for a free slot'
+                        ),
+                        'queue': openapi.Schema(
+                            type=openapi.TYPE_STRING,
+                            example='interactive'
                         )
                     }
                 )
@@ -365,11 +456,30 @@ class PerformOperationView(APIView):
                         )
                     }
                 )
+            ),
+            429: openapi.Response(
+                description="System saturated, retry after the given seconds",
+                headers={
+                    'Retry-After': {
+                        'type': openapi.TYPE_INTEGER,
+                        'description': 'Seconds to wait before retrying'
+                    }
+                },
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'error': openapi.Schema(
+                            type=openapi.TYPE_STRING,
+                            example='Server is busy, please retry later'
+                        )
+                    }
+                )
             )
         }
     )
+    @tracing.traced_view('POST /api/perform-operation/')
     def post(self, request):
-        """Perform CSV operation (dedup/unique/filter)"""
+        """Perform CSV operation (dedup/unique/filter/profile/sample/top_k)"""
         serializer = OperationRequestSerializer(
             data=request.data,
             context={'request': request}
@@ -379,6 +489,14 @@ class PerformOperationView(APIView):
             file_id = serializer.validated_data['file_id']
             operation = serializer.validated_data['operation']
 
+            # Refuse new work while the system is saturated
+            admitted, retry_after, _ = admission.check_admission()
+            if not admitted:
+                return Response({
+                    'error': 'Server is busy, please retry later'
+                }, status=status.HTTP_429_TOO_MANY_REQUESTS,
+                    headers={'Retry-After': str(retry_after)})
+
             # Generate unique task ID
             task_id = str(uuid.uuid4())
 
@@ -388,25 +506,25 @@ class PerformOperationView(APIView):
                 user=request.user,
                 csv_file_id=file_id,
                 operation=operation,
-                status='PENDING',
+                status='QUEUED',
                 operation_params=serializer.validated_data
             )
 
             try:
-                if operation == 'dedup':
-                    process_csv_dedup.delay(task_id, file_id)
-
-                elif operation == 'unique':
-                    column = serializer.validated_data.get('column')
-                    process_csv_unique.delay(task_id, file_id, column)
-
-                elif operation == 'filter':
-                    filters = serializer.validated_data.get('filters', [])
-                    process_csv_filter.delay(task_id, file_id, filters)
+                # Dispatch now, or park in the user's fair-share backlog
+                if scheduling.submit(task_result):
+                    return Response({
+                        'message': 'Operation started',
+                        'task_id': task_id,
+                        'status': 'PENDING',
+                        'queue': task_result.queue
+                    }, status=status.HTTP_201_CREATED)
 
                 return Response({
-                    'message': 'Operation started',
-                    'task_id': task_id
+                    'message': 'Operation queued',
+                    'task_id': task_id,
+                    'status': 'QUEUED',
+                    'queue': None
                 }, status=status.HTTP_201_CREATED)
 
             except Exception as e:
@@ -465,7 +583,8 @@ class TaskStatusView(APIView):
                         'task_id': openapi.Schema(type=openapi.TYPE_STRING),
                         'status': openapi.Schema(
                             type=openapi.TYPE_STRING,
-                            enum=['PENDING', 'PROGRESS', 'SUCCESS', 'FAILURE']
+                            enum=['QUEUED', 'PENDING', 'PROGRESS', 'SUCCESS',
+                                  'FAILURE']
                         ),
                         'result': openapi.Schema(
                             type=openapi.TYPE_OBJECT,
@@ -474,9 +593,17 @@ class TaskStatusView(APIView):
                                     type=openapi.TYPE_ARRAY,
                                     items=openapi.Schema(type=openapi.TYPE_OBJECT)
                                 ),
-                                'file_link': openapi.Schema(type=openapi.TYPE_STRING)
+                                'file_link': openapi.Schema(type=openapi.TYPE_STRING),
+                                'summary': openapi.Schema(
+                                    type=openapi.TYPE_OBJECT,
+                                    description='Operation summary (e.g. column profile)'
+                                )
                             }
                         ),
+                        'timings': openapi.Schema(
+                            type=openapi.TYPE_OBJECT,
+                            description='Seconds per stage, bytes read/written and queue wait'
+                        ),
                         'error': openapi.Schema(type=openapi.TYPE_STRING)
                     }
                 )
@@ -495,6 +622,7 @@ class TaskStatusView(APIView):
             )
         }
     )
+    @metrics.TASK_STATUS_LATENCY.time()
     def get(self, request):
         """Get task status and results"""
         task_id = request.query_params.get('task_id')
@@ -515,34 +643,600 @@ class TaskStatusView(APIView):
                 'error': 'Task not found'
             }, status=status.HTTP_404_NOT_FOUND)
 
-        response_data = {
-            'task_id': task.task_id,
-            'status': task.status
+        preview = None
+        if _has_result_file(task):
+            try:
+                preview = (
+                    _read_result_preview(task, n),
+                    _result_link(task, request)
+                )
+            except Exception as e:
+                preview = e
+
+        return Response(_task_status_data(task, preview),
+                        status=status.HTTP_200_OK)
+
+
+def _has_result_file(task):
+    return task.status == 'SUCCESS' and bool(task.result_file_path)
+
+
+def _result_link(task, request):
+    """Download URL of the result file (presigned on object storage)"""
+    return default_storage.download_url(task.result_file_path.name, request)
+
+
+def _read_result_preview(task, n):
+    """First n rows of the result file (blocking)"""
+    with default_storage.open_input(task.result_file_path.name) as source:
+        df = pd.read_csv(source, nrows=n)
+    return df.to_dict('records')
+
+
+def _task_status_data(task, preview=None):
+    """
+    Body of a task-status response. ``preview`` is (rows, file link) for
+    tasks with a result file, or the exception raised reading it.
+    """
+    response_data = {
+        'task_id': task.task_id,
+        'status': task.status
+    }
+
+    if _has_result_file(task):
+        if isinstance(preview, Exception):
+            response_data['error'] = f"Error reading result file: {str(preview)}"
+        else:
+            data_records, file_link = preview
+            response_data['result'] = {
+                'file_link': file_link,
+                'data': data_records
+            }
+            if task.result_checksum:
+                response_data['result']['size'] = task.result_size
+                response_data['result']['checksum'] = task.result_checksum
+
+    # Operations such as profile return JSON instead of a file
+    elif task.status == 'SUCCESS' and task.result_summary is not None:
+        response_data['result'] = {
+            'summary': task.result_summary
         }
 
-        if task.status == 'SUCCESS' and task.result_file_path:
+    # If task failed, include error message
+    elif task.status == 'FAILURE':
+        response_data['error'] = task.error_message
+
+    if task.timings is not None:
+        response_data['timings'] = task.timings
+
+    return response_data
+
+
+# Async views: DRF's APIView is synchronous, so these are plain Django views
+# that authenticate and render JSON the same way as the DRF views.
+
+RESULT_CHUNK_SIZE = 256 * 1024
+
+
+def _json_response(data, status_code):
+    return HttpResponse(JSONRenderer().render(data), status=status_code,
+                        content_type='application/json')
+
+
+async def _authenticate(request):
+    """Return (user, None) or (None, 401 response)"""
+    authenticator = CachedJWTAuthentication()
+    try:
+        result = await authenticator.aauthenticate(request)
+    except AuthenticationFailed as exc:
+        detail = exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}
+        result, response = None, _json_response(detail, 401)
+    else:
+        response = _json_response({
+            'detail': 'Authentication credentials were not provided.'
+        }, 401)
+    if result is not None:
+        return result[0], None
+    response['WWW-Authenticate'] = authenticator.authenticate_header(request)
+    return None, response
+
+
+class AsyncTaskStatusView(View):
+    """
+    task-status for ASGI servers: the lookup uses the async ORM and the
+    result preview is parsed in a thread, so a waiting poller does not
+    hold a worker thread.
+    """
+
+    async def get(self, request):
+        user, error = await _authenticate(request)
+        if error is not None:
+            return error
+
+        with metrics.TASK_STATUS_LATENCY.time():
+            task_id = request.GET.get('task_id')
+            n = int(request.GET.get('n', 100))
+
+            if not task_id:
+                return _json_response({
+                    'error': 'task_id parameter is required'
+                }, status.HTTP_400_BAD_REQUEST)
+
             try:
-                # Read first n rows from result file
-                df = pd.read_csv(task.result_file_path.path)
-                data_records = df.head(n).to_dict('records')
-
-                # Generate file download link
-                file_link = None
-                if request:
-                    file_link = request.build_absolute_uri(
-                        task.result_file_path.url
+                task = await TaskResult.objects.aget(task_id=task_id, user=user)
+            except TaskResult.DoesNotExist:
+                return _json_response({
+                    'error': 'Task not found'
+                }, status.HTTP_404_NOT_FOUND)
+
+            preview = None
+            if _has_result_file(task):
+                try:
+                    preview = (
+                        await asyncio.to_thread(_read_result_preview, task, n),
+                        _result_link(task, request)
                     )
+                except Exception as e:
+                    preview = e
+
+            return _json_response(_task_status_data(task, preview),
+                                  status.HTTP_200_OK)
+
+
+async def _stream_file(path):
+    """Yield the file in chunks, reading in a thread"""
+    handle = await asyncio.to_thread(open, path, 'rb')
+    try:
+        while chunk := await asyncio.to_thread(handle.read, RESULT_CHUNK_SIZE):
+            yield chunk
+    finally:
+        handle.close()
+
+
+class AsyncTaskResultView(View):
+    """Download a task's result file, streamed without blocking the loop"""
+
+    async def get(self, request):
+        user, error = await _authenticate(request)
+        if error is not None:
+            return error
+
+        task_id = request.GET.get('task_id')
+        if not task_id:
+            return _json_response({
+                'error': 'task_id parameter is required'
+            }, status.HTTP_400_BAD_REQUEST)
+
+        task = await TaskResult.objects.filter(
+            task_id=task_id, user=user
+        ).only('task_id', 'status', 'result_file_path',
+               'result_checksum').afirst()
+        if (task is not None and _has_result_file(task)
+                and default_storage.remote):
+            # Object storage serves the file; the web process stays free
+            return HttpResponseRedirect(_result_link(task, request))
+
+        size = None
+        if task is not None and _has_result_file(task):
+            try:
+                size = await asyncio.to_thread(
+                    os.path.getsize, task.result_file_path.path
+                )
+            except OSError:
+                pass
+        if size is None:
+            return _json_response({
+                'error': 'Result not found'
+            }, status.HTTP_404_NOT_FOUND)
+
+        path = task.result_file_path.path
+        response = StreamingHttpResponse(_stream_file(path),
+                                         content_type='text/csv')
+        response['Content-Length'] = size
+        response['Content-Disposition'] = (
+            f'attachment; filename="{os.path.basename(path)}"'
+        )
+        if task.result_checksum:
+            # SHA-256 of the file, recorded when it was written
+            response['ETag'] = f'"{task.result_checksum}"'
+        return response
+
 
-                response_data['result'] = {
-                    'file_link': file_link,
-                    'data': data_records
+CURSOR_PARAMETERS = [
+    openapi.Parameter(
+        'cursor',
+        openapi.IN_QUERY,
+        description="next_cursor of the previous page",
+        type=openapi.TYPE_STRING,
+        required=False
+    ),
+    openapi.Parameter(
+        'page_size',
+        openapi.IN_QUERY,
+        description="Items per page (default: 20, max: 100)",
+        type=openapi.TYPE_INTEGER,
+        required=False
+    )
+]
+
+
+def _page_response(rows, next_cursor, serializer_class):
+    return Response({
+        'results': serializer_class(rows, many=True).data,
+        'next_cursor': next_cursor
+    }, status=status.HTTP_200_OK)
+
+
+class FileListView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="List uploaded CSV files, newest first",
+        manual_parameters=CURSOR_PARAMETERS,
+        responses={
+            200: openapi.Response(
+                description="One page of files",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'results': openapi.Schema(
+                            type=openapi.TYPE_ARRAY,
+                            items=openapi.Schema(type=openapi.TYPE_OBJECT)
+                        ),
+                        'next_cursor': openapi.Schema(type=openapi.TYPE_STRING)
+                    }
+                )
+            )
+        }
+    )
+    def get(self, request):
+        """List the user's CSV files"""
+        try:
+            page_size = parse_page_size(request.query_params.get('page_size'))
+            files = CSVFile.objects.filter(user=request.user).only(
+                'id', 'original_name', 'file_size', 'upload_date',
+                'is_processed'
+            )
+            rows, next_cursor = paginate(
+                files, 'upload_date',
+                cursor=request.query_params.get('cursor'),
+                page_size=page_size
+            )
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return _page_response(rows, next_cursor, CSVFileListSerializer)
+
+
+class TaskListView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="List operations, newest first",
+        manual_parameters=CURSOR_PARAMETERS + [
+            openapi.Parameter(
+                'status',
+                openapi.IN_QUERY,
+                description="Only tasks with this status",
+                type=openapi.TYPE_STRING,
+                enum=[choice for choice, _ in TaskResult.STATUS_CHOICES],
+                required=False
+            ),
+            openapi.Parameter(
+                'operation',
+                openapi.IN_QUERY,
+                description="Only tasks of this operation",
+                type=openapi.TYPE_STRING,
+                enum=[choice for choice, _ in TaskResult.OPERATION_CHOICES],
+                required=False
+            )
+        ],
+        responses={
+            200: openapi.Response(
+                description="One page of tasks",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'results': openapi.Schema(
+                            type=openapi.TYPE_ARRAY,
+                            items=openapi.Schema(type=openapi.TYPE_OBJECT)
+                        ),
+                        'next_cursor': openapi.Schema(type=openapi.TYPE_STRING)
+                    }
+                )
+            )
+        }
+    )
+    def get(self, request):
+        """List the user's tasks"""
+        tasks = TaskResult.objects.filter(user=request.user).only(
+            'id', 'task_id', 'csv_file_id', 'operation', 'status',
+            'processed_rows', 'original_rows', 'queue', 'created_at',
+            'started_at', 'completed_at'
+        )
+
+        task_status = request.query_params.get('status')
+        if task_status:
+            if task_status not in dict(TaskResult.STATUS_CHOICES):
+                return Response({
+                    'error': f"Invalid status: {task_status}"
+                }, status=status.HTTP_400_BAD_REQUEST)
+            tasks = tasks.filter(status=task_status)
+
+        operation = request.query_params.get('operation')
+        if operation:
+            if operation not in dict(TaskResult.OPERATION_CHOICES):
+                return Response({
+                    'error': f"Invalid operation: {operation}"
+                }, status=status.HTTP_400_BAD_REQUEST)
+            tasks = tasks.filter(operation=operation)
+
+        try:
+            page_size = parse_page_size(request.query_params.get('page_size'))
+            rows, next_cursor = paginate(
+                tasks, 'created_at',
+                cursor=request.query_params.get('cursor'),
+                page_size=page_size
+            )
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return _page_response(rows, next_cursor, TaskResultListSerializer)
+
+
+class QueueStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_description="Queue wait times per Celery queue (staff only)",
+        manual_parameters=[
+            openapi.Parameter(
+                'hours',
+                openapi.IN_QUERY,
+                description="Look-back window in hours (default: 24)",
+                type=openapi.TYPE_INTEGER,
+                required=False,
+                example=24
+            )
+        ],
+        responses={
+            200: openapi.Response(
+                description="Per-queue wait statistics",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'hours': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'queues': openapi.Schema(type=openapi.TYPE_OBJECT)
+                    }
+                )
+            )
+        }
+    )
+    def get(self, request):
+        """Get queue wait statistics"""
+        try:
+            hours = int(request.query_params.get('hours', 24))
+        except ValueError:
+            return Response({
+                'error': 'hours must be an integer'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'hours': hours,
+            'queues': queue_wait_stats(hours=hours)
+        }, status=status.HTTP_200_OK)
+
+
+class TimingStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Stage timings per operation and file size bucket (staff only)"
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                'hours',
+                openapi.IN_QUERY,
+                description="Look-back window in hours (default: 24)",
+                type=openapi.TYPE_INTEGER,
+                required=False,
+                example=24
+            )
+        ],
+        responses={
+            200: openapi.Response(
+                description="Aggregated stage timings",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'hours': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'groups': openapi.Schema(
+                            type=openapi.TYPE_ARRAY,
+                            items=openapi.Schema(type=openapi.TYPE_OBJECT)
+                        )
+                    }
+                )
+            )
+        }
+    )
+    def get(self, request):
+        """Get stage timings aggregated by operation and file size"""
+        try:
+            hours = int(request.query_params.get('hours', 24))
+        except ValueError:
+            return Response({
+                'error': 'hours must be an integer'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'hours': hours,
+            'groups': timing_summary(hours=hours)
+        }, status=status.HTTP_200_OK)
+
+
+class TaskProfileView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Profiling artifacts of a task run with profile=true (staff only). "
+            "Without 'artifact' the available files are listed."
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                'task_id',
+                openapi.IN_QUERY,
+                description="Task ID",
+                type=openapi.TYPE_STRING,
+                required=True
+            ),
+            openapi.Parameter(
+                'artifact',
+                openapi.IN_QUERY,
+                description="Artifact to download",
+                type=openapi.TYPE_STRING,
+                enum=list(ARTIFACT_FILES),
+                required=False
+            )
+        ],
+        responses={
+            200: openapi.Response(description="Artifact list or file"),
+            404: openapi.Response(description="Task or profile not found")
+        }
+    )
+    def get(self, request):
+        """List or download the profiling artifacts of a task"""
+        task_id = request.query_params.get('task_id')
+        artifact = request.query_params.get('artifact')
+
+        if not task_id:
+            return Response({
+                'error': 'task_id parameter is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if artifact is not None and artifact not in ARTIFACT_FILES:
+            return Response({
+                'error': f"artifact must be one of: {', '.join(ARTIFACT_FILES)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        task = TaskResult.objects.filter(task_id=task_id).only(
+            'task_id', 'profile_artifacts'
+        ).first()
+        if task is None or not task.profile_artifacts:
+            return Response({
+                'error': 'Profile not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        files = task.profile_artifacts['files']
+        if artifact is None:
+            return Response({
+                'task_id': task.task_id,
+                'peak_traced_bytes': task.profile_artifacts['peak_traced_bytes'],
+                'artifacts': {
+                    kind: request.build_absolute_uri(
+                        f"{request.path}?task_id={task.task_id}&artifact={kind}"
+                    )
+                    for kind in files
                 }
+            }, status=status.HTTP_200_OK)
+
+        name = artifact_name(files[artifact])
+        if not default_storage.exists(name):
+            return Response({
+                'error': 'Profile not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        if default_storage.remote:
+            return HttpResponseRedirect(
+                default_storage.download_url(name, request)
+            )
+        return FileResponse(default_storage.open_input(name),
+                            as_attachment=True, filename=files[artifact])
 
-            except Exception as e:
-                response_data['error'] = f"Error reading result file: {str(e)}"
 
-        # If task failed, include error message
-        elif task.status == 'FAILURE':
-            response_data['error'] = task.error_message
+class SchedulerStatusView(APIView):
+    permission_classes = [IsAuthenticated]
 
-        return Response(response_data, status=status.HTTP_200_OK)
+    @swagger_auto_schema(
+        operation_description=(
+            "Queued and running task counts. Regular users see their own "
+            "counts, staff see every user with work in the system."
+        ),
+        responses={
+            200: openapi.Response(
+                description="Fair-share scheduler status",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'user_slots': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'global_slots': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'users': openapi.Schema(
+                            type=openapi.TYPE_ARRAY,
+                            items=openapi.Schema(
+                                type=openapi.TYPE_OBJECT,
+                                properties={
+                                    'user_id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                    'email': openapi.Schema(type=openapi.TYPE_STRING),
+                                    'queued': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                    'running': openapi.Schema(type=openapi.TYPE_INTEGER)
+                                }
+                            )
+                        )
+                    }
+                )
+            )
+        }
+    )
+    def get(self, request):
+        """Get fair-share scheduler status"""
+        if request.user.is_staff:
+            users = scheduling.user_counts()
+        else:
+            users = scheduling.user_counts(user_id=request.user.id) or [{
+                'user_id': request.user.id,
+                'email': request.user.email,
+                'queued': 0,
+                'running': 0,
+            }]
+
+        return Response({
+            'user_slots': settings.CSV_FAIR_SHARE_USER_SLOTS,
+            'global_slots': settings.CSV_FAIR_SHARE_GLOBAL_SLOTS,
+            'users': users
+        }, status=status.HTTP_200_OK)
+
+
+class QueueHealthView(APIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Current queue depth and pending bytes for load balancers. "
+            "Returns 503 while new operations are being refused."
+        ),
+        responses={
+            200: openapi.Response(description="Accepting new operations"),
+            503: openapi.Response(description="Saturated")
+        }
+    )
+    def get(self, request):
+        """Get queue depth and saturation state"""
+        snapshot = admission.load_snapshot()
+        return Response(
+            snapshot,
+            status=(status.HTTP_503_SERVICE_UNAVAILABLE
+                    if snapshot['saturated'] else status.HTTP_200_OK)
+        )
+
+
+class MetricsView(View):
+    """Prometheus scrape endpoint for the web process"""
+
+    def get(self, request):
+        body, content_type = metrics.render()
+        return HttpResponse(body, content_type=content_type)
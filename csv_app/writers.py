@@ -0,0 +1,113 @@
+"""
+Atomic result writer.
+
+Results go to a storage sink (``storage.open_output``) that only makes
+them visible under their name once the task has finished writing: a
+temporary file renamed into place on local disk, a multipart upload
+completed at the end on S3. A crash therefore never leaves a truncated
+result behind. Writes go through a ``CSV_WRITE_BUFFER_KB`` buffer; with
+``CSV_RESULT_FSYNC`` local files are synced before and after the rename.
+Rows, bytes and a SHA-256 checksum are counted while writing, so the file
+never has to be read back.
+"""
+import hashlib
+import io
+
+import pandas as pd
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+# Rows of the first frames kept for previews (e.g. unique values sample)
+HEAD_ROWS = 10
+
+
+class _HashingFile(io.RawIOBase):
+    """Raw stream into a storage sink that counts and hashes every byte"""
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.aborted = False
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.aborted:
+            # Drop what is still buffered when the writer fails
+            return len(data)
+        written = self.sink.write(data)
+        if written:
+            self.sha256.update(memoryview(data)[:written])
+            self.size += written
+        return written
+
+
+class ResultWriter:
+    """
+    Write CSV chunks to the stored file ``name`` atomically::
+
+        with ResultWriter(name) as writer:
+            writer.write_frame(chunk, header=True)
+        writer.rows, writer.size, writer.checksum
+
+    The file only appears under ``name`` if the block exits cleanly.
+    """
+
+    def __init__(self, name, buffer_size=None, fsync=None, storage=None):
+        self.name = name
+        self.storage = storage or default_storage
+        self.buffer_size = buffer_size or settings.CSV_WRITE_BUFFER_KB * 1024
+        self.fsync = settings.CSV_RESULT_FSYNC if fsync is None else fsync
+        self.rows = 0
+        self.size = 0
+        self.checksum = None
+        self.head = None
+        self._raw = None
+        self._text = None
+
+    def __enter__(self):
+        self._raw = _HashingFile(
+            self.storage.open_output(self.name, fsync=self.fsync)
+        )
+        self._text = io.TextIOWrapper(
+            io.BufferedWriter(self._raw, self.buffer_size),
+            encoding='utf-8', newline=''
+        )
+        return self
+
+    def write_frame(self, frame, header=True):
+        """Append the rows of ``frame`` (and its header line if asked)"""
+        frame.to_csv(self._text, index=False, header=header)
+        self.rows += len(frame)
+        if self.head is None:
+            self.head = frame.head(HEAD_ROWS).copy()
+        elif len(self.head) < HEAD_ROWS:
+            self.head = pd.concat(
+                [self.head, frame.head(HEAD_ROWS - len(self.head))]
+            )
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            try:
+                self._commit()
+                return False
+            except BaseException:
+                self._abort()
+                raise
+        self._abort()
+        return False
+
+    def _commit(self):
+        self._text.flush()
+        self.size = self._raw.size
+        self.checksum = self._raw.sha256.hexdigest()
+        self._text.close()
+        self._raw.sink.commit()
+
+    def _abort(self):
+        self._raw.aborted = True
+        if not self._text.closed:
+            self._text.close()
+        self._raw.sink.abort()
@@ -156,6 +156,43 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Storage of uploads and results: local (MEDIA_ROOT, a volume shared by
+# web and workers) or s3 (S3-compatible object storage such as MinIO, so
+# workers can run on any host)
+CSV_STORAGE_BACKEND = os.environ.get('CSV_STORAGE_BACKEND', 'local')
+STORAGES = {
+    'default': {
+        'BACKEND': 'csv_app.storage.LocalStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+if CSV_STORAGE_BACKEND == 's3':
+    STORAGES['default'] = {
+        'BACKEND': 'csv_app.s3.S3Storage',
+        'OPTIONS': {
+            'bucket_name': os.environ.get('CSV_S3_BUCKET', 'csv-files'),
+            'endpoint_url': os.environ.get('CSV_S3_ENDPOINT_URL') or None,
+            'access_key': os.environ.get('CSV_S3_ACCESS_KEY_ID'),
+            'secret_key': os.environ.get('CSV_S3_SECRET_ACCESS_KEY'),
+            'region_name': os.environ.get('CSV_S3_REGION', 'us-east-1'),
+            'addressing_style': os.environ.get('CSV_S3_ADDRESSING_STYLE',
+                                               'auto'),
+            'signature_version': 's3v4',
+            'file_overwrite': False,
+            # Lifetime of presigned download URLs
+            'querystring_expire': int(
+                os.environ.get('CSV_S3_URL_EXPIRE_SECONDS', 3600)
+            ),
+        },
+    }
+# Endpoint clients use for downloads when it differs from the workers' one
+CSV_S3_PUBLIC_ENDPOINT_URL = os.environ.get('CSV_S3_PUBLIC_ENDPOINT_URL') or None
+# Multipart upload part size (at least 5) and ranged read size
+CSV_S3_PART_MB = int(os.environ.get('CSV_S3_PART_MB', 8))
+CSV_S3_READ_BLOCK_MB = int(os.environ.get('CSV_S3_READ_BLOCK_MB', 8))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -164,7 +201,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'csv_app.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -220,6 +257,52 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_ENABLE_UTC = True
 
+# Cache shared by the web and worker processes (Redis db 1; the broker uses db 0)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f"redis://{os.environ.get('REDIS_HOST', 'localhost')}:{os.environ.get('REDIS_PORT', '6379')}/1",
+    }
+}
+
+# Queue routing: interactive for small/cheap jobs, bulk for large ones.
+# A file is routed to bulk when size x operation cost weight exceeds the
+# threshold. Worker concurrency per queue is set in docker-compose.yml.
+CSV_INTERACTIVE_QUEUE = os.environ.get('CSV_INTERACTIVE_QUEUE', 'interactive')
+CSV_BULK_QUEUE = os.environ.get('CSV_BULK_QUEUE', 'bulk')
+CSV_BULK_QUEUE_THRESHOLD_MB = float(
+    os.environ.get('CSV_BULK_QUEUE_THRESHOLD_MB', 50)
+)
+
+# Fair-share scheduling: tasks each user may have in flight at once, and
+# an optional cap on the total in flight (0 = no global cap). Excess work
+# waits in a per-user backlog and is released round-robin.
+CSV_FAIR_SHARE_USER_SLOTS = int(os.environ.get('CSV_FAIR_SHARE_USER_SLOTS', 4))
+CSV_FAIR_SHARE_GLOBAL_SLOTS = int(
+    os.environ.get('CSV_FAIR_SHARE_GLOBAL_SLOTS', 0)
+)
+# Tasks still running this many minutes after they started are assumed
+# lost with their worker: failed by celery-beat to free their slots (0 = never)
+CSV_STALE_TASK_MINUTES = int(os.environ.get('CSV_STALE_TASK_MINUTES', 360))
+
+# Admission control: new operations get 429 + Retry-After once the queue
+# depth (broker messages + fair-share backlog) or the bytes waiting to be
+# processed reach these limits
+CSV_ADMISSION_MAX_QUEUE_DEPTH = int(
+    os.environ.get('CSV_ADMISSION_MAX_QUEUE_DEPTH', 1000)
+)
+CSV_ADMISSION_MAX_PENDING_MB = int(
+    os.environ.get('CSV_ADMISSION_MAX_PENDING_MB', 20480)
+)
+CSV_ADMISSION_RETRY_AFTER = int(os.environ.get('CSV_ADMISSION_RETRY_AFTER', 30))
+CSV_ADMISSION_CACHE_SECONDS = 2
+
+# Seconds an authenticated user is cached by CachedJWTAuthentication (0 disables)
+CSV_AUTH_CACHE_SECONDS = int(os.environ.get('CSV_AUTH_CACHE_SECONDS', 60))
+
+# Port of the Prometheus exporter started by each Celery worker (0 disables)
+CELERY_METRICS_PORT = int(os.environ.get('CELERY_METRICS_PORT', 9808))
+
 # Celery Beat Scheduler
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 
@@ -237,6 +320,55 @@ CORS_ALLOW_CREDENTIALS = True
 FILE_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024  # 50MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024  # 50MB
 
+# CSV Processing
+# Rows per chunk for operations that stream the file instead of loading it
+CSV_CHUNK_SIZE = int(os.environ.get('CSV_CHUNK_SIZE', 100000))
+# Memory each worker process may use for one task; the planner picks
+# in-memory, chunked or spilling execution to stay within it
+CSV_WORKER_MEMORY_BUDGET_MB = int(
+    os.environ.get('CSV_WORKER_MEMORY_BUDGET_MB', 512)
+)
+# Directory for temporary spill files (defaults to the system temp dir)
+CSV_SPILL_DIR = os.environ.get('CSV_SPILL_DIR') or None
+
+# CSV parser: auto, c, pyarrow (optional package) or python. auto uses
+# pyarrow for whole-file reads from this size up when it is installed
+CSV_READER_BACKEND = os.environ.get('CSV_READER_BACKEND', 'auto')
+CSV_PYARROW_MIN_MB = float(os.environ.get('CSV_PYARROW_MIN_MB', 4))
+
+# Result files: write buffer size, and whether to fsync them before they
+# are renamed into place (durable across power loss, but slower)
+CSV_WRITE_BUFFER_KB = int(os.environ.get('CSV_WRITE_BUFFER_KB', 1024))
+CSV_RESULT_FSYNC = os.environ.get('CSV_RESULT_FSYNC', 'false').lower() == 'true'
+
+# Column indexes for filters run with use_index, cached on each worker's
+# disk. Only conditions selecting at most this fraction of the rows are
+# answered from them; a filter without such a condition scans the file
+CSV_INDEX_DIR = os.environ.get('CSV_INDEX_DIR', str(BASE_DIR / 'indexes'))
+CSV_INDEX_MAX_SELECTIVITY = float(
+    os.environ.get('CSV_INDEX_MAX_SELECTIVITY', 0.1)
+)
+# Selected rows this close together are fetched with one read (one GET on
+# S3); the bytes between them are read and dropped
+CSV_INDEX_READ_GAP_KB = int(os.environ.get('CSV_INDEX_READ_GAP_KB', 64))
+# Filters whose rows would take more reads than this scan instead
+CSV_INDEX_MAX_READS = int(os.environ.get('CSV_INDEX_MAX_READS', 1000))
+
+# Retention: finished results older than this many days are deleted by
+# the daily celery-beat job (0 keeps them forever; users can override)
+CSV_RESULT_TTL_DAYS = int(os.environ.get('CSV_RESULT_TTL_DAYS', 30))
+CSV_RETENTION_BATCH_SIZE = int(os.environ.get('CSV_RETENTION_BATCH_SIZE', 500))
+# Unreferenced media files younger than this are never reclaimed
+CSV_RETENTION_ORPHAN_GRACE_HOURS = int(
+    os.environ.get('CSV_RETENTION_ORPHAN_GRACE_HOURS', 24)
+)
+
+# Tracing: Zipkin v2 JSON spans appended to a file and/or posted to a
+# collector (e.g. http://zipkin:9411/api/v2/spans). Off when both are empty
+CSV_TRACE_FILE = os.environ.get('CSV_TRACE_FILE', '')
+CSV_TRACE_COLLECTOR_URL = os.environ.get('CSV_TRACE_COLLECTOR_URL', '')
+CSV_TRACE_SERVICE_NAME = os.environ.get('CSV_TRACE_SERVICE_NAME', 'ravid')
+
 # Swagger Settings
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
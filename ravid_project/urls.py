@@ -18,6 +18,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
@@ -51,7 +52,9 @@ urlpatterns = [
          name='schema-redoc'),
 ]
 
-# Serve media files in development
+# Serve media and static files in development (the ASGI server, unlike
+# runserver, does not serve static files itself)
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL,
                          document_root=settings.MEDIA_ROOT)
+    urlpatterns += staticfiles_urlpatterns()
@@ -48,6 +48,14 @@ else:
 "
 }
 
+# Function to reset the Prometheus multiprocess directory
+prepare_metrics_dir() {
+    if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+        rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+        mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+    fi
+}
+
 # Function to show startup info
 show_info() {
     echo ""
@@ -66,6 +74,9 @@ main() {
     export REDIS_HOST=${REDIS_HOST:-redis}
     export REDIS_PORT=${REDIS_PORT:-6379}
     
+    # Stale samples from a previous run would be merged into the metrics
+    prepare_metrics_dir
+
     # Wait for dependencies
     wait_for_db
     wait_for_redis